@@ -1,4 +1,5 @@
 from .chat_interface import ChatInterface
 from .sidebar import create_sidebar
+from .stream_renderer import StreamRenderer
 
-__all__ = ['ChatInterface','create_sidebar']
\ No newline at end of file
+__all__ = ['ChatInterface','create_sidebar','StreamRenderer']
\ No newline at end of file
@@ -2,21 +2,47 @@ import streamlit as st
 from utils import GeminiClient, OpenAIClient, PromptType, PromptService
 from dotenv import load_dotenv
 from utils import SummaryStrategy, SlidingWindowStrategy, SmartSelectionStrategy
-from utils.api_client import OllamaClient
+from utils.api_client import OllamaClient, LLMError, GenerationHandle
 from utils import JSONStorage
+from utils import CachedLLMClient, get_response_cache
+from utils import SemanticCache, get_semantic_cache
+from utils import get_attack_index, SpeculativeGeneration, get_output_guardrail
+from utils import get_summary_worker
+from utils import InstrumentedLLMClient, call_purpose, get_metrics_registry
+from utils.api_client import is_error_response
+from utils.pipeline_executor import get_pipeline_executor
+from components.stream_renderer import StreamRenderer
+from config import DEFAULT_SETTINGS
+import logging
+import time
 import uuid
 
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class ChatInterface:
     """ Gestiona la interfaz del chat """
 
     def __init__(self, analysis_llm_client=None):
         self.initialize_session_state()
-        self.analysis_llm_client = analysis_llm_client
-        llm_client = st.session_state.get("llm_client")
-        self.prompt_service = PromptService(llm_Client= llm_client, enable_guardrails=True, analysis_llm_client=analysis_llm_client)
+        # Cada ejecución del script (rerun) empieza cancelando la generación que haya quedado en curso
+        self.cancel_active_generation()
+        self.analysis_llm_client = self._wrap_client(analysis_llm_client)
+        llm_client = self._wrap_client(st.session_state.get("llm_client"))
+        self.prompt_service = PromptService(llm_Client= llm_client, enable_guardrails=True, analysis_llm_client=self.analysis_llm_client)
+
+    @staticmethod
+    def _wrap_client(llm_client):
+        """
+        Envuelve el cliente con las métricas y la caché de respuestas compartida (llamadas con temperature=0)
+
+        Las métricas van por debajo de la caché: sólo miden llamadas reales al proveedor.
+        """
+        if llm_client is None or isinstance(llm_client, CachedLLMClient):
+            return llm_client
+        return CachedLLMClient(InstrumentedLLMClient(llm_client), get_response_cache())
     
     def initialize_session_state(self):
         """ Inicializar el estado de sesión """
@@ -44,6 +70,10 @@ class ChatInterface:
         if 'context_stats' not in st.session_state:
             st.context_stats = None
 
+        if 'context_state' not in st.session_state:
+            # Estado de las estrategias de contexto de la conversación actual (se guarda con ella)
+            st.session_state.context_state = {}
+
         if 'storage' not in st.session_state:
             st.session_state.storage = JSONStorage()
         
@@ -52,6 +82,12 @@ class ChatInterface:
         
         if 'current_conversation_name' not in st.session_state:
             st.session_state.current_conversation_name = "Nueva Conversación"
+
+        if 'active_generation' not in st.session_state:
+            st.session_state.active_generation = None
+
+        if 'pending_title' not in st.session_state:
+            st.session_state.pending_title = None
         
     
     def handle_user_input(self):
@@ -64,8 +100,12 @@ class ChatInterface:
 
             # Añadir al historial
             self.add_message("user",prompt)
-            if len(st.session_state.messages) == 1:
-                st.session_state.current_conversation_name = self.generate_conversation_title(prompt)
+            executor = get_pipeline_executor()
+            if len(st.session_state.messages) == 1 and st.session_state.llm_client:
+                # El título no lo necesita la respuesta: termina en segundo plano y se recoge al guardar
+                st.session_state.pending_title = executor.submit(
+                    "title", self.generate_conversation_title, prompt, st.session_state.llm_client
+                )
             temperature = st.session_state.temperature
             max_tokens = st.session_state.max_tokens
 
@@ -77,20 +117,97 @@ class ChatInterface:
                             # Crear el contexto del prompt
                             #context = self._create_context(prompt)
 
-                            if st.session_state.prompt_mode == 'auto':
-                                detected_type = self.prompt_service.detect_prompt_type(prompt)
-                            else:
-                                detected_type = PromptType(st.session_state.selected_prompt_type)
-
-                            print(f"Tipo de prompt usado : {detected_type}")
-
-                            optimized_prompt,error = self.prompt_service.build_prompt(user_input=prompt, prompt_type=detected_type)
-
+                            # Capa 1 de los guardrails (regex): inmediata, antes de lanzar ninguna llamada
+                            error = self.prompt_service.check_input_regex(prompt)
                             if error:
                                 st.error(f"❌ {error}")
                                 self.add_message("assistant",error)
                                 return
 
+                            # Clasificación, detección de ataques con LLM y contexto son independientes: en paralelo
+                            strategy_name = st.session_state.get("context_strategy","Ninguna")
+                            fused = DEFAULT_SETTINGS["preanalysis_mode"] == "fused"
+                            # Tipo de prompt conocido sin esperar al LLM (modo manual o clasificador local seguro)
+                            known_type = None
+                            if st.session_state.prompt_mode != 'auto':
+                                known_type = PromptType(st.session_state.selected_prompt_type)
+                            elif fused and DEFAULT_SETTINGS["speculative_generation"]:
+                                known_type = self.prompt_service.classify_locally(prompt)
+                            # En modo especulativo la respuesta no espera al análisis de ataques (se retiene hasta el veredicto).
+                            # Con el pre-análisis fusionado hace falta conocer ya el tipo de prompt; si no, se espera
+                            speculative = DEFAULT_SETTINGS["speculative_generation"] and (not fused or known_type is not None)
+                            attack_task = None
+                            tasks = {
+                                'context': executor.submit(
+                                    "context", self._run_context_strategy, list(st.session_state.messages), strategy_name, prompt,
+                                    st.session_state.context_state
+                                ),
+                            }
+                            if fused and not speculative:
+                                # Una única llamada corta (JSON) para clasificar y detectar ataques
+                                tasks['analysis'] = executor.submit("analysis", self.prompt_service.pre_analyze, prompt)
+                            elif fused:
+                                # Misma llamada, pero sólo se espera por su veredicto antes de publicar la respuesta
+                                attack_task = executor.submit("analysis", self._preanalysis_error, prompt)
+                            else:
+                                attack_task = executor.submit("attack", self.prompt_service.check_input_llm, prompt)
+                                if not speculative:
+                                    tasks['attack'] = attack_task
+                                if st.session_state.prompt_mode == 'auto':
+                                    tasks['type'] = executor.submit("type", self.prompt_service.detect_prompt_type, prompt)
+                            # Si falla el análisis de ataques la consulta no se da por segura
+                            attack_failure = self._guardrail_failure()
+                            results = executor.gather(tasks, defaults={
+                                'type': PromptType.GENERAL,
+                                'context': (st.session_state.messages, None),
+                                'attack': attack_failure,
+                                'analysis': {'error': attack_failure, 'prompt_type': PromptType.GENERAL},
+                            })
+                            if 'analysis' in tasks:
+                                analysis = results['analysis']
+                                results['attack'] = analysis['error']
+                                results['type'] = analysis['prompt_type']
+
+                            if results.get('attack'):
+                                error = results['attack']
+                                st.error(f"❌ {error}")
+                                self.add_message("assistant",error)
+                                return
+
+                            detected_type = known_type or results['type']
+
+                            print(f"Tipo de prompt usado : {detected_type}")
+
+                            optimized_prompt = self.prompt_service.render_prompt(prompt, detected_type)
+
+                            # Caché semántica: sólo para preguntas sin contexto previo en la conversación
+                            semantic_cache = None
+                            fingerprint = None
+                            if DEFAULT_SETTINGS["semantic_cache_enabled"] and self._is_context_free():
+                                semantic_cache = get_semantic_cache()
+                                fingerprint = SemanticCache.fingerprint(
+                                    self.prompt_service.templates.get(detected_type, ""),
+                                    self._get_model_name(st.session_state.llm_client),
+                                    temperature,
+                                    max_tokens,
+                                )
+                                cached = semantic_cache.lookup(prompt, detected_type.value, fingerprint)
+                                if cached and speculative:
+                                    # La respuesta guardada tampoco se muestra antes del veredicto
+                                    error = executor.gather({'attack': attack_task}, defaults={'attack': attack_failure})['attack']
+                                    if error:
+                                        st.error(f"❌ {error}")
+                                        self.add_message("assistant",error)
+                                        return
+                                if cached:
+                                    print(f"Respuesta desde caché semántica (similitud {cached['similarity']:.3f})")
+                                    st.markdown(cached['answer'])
+                                    st.caption(f"⚡ Respuesta reutilizada de una pregunta similar: \"{cached['query']}\"")
+                                    self.add_message("assistant", cached['answer'])
+                                    self._schedule_summary()
+                                    self.update_current_conversation()
+                                    return
+
                             """
                             response = st.session_state.llm_client.generate_response(
                                 #context,
@@ -100,29 +217,87 @@ class ChatInterface:
                                 max_tokens=max_tokens,
                             )
                             """
-                            strategy_name = st.session_state.get("context_strategy","Ninguna")
-                            optimized_messages = self._optimize_messages(
-                                messages= st.session_state.messages,
-                                strategy_name= strategy_name,
-                                new_query=prompt
-                            )
+                            optimized_messages, context_stats = results['context']
+                            if context_stats is not None:
+                                st.session_state.context_stats = context_stats
 
-                            response = st.session_state.llm_client.generate_response(
+                            generation_start = time.perf_counter()
+                            response = GenerationHandle(self._wrap_client(st.session_state.llm_client).generate_response(
                                 optimized_prompt,
                                 optimized_messages,
                                 temperature=temperature,
                                 max_tokens=max_tokens,
-                            )
+                            ))
+                            st.session_state.active_generation = response
+                            chunks = response
+
+                            if speculative:
+                                # La respuesta se genera mientras se espera el veredicto, sin mostrarse
+                                speculation = SpeculativeGeneration(response, purpose="answer").start()
+                                error = executor.gather({'attack': attack_task}, defaults={'attack': attack_failure})['attack']
+                                if error:
+                                    speculation.discard()
+                                    st.session_state.active_generation = None
+                                    st.error(f"❌ {error}")
+                                    self.add_message("assistant",error)
+                                    return
+                                chunks = speculation.release()
 
 
                             #st.write_stream(response)
                             full_response = ""
-                            response_widget = st.empty()
-                            for chunk in response:
-                                if chunk:
-                                    full_response += chunk
-                                    response_widget.markdown(full_response)
+                            renderer = StreamRenderer()
+                            generation_failed = False
+                            # Guardrail de salida: retiene el final de la respuesta hasta revisarlo y la corta si filtra algo
+                            scanner = get_output_guardrail().scanner() if DEFAULT_SETTINGS["output_guardrail_enabled"] else None
+                            try:
+                                with call_purpose("answer"):
+                                    for chunk in chunks:
+                                        if chunk and scanner:
+                                            chunk = scanner.feed(chunk)
+                                        if chunk:
+                                            full_response += chunk
+                                            renderer.write(chunk)
+                                        if scanner and scanner.violation:
+                                            break
+                                if scanner:
+                                    tail = scanner.finish()
+                                    full_response += tail
+                                    renderer.write(tail)
+                                renderer.finish()
+                            except LLMError as e:
+                                renderer.finish()
+                                logger.warning(f"Error del proveedor LLM: {e}")
+                                error_msg = "❌ No se pudo generar la respuesta. Inténtalo de nuevo más tarde"
+                                st.error(error_msg)
+                                full_response = f"{full_response}\n\n{error_msg}" if full_response else error_msg
+                                generation_failed = True
+                            finally:
+                                # Si un rerun interrumpe el bucle, la conexión se cierra aquí y no al recolectar el generador
+                                response.close()
+                                if st.session_state.get("active_generation") is response:
+                                    st.session_state.active_generation = None
+
+                            if scanner and scanner.violation:
+                                logger.warning(f"Guardrail de salida: respuesta cortada por la regla '{scanner.violation}'")
+                                notice = scanner.guardrail.message
+                                st.warning(notice)
+                                full_response = f"{full_response}\n\n{notice}" if full_response else notice
+                                generation_failed = True
+                            elif response.cancelled:
+                                full_response = f"{full_response}\n\n⏹️ *Respuesta interrumpida*" if full_response else "⏹️ *Respuesta interrumpida*"
+                                generation_failed = True
+
+                            if semantic_cache and full_response and not generation_failed and not is_error_response(full_response):
+                                semantic_cache.store(
+                                    prompt,
+                                    detected_type.value,
+                                    fingerprint,
+                                    full_response,
+                                    generation_time=time.perf_counter() - generation_start
+                                )
                             self.add_message("assistant", full_response)
+                            self._schedule_summary()
                             self.update_current_conversation()
             else:
                 with st.chat_message("assistant"):
@@ -130,6 +305,14 @@ class ChatInterface:
                     st.error(error_msg)
                     self.add_message("assistant", error_msg)
     
+    @staticmethod
+    def cancel_active_generation():
+        """ Cancela la respuesta que se esté generando en esta sesión (p. ej. de una ejecución anterior del script) """
+        handle = st.session_state.get("active_generation")
+        if handle is not None and not handle.finished:
+            handle.cancel()
+        st.session_state.active_generation = None
+
     def get_prompt_info(self, prompt_type: PromptType) -> dict:
         """ Retorna información sobre el tipo de prompt empleado"""
         info = {
@@ -250,21 +433,101 @@ class ChatInterface:
             user_messages = len([m for m in st.session_state.messages if m['role'] == "user"])
             st.sidebar.metric("Preguntas Realizadas", user_messages)
 
+        if DEFAULT_SETTINGS["semantic_cache_enabled"]:
+            cache_stats = get_semantic_cache().get_stats()
+            if cache_stats['lookups']:
+                col1, col2 = st.sidebar.columns(2)
+                with col1:
+                    st.metric("Aciertos Caché", f"{cache_stats['hit_rate']*100:.0f}%")
+                with col2:
+                    st.metric("Tiempo Ahorrado", f"{cache_stats['latency_saved']:.1f} s")
+
+        if DEFAULT_SETTINGS["attack_index_enabled"]:
+            index_stats = get_attack_index().get_stats()
+            if index_stats['checks']:
+                st.sidebar.caption(f"🛡️ Análisis de ataques con LLM evitados: {index_stats['llm_avoided_rate']*100:.0f}%")
+
+        answer_stats = [s for s in get_metrics_registry().summary() if s['purpose'] == "answer" and s['ttft_avg'] is not None]
+        if answer_stats:
+            st.sidebar.markdown("**⏱️ Latencia por proveedor**")
+            for stats in answer_stats:
+                tokens_per_second = f"{stats['tokens_per_second']:.1f} tok/s" if stats['tokens_per_second'] else "-"
+                st.sidebar.caption(
+                    f"{stats['provider']} ({stats['model']}): TTFT p50 {stats['ttft_p50']:.2f} s · "
+                    f"p95 {stats['ttft_p95']:.2f} s · {tokens_per_second}"
+                )
+
+    @staticmethod
+    def _is_context_free() -> bool:
+        """ True si la conversación no tiene respuestas previas (la pregunta no depende del contexto) """
+        return not any(m['role'] == "assistant" for m in st.session_state.messages)
+
+    @staticmethod
+    def _get_model_name(llm_client) -> str:
+        """ Nombre del modelo usado por el cliente (o del cliente si no lo expone) """
+        return getattr(llm_client, "model", None) or getattr(llm_client, "modelo", None) or type(llm_client).__name__
+
     def _optimize_messages(self, messages, strategy_name, new_query):
         """ Optimiza los mensajes en base a la estrategia """
+        optimized, stats = self._run_context_strategy(messages, strategy_name, new_query, st.session_state.context_state)
+        if stats is not None:
+            st.session_state.context_stats = stats
+        return optimized
+
+    @staticmethod
+    def _run_context_strategy(messages, strategy_name, new_query, context_state=None) -> tuple:
+        """
+        Aplica la estrategia de contexto sin tocar st.session_state (se puede ejecutar en otro hilo)
+
+        context_state es el estado de la conversación (st.session_state.context_state): la
+        estrategia de resumen guarda ahí el resumen y la selección inteligente los embeddings
+        de los mensajes, para reutilizarlos en los siguientes turnos.
+
+        Returns:
+            Tupla (mensajes optimizados, estadísticas de la estrategia o None)
+        """
         if strategy_name == "Ninguna":
-            return messages
+            return messages, None
         
         elif strategy_name == "Ventana Deslizante":
             strategy = SlidingWindowStrategy(max_messages=5)
         elif strategy_name == "Resumen Automático":
-            strategy = SummaryStrategy(llm_client=OllamaClient(),keep_recent=3,summarize_thresold=7)
+            strategy = ChatInterface._build_summary_strategy(context_state)
         else:
-            strategy = SmartSelectionStrategy(OllamaClient(),max_selected=3)
+            strategy = SmartSelectionStrategy(InstrumentedLLMClient(OllamaClient()),max_selected=3,
+                                              selector=DEFAULT_SETTINGS["smart_selection_mode"],
+                                              embedding_model=DEFAULT_SETTINGS["smart_selection_embedding_model"],
+                                              state=context_state)
 
         optimized = strategy.optimize(messages, new_query)
-        st.session_state.context_stats = strategy.get_stats()
-        return optimized
+        return optimized, strategy.get_stats()
+
+    def _preanalysis_error(self, prompt):
+        """ Veredicto del pre-análisis fusionado: mensaje de error para el usuario o None """
+        return self.prompt_service.pre_analyze(prompt)['error']
+
+    def _guardrail_failure(self):
+        """ Resultado de una tarea de análisis de ataques que falla o no termina (ver guardrail_fail_closed) """
+        if DEFAULT_SETTINGS["guardrail_fail_closed"]:
+            return self.prompt_service.guardrails.get_unavailable_message()
+        return None
+
+    @staticmethod
+    def _build_summary_strategy(context_state) -> SummaryStrategy:
+        return SummaryStrategy(llm_client=InstrumentedLLMClient(OllamaClient()),keep_recent=3,summarize_thresold=7,
+                               state=context_state, background=DEFAULT_SETTINGS["summary_background"])
+
+    def _schedule_summary(self):
+        """ Tras una respuesta, actualiza el resumen en segundo plano para la siguiente consulta """
+        if st.session_state.get("context_strategy") != "Resumen Automático" or not DEFAULT_SETTINGS["summary_background"]:
+            return
+        # Una conversación nueva aún no tiene id (se asigna al guardarla) ni mensajes suficientes para resumir
+        conversation_id = st.session_state.current_conversation_id
+        if conversation_id is None:
+            return
+        get_summary_worker().schedule(
+            conversation_id, self._build_summary_strategy(st.session_state.context_state), st.session_state.messages
+        )
     
     def save_current_conversation(self, name: str = None) -> bool:
         """
@@ -274,6 +537,7 @@ class ChatInterface:
             st.warning("⚠️No hay mensajes para guardar")
             return False
         
+        self._apply_pending_title()
         conversation_name = name or st.session_state.current_conversation_name
 
         if st.session_state.current_conversation_id is None:
@@ -282,7 +546,8 @@ class ChatInterface:
         success = st.session_state.storage.save_conversation(
             conversation_id=st.session_state.current_conversation_id,
             name=conversation_name,
-            messages=st.session_state.messages
+            messages=st.session_state.messages,
+            context_state=st.session_state.context_state
         )
 
         if success:
@@ -307,6 +572,7 @@ class ChatInterface:
             st.session_state.current_conversation_id = loaded['id']
             st.session_state.current_conversation_name = loaded['name']
             st.session_state.messages = loaded['messages']
+            st.session_state.context_state = loaded.get('context_state') or {}
             st.success(f"✅ Conversación cargada: {loaded['name']}")
             return True
         else:
@@ -332,16 +598,35 @@ class ChatInterface:
         # Actualizamos la conversación
         success = st.session_state.storage.update_conversation(
             conversation_id = st.session_state.current_conversation_id,
-            messages = st.session_state.messages
+            messages = st.session_state.messages,
+            context_state = st.session_state.context_state
         )
         return success
     
-    def generate_conversation_title(self, first_message: str) -> str:
+    @staticmethod
+    def _apply_pending_title():
+        """ Espera al título que se genera en segundo plano y lo aplica a la conversación """
+        future = st.session_state.get("pending_title")
+        if future is None:
+            return
+        st.session_state.pending_title = None
+        try:
+            title = future.result(timeout=DEFAULT_SETTINGS["title_timeout"])
+        except Exception as e:
+            print(f"⚠️ Título no disponible: {e}")
+            return
+        if title:
+            st.session_state.current_conversation_name = title
+
+    def generate_conversation_title(self, first_message: str, llm_client=None) -> str:
         """
         Genera un título automático para la conversación empleando el LLM
 
+        No usa st.session_state si se indica el cliente, así que puede ejecutarse en otro hilo.
+
         Args:
             first_message: El mensaje enviado por el usuario
+            llm_client: Cliente LLM (por defecto, el de la sesión)
         """
 
         title_prompt = f"""
@@ -352,18 +637,22 @@ class ChatInterface:
         RESPONDE SÓLO CON EL TÍTULO, sin aclaraciones ni comentarios
         """
         
-        generador = st.session_state.llm_client.generate_response(
-            prompt= title_prompt,
-            messages=[],
-            temperature=0.8,
-            max_tokens=20
-        )
+        llm_client = llm_client or st.session_state.llm_client
         title = ""
-        for chunk in generador:
-             if chunk:
-                title += chunk
+        try:
+            # El título es una sola línea: se corta en el primer salto de línea
+            with call_purpose("title"):
+                title, _ = self._wrap_client(llm_client).generate_auxiliary(
+                    title_prompt,
+                    max_tokens=DEFAULT_SETTINGS["auxiliary_max_tokens"]["title"],
+                    stop=["\n"],
+                    temperature=0.8,
+                )
+        except LLMError as e:
+            print(f"⚠️ Error generando el título: {e}")
+            title = ""
         
-        if title.strip():
+        if title.strip() and not is_error_response(title):
             return title.strip()
         else:
             return first_message[:50]
@@ -396,4 +685,5 @@ class ChatInterface:
     @staticmethod
     def clear_chat():
         st.session_state.messages = []
+        st.session_state.context_state = {}
         st.rerun()
\ No newline at end of file
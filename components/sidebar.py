@@ -1,6 +1,6 @@
 from datetime import datetime
 import streamlit as st
-from utils import GeminiClient, OpenAIClient, OllamaClient
+from utils import GeminiClient, OpenAIClient, OllamaClient, LLMGateway, create_llm_gateway
 from components import ChatInterface
 from config import DEFAULT_SETTINGS
 
@@ -17,7 +17,7 @@ def create_sidebar():
         # Seleccionar el modelo
         model_provider = st.selectbox(
             "Proveedor de IA:",
-            ["Ollama","Gemini","OpenAI"],
+            ["Ollama","Gemini","OpenAI","Automático"],
             help="Seleccione el proveedor de la IA a utilizar"
         )
         _display_connection_status(model_provider)
@@ -63,6 +63,7 @@ def create_sidebar():
                     if st.button("🗑️ Eliminar", use_container_width=True):
                         if st.session_state.current_conversation_id == selected_conv['id']:
                             st.session_state.messages = []
+                            st.session_state.context_state = {}
                             st.session_state.current_conversation_id = None
                             st.session_state.current_conversation_name = "Nueva Conversación"
                         
@@ -72,6 +73,7 @@ def create_sidebar():
                 
                 if st.button("➕ Nueva Conversación", use_container_width=True):
                     st.session_state.messages = []
+                    st.session_state.context_state = {}
                     st.session_state.current_conversation_id = None
                     st.session_state.current_conversation_name = "Nueva Conversación"
                     st.rerun()
@@ -94,7 +96,8 @@ def create_sidebar():
                                 st.session_state.storage.save_conversation(
                                     conversation_id = conv_id,
                                     name = new_name,
-                                    messages = conv['messages']
+                                    messages = conv['messages'],
+                                    context_state = conv.get('context_state')
                                 )
                                 st.session_state.rename_mode = None
                                 st.success(f"✅ Conversación renombrada a {new_name}")
@@ -217,6 +220,8 @@ def create_sidebar():
                     "Optimizaciones",
                     f"{stats.get('optimizations',0)}"
                 )
+                if stats.get('summary_ready') is False:
+                    st.caption("⏳ Resumen en preparación: se ha usado una ventana deslizante")
             elif strategy_name == "Selección Inteligente":
                 col1, col2 = st.sidebar.columns(2)
                 with col1:
@@ -229,6 +234,9 @@ def create_sidebar():
                         "Optimizaciones",
                         f"{stats.get('optimizations',0)}"
                     )
+                if stats.get('selection_ms') is not None:
+                    st.caption(f"🔎 Selección por embeddings en {stats['selection_ms']:.0f} ms "
+                               f"({stats.get('embedded_messages',0)} mensajes nuevos indexados)")
                 st.success("✅ Mensajes selecionados con éxito")
         st.divider()
 
@@ -239,7 +247,7 @@ def _display_connection_status(provider:str):
     Muestra el estado de Conexión con el proveedor de IA
 
     Args:
-        provider: El proveedor seleccionado ('Gemini' u 'OpenAI')
+        provider: El proveedor seleccionado ('Ollama', 'Gemini', 'OpenAI' o 'Automático')
     """
     try:
         if provider == "Gemini":
@@ -263,6 +271,13 @@ def _display_connection_status(provider:str):
                 st.session_state.llm_client = client
             else:
                 st.error("❌ OpenAI no configurado")
+        elif provider == "Automático":
+            # El gateway se conserva entre reruns para no perder el estado de los circuitos
+            if not isinstance(st.session_state.get("llm_gateway"), LLMGateway):
+                st.session_state.llm_gateway = create_llm_gateway()
+            gateway = st.session_state.llm_gateway
+            st.success(f"✅ Failover: {' → '.join(name for name, _ in gateway.providers)}")
+            st.session_state.llm_client = gateway
     except ValueError as e:
         st.error(f"❌ Error: {e}")
         st.info("💡Configura tu clave de API en el archivo .env")
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Renderizado incremental de respuestas en streaming
+
+Volver a pintar la respuesta completa con cada chunk envía al navegador
+(y renderiza) el texto entero una y otra vez: trabajo O(n²) en respuestas
+largas. StreamRenderer agrupa los chunks y sólo repinta cada cierto
+tiempo o tamaño, y los párrafos terminados se fijan en su propio
+elemento, de modo que lo que se repinta es únicamente el párrafo en curso.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+import streamlit as st
+
+from config import DEFAULT_SETTINGS
+
+
+class StreamRenderer:
+    """ Buffer de renderizado para una respuesta en streaming """
+
+    def __init__(self, container=None, min_interval:Optional[float] = None, min_chars:Optional[int] = None):
+        """
+        Args:
+            container: Contenedor de Streamlit donde pintar (por defecto st.container())
+            min_interval: Segundos mínimos entre dos repintados del párrafo en curso
+            min_chars: Caracteres pendientes que fuerzan un repintado antes de min_interval
+        """
+        self.container = container if container is not None else st.container()
+        self.min_interval = min_interval if min_interval is not None else DEFAULT_SETTINGS["stream_render_interval"]
+        self.min_chars = min_chars if min_chars is not None else DEFAULT_SETTINGS["stream_render_min_chars"]
+
+        self.text = ""
+        self._block_start = 0     # Inicio del párrafo en curso dentro de self.text
+        self._scan_from = 0       # Desde dónde buscar el siguiente fin de párrafo
+        self._in_code = False     # Dentro de un bloque ``` (no se parte)
+        self._pending = 0
+        self._last_render = 0.0
+        self._tail = self.container.empty()
+        self.stats = {'chunks': 0, 'renders': 0, 'chars_sent': 0, 'blocks': 0}
+
+    def write(self, chunk:str):
+        """ Añade un chunk y repinta si toca """
+        if not chunk:
+            return
+        self.text += chunk
+        self.stats['chunks'] += 1
+        self._pending += len(chunk)
+        self._commit_blocks()
+
+        now = time.perf_counter()
+        if self._pending >= self.min_chars or now - self._last_render >= self.min_interval:
+            self._render_tail()
+
+    def finish(self) -> str:
+        """ Pinta lo que quede pendiente y retorna el texto completo """
+        if self._pending or self._block_start == 0:
+            self._render_tail()
+        return self.text
+
+    def _commit_blocks(self):
+        """ Fija en su propio elemento cada párrafo completo (fuera de bloques de código) """
+        while True:
+            fence = self.text.find("```", self._scan_from)
+            paragraph = -1 if self._in_code else self.text.find("\n\n", self._scan_from)
+
+            if fence != -1 and (paragraph == -1 or fence < paragraph):
+                # Sólo se procesa la valla cuando su línea está completa
+                line_end = self.text.find("\n", fence)
+                if line_end == -1:
+                    return
+                self._in_code = not self._in_code
+                self._scan_from = line_end + 1
+                continue
+
+            if paragraph == -1:
+                # Buscar de nuevo desde el final por si el separador llega partido entre chunks
+                self._scan_from = max(self._scan_from, len(self.text) - 2)
+                return
+
+            block = self.text[self._block_start:paragraph]
+            self._block_start = paragraph + 2
+            self._scan_from = self._block_start
+            if block.strip():
+                self._send(self._tail, block)
+                self._tail = self.container.empty()
+                self.stats['blocks'] += 1
+
+    def _render_tail(self):
+        """ Repinta el párrafo en curso """
+        tail = self.text[self._block_start:]
+        if tail.strip() or self._block_start == 0:
+            self._send(self._tail, tail)
+        self._pending = 0
+        self._last_render = time.perf_counter()
+
+    def _send(self, placeholder, text:str):
+        placeholder.markdown(text)
+        self.stats['renders'] += 1
+        self.stats['chars_sent'] += len(text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+if __name__ == "__main__":
+    # Benchmark sin servidor (Streamlit en modo "bare"): CPU por token del
+    # repintado completo por chunk frente al StreamRenderer
+    import random
+    from streamlit import logger as streamlit_logger
+
+    # Sin ScriptRunContext Streamlit avisa en cada llamada (el nivel se fija tras la primera)
+    st.empty()
+    streamlit_logger.set_log_level("error")
+
+    rng = random.Random(0)
+    words = "el código de la función devuelve una lista con los datos procesados por el servidor".split()
+    tokens = []
+    for paragraph in range(40):
+        for i in range(rng.randint(30, 80)):
+            tokens.append(rng.choice(words) + " ")
+        if paragraph % 5 == 4:
+            tokens += ["\n\n```python\n", "def f(x):\n", "    return x\n", "```"]
+        tokens.append("\n\n")
+
+    print(f"🧪 Respuesta simulada: {len(tokens)} tokens, {len(''.join(tokens))} caracteres\n")
+
+    start = time.process_time()
+    widget = st.empty()
+    full_response = ""
+    chars_sent = 0
+    for token in tokens:
+        full_response += token
+        widget.markdown(full_response)
+        chars_sent += len(full_response)
+    naive_cpu = time.process_time() - start
+    print(f"Repintado por chunk : {naive_cpu / len(tokens) * 1e6:8.1f} µs CPU/token | "
+          f"{len(tokens)} repintados | {chars_sent / 1024:.0f} KB enviados")
+
+    for interval in (0.0, 0.05, 0.1):
+        start = time.process_time()
+        renderer = StreamRenderer(container=st.container(), min_interval=interval, min_chars=200)
+        for token in tokens:
+            renderer.write(token)
+        renderer.finish()
+        cpu = time.process_time() - start
+        stats = renderer.get_stats()
+        print(f"StreamRenderer {interval:.2f}s: {cpu / len(tokens) * 1e6:8.1f} µs CPU/token | "
+              f"{stats['renders']} repintados | {stats['chars_sent'] / 1024:.0f} KB enviados")
@@ -5,5 +5,102 @@ DEFAULT_SETTINGS = {
     "model_openai": "gpt-4.1", # Aquí estaría el modelo de OpenAI (gept-4, gpt-5...)
     "model_ollama": "gpt-oss:20b",
     "temperature": 0.7,
-    "max_tokens": 10000
+    "max_tokens": 10000,
+    # Servidor(es) de Ollama; la variable de entorno OLLAMA_BASE_URL (separada por comas) tiene prioridad
+    "ollama_base_url": "http://185.193.11.153:11434",
+    # Conexión con Ollama (segundos / nº de conexiones)
+    "ollama_connect_timeout": 5,
+    "ollama_read_timeout": 300,
+    "ollama_pool_maxsize": 10,
+    "ollama_pool_block": False,
+    # Modo /api/chat (mensajes estructurados) y tiempo que Ollama mantiene el modelo cargado
+    "ollama_use_chat": False,
+    "ollama_keep_alive": "30m",
+    # Balanceo entre varios servidores Ollama ('least_outstanding' o 'ewma')
+    "ollama_balance_strategy": "least_outstanding",
+    # Segundos antes de duplicar un prompt auxiliar corto en otro servidor (None = desactivado)
+    "ollama_hedge_delay": None,
+    "ollama_hedge_max_prompt_chars": 4000,
+    # Caché de respuestas deterministas (temperature=0). Ruta SQLite opcional para persistirla
+    "response_cache_max_entries": 512,
+    "response_cache_ttl": 24 * 3600,
+    "response_cache_path": None,
+    # Caché semántica de respuestas (preguntas casi idénticas sin contexto previo)
+    "semantic_cache_enabled": True,
+    "semantic_cache_threshold": 0.92,
+    "semantic_cache_max_entries": 1000,
+    # Archivo JSONL donde se añaden las métricas de cada llamada LLM (None = sólo en memoria)
+    "llm_metrics_path": None,
+    # Repintado de la respuesta en streaming: cada cuántos segundos o caracteres pendientes
+    "stream_render_interval": 0.1,
+    "stream_render_min_chars": 400,
+    # Llamadas auxiliares (título, clasificación, detección de ataques, contexto) simultáneas en el
+    # proceso, compartidas por todas las sesiones. Cada mensaje lanza hasta 4 tareas, así que con 8
+    # hilos sólo 2 mensajes a la vez tienen todas sus tareas en marcha y el resto espera turno.
+    # La variable de entorno PIPELINE_MAX_WORKERS tiene prioridad (ajústala a la carga esperada)
+    "pipeline_max_workers": 8,
+    # Si el análisis de ataques con LLM falla (error, sin veredicto o tarea caída) la consulta se
+    # rechaza con un mensaje para reintentar; False la deja pasar (sólo quedan las regex)
+    "guardrail_fail_closed": True,
+    # Segundos máximos de espera por el título antes de guardar la conversación
+    "title_timeout": 10,
+    # Pre-análisis: "fused" = clasificación + detección de ataques en una llamada JSON; "separate" = dos llamadas
+    "preanalysis_mode": "fused",
+    "preanalysis_max_tokens": 64,
+    # Confianza a partir de la cual un veredicto SOSPECHOSO bloquea la consulta
+    "preanalysis_block_confidence": 0.5,
+    # Clasificador local de PromptType: por debajo del umbral de confianza se pregunta al LLM.
+    # La ruta del modelo entrenado, si es relativa, parte de la raíz del proyecto
+    "prompt_classifier_enabled": True,
+    "prompt_classifier_threshold": 0.3,
+    "prompt_classifier_path": "models/prompt_classifier.json",
+    # Reglas de los guardrails de entrada (None = config/guardrail_rules.json); se recargan al cambiar
+    "guardrail_rules_path": None,
+    "guardrail_rules_reload_interval": 2.0,
+    # Índice de ataques conocidos (entre las regex y el LLM): por debajo de pass se da por segura,
+    # desde block se bloquea y en medio se consulta al LLM
+    "attack_index_enabled": True,
+    "attack_index_pass_threshold": 0.6,
+    "attack_index_block_threshold": 0.9,
+    # Longitud máxima (caracteres) de una consulta para darla por segura sin el LLM; las más largas
+    # (código pegado, textos) pueden esconder una frase inyectada y van siempre al LLM
+    "attack_index_safe_max_chars": 400,
+    # Caché de veredictos de los guardrails (por el texto evaluado por cada capa y versión de reglas/prompts)
+    "guardrail_cache_enabled": True,
+    "guardrail_cache_max_entries": 2048,
+    "guardrail_cache_ttl": 3600,
+    # Guardrail de salida: revisa la respuesta en streaming (filtración de los templates y reglas
+    # "output" del archivo de reglas); min_words = palabras mínimas de una frase de template a vigilar.
+    # Sólo se vigilan las frases que empiezan por uno de los prefijos (la definición del rol): las
+    # instrucciones genéricas ("Ayuda a resolver el problema...") aparecen en respuestas normales
+    "output_guardrail_enabled": True,
+    "output_guardrail_min_words": 8,
+    "output_guardrail_phrase_prefixes": ["Eres"],
+    # Generación especulativa: la respuesta empieza a la vez que el análisis de ataques con LLM y
+    # se retiene hasta el veredicto. Con el pre-análisis fusionado sólo se especula cuando el tipo de
+    # prompt ya se conoce (modo manual o clasificador local seguro); si no, se espera al pre-análisis
+    "speculative_generation": True,
+    # Resumen Automático en segundo plano: se actualiza tras cada respuesta y la consulta usa el último
+    # resumen terminado (o una ventana deslizante si aún no hay), sin esperar al LLM
+    "summary_background": True,
+    # Selección Inteligente: "embedding" = intercambios más parecidos a la consulta (embeddings de los
+    # mensajes guardados con la conversación, sin llamadas al LLM); "llm" = los elige el LLM
+    "smart_selection_mode": "embedding",
+    "smart_selection_embedding_model": "mxbai-embed-large",
+    # Tokens máximos de salida de las llamadas auxiliares (sólo la respuesta; el razonamiento se
+    # suma según reasoning_models)
+    "auxiliary_max_tokens": {
+        "classify": 16,
+        "guardrail": 16,
+        "selection": 64,
+        "title": 24,
+    },
+    # Modelos de razonamiento de Ollama (por prefijo del nombre): nivel de razonamiento ("think") de
+    # las llamadas auxiliares y tokens que se suman a su límite, porque el razonamiento cuenta para
+    # num_predict. gpt-oss no permite desactivarlo (sólo "low", "medium" o "high")
+    "reasoning_models": {
+        "gpt-oss": {"think": "low", "extra_tokens": 512},
+        "qwen3": {"think": False, "extra_tokens": 0},
+        "deepseek-r1": {"think": False, "extra_tokens": 0},
+    }
 }
\ No newline at end of file
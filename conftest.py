@@ -0,0 +1,30 @@
+"""
+Configuración de pytest
+
+test_rag_manager.py y test_ollama_embed.py son scripts que necesitan Qdrant y
+Ollama en marcha: se ejecutan a mano y pytest no los recoge.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils.prompt_service as prompt_service
+from config import DEFAULT_SETTINGS
+from utils.guardrail_cache import GuardrailVerdictCache
+
+collect_ignore = ["test_rag_manager.py", "test_ollama_embed.py"]
+
+
+@pytest.fixture
+def offline_guardrails(monkeypatch):
+    """ Guardrails sin capas de embeddings (no hay servidor de Ollama) y con una caché de veredictos nueva """
+    monkeypatch.setitem(DEFAULT_SETTINGS, "attack_index_enabled", False)
+    monkeypatch.setitem(DEFAULT_SETTINGS, "prompt_classifier_enabled", False)
+    monkeypatch.setitem(DEFAULT_SETTINGS, "guardrail_cache_enabled", True)
+    cache = GuardrailVerdictCache()
+    monkeypatch.setattr(prompt_service, "get_guardrail_cache", lambda: cache)
+    return cache
@@ -0,0 +1,73 @@
+""" Tests de los clientes LLM asíncronos """
+
+import asyncio
+
+import pytest
+
+from utils.api_client import closed_with_complete_answer
+from utils.async_api_client import AsyncAuxiliaryCallMixin, AsyncOllamaClient
+from utils.fake_ollama_server import FakeOllamaServer
+
+
+class StubAsyncClient(AsyncAuxiliaryCallMixin):
+    """ Cliente que emite los chunks indicados y registra cómo se cerró el stream """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+        self.kwargs = None
+        self.closed_complete = None
+
+    async def generate_response(self, prompt, messages, **kwargs):
+        self.kwargs = kwargs
+        try:
+            for chunk in self.chunks:
+                self.sent += 1
+                yield chunk
+        finally:
+            self.closed_complete = closed_with_complete_answer()
+
+
+def test_parse_closes_the_stream_as_soon_as_the_answer_is_valid():
+    client = StubAsyncClient(['{"verdict": ', '"SEGURO"}', " texto de más", " y más"])
+    parse = lambda text: "SEGURO" if text.strip().endswith("}") else None
+    text, parsed = asyncio.run(client.generate_auxiliary("prompt", response_format="json", parse=parse))
+    assert (text, parsed) == ('{"verdict": "SEGURO"}', "SEGURO")
+    assert client.sent == 2
+    assert client.closed_complete is True
+    assert client.kwargs == {'temperature': 0, 'max_tokens': 32, 'response_format': "json"}
+
+
+def test_stop_sequences_cut_the_answer():
+    client = StubAsyncClient(["\n", "ATAQUE", "\nexplicación"])
+    text, parsed = asyncio.run(client.generate_auxiliary("prompt", stop=["\n"]))
+    # Un salto de línea inicial no corta
+    assert (text, parsed) == ("\nATAQUE", None)
+    assert client.closed_complete is True
+
+
+def test_truncated_answer_is_not_marked_complete():
+    client = StubAsyncClient(["sin", " cerrar"])
+    text, parsed = asyncio.run(client.generate_auxiliary("prompt", parse=lambda text: None))
+    assert text == "sin cerrar" and parsed is None
+    assert client.closed_complete is False
+
+
+@pytest.fixture
+def server():
+    server = FakeOllamaServer(port=0, ttft=0, tokens_per_second=1000, length_mean=20, length_stddev=0).start()
+    yield server
+    server.stop()
+
+
+def test_ollama_client_generate_auxiliary(server):
+    async def run():
+        client = AsyncOllamaClient(model="llama3.2:3b", base_url=server.base_url)
+        try:
+            return await client.generate_auxiliary("hola", max_tokens=5)
+        finally:
+            await client.aclose()
+
+    text, parsed = asyncio.run(run())
+    assert text and parsed is None
+    assert server.stats['requests'] == 1
@@ -0,0 +1,103 @@
+""" Tests de la ejecución por lotes de prompts """
+
+import json
+
+import pytest
+
+import utils.batch_runner as batch_runner
+from utils.api_client import LLMConnectionError
+from utils.batch_runner import BatchRunner, RateLimiter, read_completed_ids, read_results
+
+
+class FakeClock:
+    """ time.monotonic / time.sleep simulados: dormir sólo avanza el reloj """
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_allows_a_burst_and_then_spaces_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(batch_runner.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(batch_runner.time, "sleep", clock.sleep)
+    limiter = RateLimiter(per_minute=60, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+    # Dos peticiones de la ráfaga sin esperar; después, una por segundo
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+    # Tras una pausa larga la ráfaga se recupera, pero no pasa de su capacidad
+    clock.now += 60
+    limiter.acquire()
+    limiter.acquire()
+    assert len(clock.sleeps) == 2
+
+
+class StubClient:
+    """ Cliente que responde con el prompt y falla con los prompts indicados """
+
+    def __init__(self, failing=()):
+        self.model = "stub"
+        self.failing = set(failing)
+        self.prompts = []
+
+    def generate_response(self, prompt, messages, **kwargs):
+        self.prompts.append(prompt)
+        if prompt in self.failing:
+            raise LLMConnectionError("stub", "timeout")
+        yield "respuesta: "
+        yield prompt
+
+
+def write_jobs(path, prompts):
+    path.write_text("".join(json.dumps({'id': f"q{i}", 'prompt': prompt}) + "\n" for i, prompt in enumerate(prompts)), encoding="utf-8")
+
+
+def make_runner(client):
+    return BatchRunner(default_provider="stub", concurrency=2, client_factory=lambda provider: client)
+
+
+def test_resume_after_a_half_written_line(tmp_path):
+    jobs, output = tmp_path / "prompts.jsonl", tmp_path / "resultados.jsonl"
+    write_jobs(jobs, ["uno", "dos", "tres"])
+    # Ejecución cortada: q0 escrito y q1 a medio escribir
+    output.write_text(json.dumps({'id': "q0", 'status': "ok"}) + "\n" + '{"id": "q1", "sta', encoding="utf-8")
+
+    client = StubClient()
+    summary = make_runner(client).run(str(jobs), str(output))
+    assert sorted(client.prompts) == ["dos", "tres"]
+    assert summary['completed'] == 2 and summary['skipped'] == 1
+
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"id": "q1", "sta'
+    assert [json.loads(line)['id'] for line in lines[2:]] in (["q1", "q2"], ["q2", "q1"])
+    assert read_completed_ids(str(output)) == {"q0", "q1", "q2"}
+
+
+def test_retried_errors_are_superseded_by_their_last_row(tmp_path):
+    jobs, output = tmp_path / "prompts.jsonl", tmp_path / "resultados.jsonl"
+    write_jobs(jobs, ["uno", "dos"])
+    summary = make_runner(StubClient(failing={"dos"})).run(str(jobs), str(output))
+    assert summary['completed'] == 1 and summary['errors'] == 1
+    assert read_completed_ids(str(output), include_errors=False) == {"q0"}
+
+    # Sin retry_errors los errores cuentan como terminados
+    client = StubClient()
+    make_runner(client).run(str(jobs), str(output))
+    assert client.prompts == []
+
+    make_runner(client).run(str(jobs), str(output), retry_errors=True)
+    assert client.prompts == ["dos"]
+    # La salida sólo se amplía; la última fila de cada id es la que vale
+    assert len(output.read_text(encoding="utf-8").splitlines()) == 3
+    results = read_results(str(output))
+    assert {job_id: result['status'] for job_id, result in results.items()} == {"q0": "ok", "q1": "ok"}
+    assert results["q1"]['response'] == "respuesta: dos"
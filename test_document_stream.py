@@ -0,0 +1,88 @@
+""" Tests de la lectura de documentos por segmentos y su inserción en el RAG """
+
+import random
+
+import pytest
+
+import utils.document_processor as document_processor
+from utils.document_processor import DocumentProcessor
+from utils.fake_ollama_server import pseudo_embedding
+from utils.rag_manager import RagManager
+
+WORDS = ["alfa", "beta", "gamma", "delta", "épsilon", "zeta"]
+
+
+def make_text(words:int, seed:int = 0) -> str:
+    """ Texto con párrafos, frases y caracteres multibyte """
+    rng = random.Random(seed)
+    return "".join(rng.choice(WORDS) + (".\n\n" if i % 97 == 96 else " ") for i in range(words))
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "utf-16", "cp1252"])
+def test_multi_mb_file_is_decoded_across_segments(tmp_path, encoding):
+    # Más de MMAP_THRESHOLD: se lee con mmap; los segmentos cortan caracteres multibyte
+    text = make_text(800_000)
+    path = tmp_path / "grande.txt"
+    path.write_text(text, encoding=encoding, newline="")
+    assert path.stat().st_size >= DocumentProcessor.MMAP_THRESHOLD
+
+    segments = list(DocumentProcessor.iter_text_segments(path, segment_size=DocumentProcessor.SEGMENT_SIZE + 1))
+    assert len(segments) > 1
+    assert "".join(segments) == text
+
+
+def test_empty_file_has_no_segments(tmp_path):
+    path = tmp_path / "vacio.txt"
+    path.write_bytes(b"")
+    assert list(DocumentProcessor.iter_text_segments(path)) == []
+
+
+def test_memoryview_error_is_reported(tmp_path, monkeypatch):
+    def broken(data):
+        raise BufferError("sin buffer")
+
+    monkeypatch.setattr(document_processor, "memoryview", broken, raising=False)
+    path = tmp_path / "documento.txt"
+    path.write_text("hola", encoding="utf-8")
+    with pytest.raises(ValueError, match="sin buffer"):
+        list(DocumentProcessor.iter_text_segments(path))
+
+
+@pytest.fixture
+def rag():
+    embedded = []
+
+    def embedding(text):
+        embedded.append(text)
+        return pseudo_embedding(text, dim=8)
+
+    rag = RagManager(embedding_fn=embedding, chunk_size=200, chunk_overlap=40, persist_path=None)
+    rag.embedded = embedded
+    return rag
+
+
+@pytest.mark.parametrize("segment_size", [4096, 4096 + 3])
+def test_streaming_upsert_keeps_words_across_segment_boundaries(tmp_path, monkeypatch, rag, segment_size):
+    monkeypatch.setattr(DocumentProcessor, "MMAP_THRESHOLD", 16 * 1024)
+    text = make_text(8000)
+    path = tmp_path / "documento.txt"
+    path.write_text(text, encoding="utf-8")
+
+    segments = DocumentProcessor.iter_text_segments(path, segment_size=segment_size)
+    assert rag.add_document_stream(segments, "documento.txt", batch_size=16)
+
+    # Los cortes entre segmentos no pegan palabras ni dejan huecos: cada chunk es un
+    # fragmento del documento y continúa (o se solapa con) el anterior
+    end = 0
+    for chunk in rag.embedded:
+        assert len(chunk) <= 200
+        start = text.find(chunk, max(0, end - 200))
+        assert start != -1, chunk
+        assert text[end:start].strip() == ""
+        end = max(end, start + len(chunk))
+    assert text[end:].strip() == ""
+
+    points, _ = rag.client.scroll(rag.collection_name, limit=len(rag.embedded) + 1, with_payload=True)
+    assert len(points) == len(rag.embedded)
+    assert {point.payload['total_chunks'] for point in points} == {len(rag.embedded)}
+    assert sorted(point.payload['chunk_index'] for point in points) == list(range(len(rag.embedded)))
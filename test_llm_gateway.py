@@ -0,0 +1,134 @@
+""" Tests del gateway LLM (reintentos, circuit breaker, failover y proveedores lentos) """
+
+import pytest
+
+import utils.llm_gateway as llm_gateway
+from utils.api_client import LLMError
+from utils.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError
+
+
+class StubProvider:
+    """ Proveedor que falla las primeras `failures` veces (antes o después del primer chunk) """
+
+    def __init__(self, name, failures=0, fail_after_first_chunk=False):
+        self.name = name
+        self.failures = failures
+        self.fail_after_first_chunk = fail_after_first_chunk
+        self.calls = 0
+        self.raise_errors = False
+
+    def generate_response(self, prompt, messages, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.fail_after_first_chunk:
+                yield "parcial"
+            raise LLMError(self.name, "fallo simulado")
+        yield f"respuesta de {self.name}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ Reloj monótono controlado por el test """
+    now = [1000.0]
+    monkeypatch.setattr(llm_gateway.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_gateway(*providers, **kwargs):
+    kwargs.setdefault("backoff_base", 0)
+    return LLMGateway([(provider.name, provider) for provider in providers], **kwargs)
+
+
+def test_circuit_breaker_states(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+
+    clock[0] += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Una sola petición de prueba; si falla, el circuito se vuelve a abrir
+    assert breaker.allow_request() and not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock[0] += 30
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+
+def test_retries_before_failing_over():
+    first, second = StubProvider("a", failures=1), StubProvider("b")
+    gateway = make_gateway(first, second, max_retries=2)
+    assert "".join(gateway.generate_response("hola", None)) == "respuesta de a"
+    assert first.calls == 2 and second.calls == 0
+
+
+def test_failover_to_the_next_provider():
+    first, second = StubProvider("a", failures=10), StubProvider("b")
+    gateway = make_gateway(first, second, max_retries=1)
+    assert "".join(gateway.generate_response("hola", None)) == "respuesta de b"
+    stats = gateway.get_stats()
+    assert stats['a']['failures'] == 2 and stats['b']['failovers'] == 1
+
+
+def test_open_circuit_is_skipped(clock):
+    first, second = StubProvider("a", failures=10), StubProvider("b")
+    gateway = make_gateway(first, second, max_retries=0, failure_threshold=1)
+    "".join(gateway.generate_response("hola", None))
+    assert gateway.get_stats()['a']['circuit'] == CircuitBreaker.OPEN
+
+    "".join(gateway.generate_response("hola", None))
+    assert first.calls == 1 and second.calls == 2
+
+
+def test_error_after_the_first_chunk_is_not_retried():
+    first, second = StubProvider("a", failures=1, fail_after_first_chunk=True), StubProvider("b")
+    gateway = make_gateway(first, second)
+    stream = gateway.generate_response("hola", None)
+    assert next(stream) == "parcial"
+    with pytest.raises(LLMError):
+        next(stream)
+    assert second.calls == 0
+
+
+def test_all_providers_failing_raises_unavailable():
+    gateway = make_gateway(StubProvider("a", failures=10), StubProvider("b", failures=10), max_retries=0)
+    with pytest.raises(LLMUnavailableError) as info:
+        list(gateway.generate_response("hola", None))
+    assert len(info.value.errors) == 2
+
+
+def test_gateway_asks_providers_for_exceptions():
+    provider = StubProvider("a")
+    make_gateway(provider)
+    assert provider.raise_errors is True
+
+
+def test_slow_provider_is_demoted_and_probed_again(clock):
+    first, second = StubProvider("a"), StubProvider("b")
+    gateway = make_gateway(first, second, slow_threshold=10.0, probe_interval=60.0)
+
+    def order():
+        return [name for name, _ in gateway._ordered_providers()]
+
+    gateway._record_latency("a", 20.0)
+    assert order() == ["b", "a"]
+
+    # Pasado probe_interval recupera su posición en una petición (una sola prueba por intervalo)
+    clock[0] += 60
+    assert order() == ["a", "b"]
+    assert order() == ["b", "a"]
+
+    # La medida de la prueba sustituye a la media antigua
+    gateway._record_latency("a", 1.0)
+    assert gateway.get_stats()['a']['ewma_latency'] == 1.0
+    assert order() == ["a", "b"]
+
+
+def test_slow_threshold_none_keeps_priority_order():
+    gateway = make_gateway(StubProvider("a"), StubProvider("b"), slow_threshold=None)
+    gateway._record_latency("a", 1000.0)
+    assert [name for name, _ in gateway._ordered_providers()] == ["a", "b"]
@@ -0,0 +1,113 @@
+""" Tests del pool de servidores Ollama y de las peticiones duplicadas (hedging) """
+
+import socket
+import time
+
+import pytest
+
+from utils.api_client import OllamaClient
+from utils.fake_ollama_server import FakeOllamaServer
+from utils.ollama_pool import OllamaEndpointPool
+
+
+def free_url() -> str:
+    """ URL de un puerto local sin nadie escuchando """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def servers():
+    """ Arranca servidores Ollama simulados y los detiene al terminar """
+    started = []
+
+    def start(**kwargs):
+        kwargs = {'port': 0, 'ttft': 0.01, 'tokens_per_second': 2000, 'length_mean': 5, 'length_stddev': 0, **kwargs}
+        server = FakeOllamaServer(**kwargs).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def make_pool(**kwargs) -> OllamaEndpointPool:
+    return OllamaEndpointPool(["http://a", "http://b"], health_interval=0, **kwargs)
+
+
+def test_least_outstanding_spreads_requests():
+    pool = make_pool()
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first, 0.1, True)
+    assert pool.acquire() is first
+
+
+def test_exclude_and_exhaustion():
+    pool = make_pool()
+    first = pool.acquire()
+    second = pool.acquire(exclude=[first])
+    assert second is not first
+    assert pool.acquire(exclude=[first, second]) is None
+
+
+def test_ewma_prefers_the_faster_endpoint():
+    pool = make_pool(strategy="ewma")
+    slow, fast = pool.endpoints
+    pool.release(pool.acquire(exclude=[fast]), 2.0, True)
+    pool.release(pool.acquire(exclude=[slow]), 0.1, True)
+    assert all(pool.acquire() is fast for _ in range(3))
+
+
+def test_failing_endpoint_is_ejected_and_readmitted(monkeypatch):
+    pool = make_pool(eject_after=2, eject_duration=0)
+    bad, good = pool.endpoints
+    for _ in range(2):
+        pool.release(pool.acquire(exclude=[good]), None, False)
+    assert not bad.healthy and pool.healthy_count() == 1
+    assert pool.acquire() is good
+
+    # Con todos expulsados se sigue eligiendo alguno
+    assert pool.acquire(exclude=[good]) is bad
+
+    monkeypatch.setattr(pool, "probe", lambda endpoint: True)
+    pool.check_health()
+    assert bad.healthy and bad.ejections == 1
+
+
+def test_unreachable_endpoint_is_retried_on_another(servers):
+    server = servers()
+    client = OllamaClient(base_url=[free_url(), server.base_url], hedge_delay=None, raise_errors=True)
+    for _ in range(4):
+        assert "".join(client.generate_response("hola", [{'role': 'user', 'message': 'hola'}]))
+    assert server.stats['requests'] == 4
+
+
+def test_hedged_request_beats_a_stalled_endpoint(servers):
+    slow, fast = servers(ttft=3.0), servers()
+    client = OllamaClient(base_url=[slow.base_url, fast.base_url], balance_strategy="ewma",
+                          hedge_delay=0.1, raise_errors=True)
+    # El servidor lento parece el más rápido: se elige primero y la copia va al otro
+    slow_endpoint, fast_endpoint = client.endpoint_pool.endpoints
+    slow_endpoint.ewma_latency, fast_endpoint.ewma_latency = 0.0, 1.0
+
+    start = time.perf_counter()
+    text, _ = client.generate_auxiliary("¿ataque?", max_tokens=8)
+    assert text
+    assert time.perf_counter() - start < 1.5
+    assert slow.stats['requests'] == 1 and fast.stats['requests'] == 1
+
+
+def test_long_prompts_are_not_hedged(servers):
+    slow, fast = servers(ttft=0.3), servers()
+    client = OllamaClient(base_url=[slow.base_url, fast.base_url], balance_strategy="ewma",
+                          hedge_delay=0.05, hedge_max_prompt_chars=10, raise_errors=True)
+    slow_endpoint, fast_endpoint = client.endpoint_pool.endpoints
+    slow_endpoint.ewma_latency, fast_endpoint.ewma_latency = 0.0, 1.0
+
+    client.generate_auxiliary("un prompt bastante más largo que el límite", max_tokens=8)
+    assert slow.stats['requests'] == 1 and fast.stats['requests'] == 0
@@ -0,0 +1,69 @@
+""" Tests del ejecutor de llamadas auxiliares y de los valores por omisión de las tareas de seguridad """
+
+import threading
+
+import pytest
+
+from components.chat_interface import ChatInterface
+from config import DEFAULT_SETTINGS
+from utils.llm_metrics import call_purpose, get_call_purpose
+from utils.pipeline_executor import PipelineExecutor
+from utils.prompt_guardrails import PromptGuardrails
+from utils.prompt_service import PromptService
+
+
+@pytest.fixture
+def executor():
+    return PipelineExecutor(max_workers=4)
+
+
+def make_chat_interface() -> ChatInterface:
+    """ ChatInterface sin sesión de Streamlit (sólo con el servicio de prompts) """
+    chat = object.__new__(ChatInterface)
+    chat.prompt_service = PromptService()
+    return chat
+
+
+def fail():
+    raise RuntimeError("el LLM de análisis no responde")
+
+
+def test_gather_returns_results(executor):
+    futures = {'a': executor.submit("a", lambda: 1), 'b': executor.submit("b", lambda x: x * 2, 21)}
+    assert executor.gather(futures) == {'a': 1, 'b': 42}
+    assert all(future.duration is not None for future in futures.values())
+
+
+def test_failed_and_timed_out_tasks_get_their_default(executor):
+    release = threading.Event()
+    futures = {
+        'failed': executor.submit("failed", fail),
+        'slow': executor.submit("slow", release.wait),
+        'other': executor.submit("other", fail),
+    }
+    results = executor.gather(futures, timeout=0.2, defaults={'failed': "bloqueado", 'slow': "bloqueado"})
+    release.set()
+    assert results == {'failed': "bloqueado", 'slow': "bloqueado", 'other': None}
+
+
+def test_tasks_run_with_the_caller_context(executor):
+    with call_purpose("guardrail"):
+        future = executor.submit("purpose", get_call_purpose)
+    assert executor.gather({'purpose': future}) == {'purpose': "guardrail"}
+
+
+def test_failed_attack_task_fails_closed(executor):
+    # Mismos valores por omisión que usa el chat para la tarea de ataques y el pre-análisis
+    attack_failure = make_chat_interface()._guardrail_failure()
+    futures = {'attack': executor.submit("attack", fail), 'analysis': executor.submit("analysis", fail)}
+    results = executor.gather(futures, defaults={
+        'attack': attack_failure,
+        'analysis': {'error': attack_failure},
+    })
+    assert results['attack'] == PromptGuardrails.get_unavailable_message()
+    assert results['analysis']['error'] == PromptGuardrails.get_unavailable_message()
+
+
+def test_failed_attack_task_passes_when_fail_open(monkeypatch):
+    monkeypatch.setitem(DEFAULT_SETTINGS, "guardrail_fail_closed", False)
+    assert make_chat_interface()._guardrail_failure() is None
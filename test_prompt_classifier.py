@@ -0,0 +1,79 @@
+""" Tests del clasificador local de PromptType """
+
+import json
+
+import pytest
+
+import utils.prompt_service as prompt_service
+from config import DEFAULT_SETTINGS
+from utils.prompt_classifier import PACKAGE_ROOT, PromptClassifier, resolve_model_path
+from utils.prompt_service import PromptService, PromptType
+from test_prompt_guardrails import StubLLMClient
+
+EXAMPLES = {
+    'debugging': ["Me sale KeyError al acceder al diccionario", "Mi programa lanza una excepción al arrancar"],
+    'explanation': ["¿Qué es un decorador en Python?", "Explícame qué es la recursividad"],
+}
+
+
+def test_train_and_predict():
+    classifier = PromptClassifier().train(EXAMPLES)
+    label, confidence = classifier.predict("¿por qué me sale un KeyError en el diccionario?")
+    assert label == "debugging" and 0 < confidence <= 1
+    assert classifier.predict("explícame qué es un decorador")[0] == "explanation"
+    # Sin ninguna característica conocida no hay etiqueta
+    assert classifier.predict("zzzz") == (None, 0.0)
+
+
+def test_saved_model_is_retrained_when_the_seeds_change(tmp_path):
+    seeds = tmp_path / "seeds.json"
+    model = tmp_path / "modelo" / "classifier.json"
+    seeds.write_text(json.dumps({'examples': EXAMPLES}), encoding="utf-8")
+    first = PromptClassifier.from_seeds(seeds, str(model))
+    assert model.exists()
+    assert PromptClassifier.from_seeds(seeds, str(model)).centroids == first.centroids
+
+    seeds.write_text(json.dumps({'examples': {**EXAMPLES, 'learning': ["Dame un roadmap para aprender Rust"]}}), encoding="utf-8")
+    assert "learning" in PromptClassifier.from_seeds(seeds, str(model)).centroids
+
+
+def test_relative_model_path_is_resolved_from_the_package_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert resolve_model_path("models/prompt_classifier.json") == PACKAGE_ROOT / "models" / "prompt_classifier.json"
+    assert resolve_model_path(str(tmp_path / "modelo.json")) == tmp_path / "modelo.json"
+    assert resolve_model_path(None) is None
+
+
+@pytest.fixture
+def local_classifier(monkeypatch):
+    monkeypatch.setitem(DEFAULT_SETTINGS, "prompt_classifier_enabled", True)
+    classifier = PromptClassifier().train(EXAMPLES)
+    monkeypatch.setattr(prompt_service, "get_prompt_classifier", lambda: classifier)
+    return classifier
+
+
+def test_confident_prediction_skips_the_llm(local_classifier, monkeypatch):
+    monkeypatch.setitem(DEFAULT_SETTINGS, "prompt_classifier_threshold", 0.1)
+    client = StubLLMClient("explanation")
+    service = PromptService(llm_Client=client, enable_guardrails=False)
+    assert service.detect_prompt_type("Me sale KeyError al acceder al diccionario") == PromptType.DEBUGGING
+    assert client.calls == 0
+
+
+def test_prediction_below_the_threshold_asks_the_llm(local_classifier, monkeypatch):
+    text = "Me sale KeyError al acceder al diccionario"
+    _, confidence = local_classifier.predict(text)
+    monkeypatch.setitem(DEFAULT_SETTINGS, "prompt_classifier_threshold", confidence + 0.01)
+    client = StubLLMClient("explanation")
+    service = PromptService(llm_Client=client, enable_guardrails=False)
+    assert service.classify_locally(text) is None
+    assert service.detect_prompt_type(text) == PromptType.EXPLANATION
+    assert client.calls == 1
+
+
+def test_disabled_classifier_always_asks_the_llm(local_classifier, monkeypatch):
+    monkeypatch.setitem(DEFAULT_SETTINGS, "prompt_classifier_enabled", False)
+    client = StubLLMClient("debugging")
+    service = PromptService(llm_Client=client, enable_guardrails=False)
+    assert service.detect_prompt_type("¿Qué es un decorador en Python?") == PromptType.DEBUGGING
+    assert client.calls == 1
@@ -0,0 +1,95 @@
+""" Tests de la caché de respuestas exactas """
+
+import utils.response_cache as response_cache
+from utils.api_client import AuxiliaryCallMixin
+from utils.llm_metrics import InstrumentedLLMClient, MetricsRegistry
+from utils.response_cache import CachedLLMClient, ResponseCache
+
+
+class StubLLMClient(AuxiliaryCallMixin):
+    """ Cliente que responde siempre con los mismos chunks y cuenta las llamadas """
+
+    def __init__(self, chunks=("SEGURO", " y", " nada", " más")):
+        self.model = "stub"
+        self.chunks = list(chunks)
+        self.calls = 0
+
+    def generate_response(self, prompt, messages, **kwargs):
+        self.calls += 1
+        yield from self.chunks
+
+
+def test_deterministic_calls_are_served_from_the_cache():
+    client = StubLLMClient()
+    cached = CachedLLMClient(client, ResponseCache())
+    first = list(cached.generate_response("hola", [], temperature=0))
+    assert list(cached.generate_response("hola", [], temperature=0)) == first
+    assert client.calls == 1
+
+    # Otro prompt, otros parámetros u otra temperatura no comparten respuesta
+    list(cached.generate_response("adiós", [], temperature=0))
+    list(cached.generate_response("hola", [], temperature=0, max_tokens=8))
+    list(cached.generate_response("hola", [], temperature=0.7))
+    list(cached.generate_response("hola", [], temperature=0.7))
+    assert client.calls == 5
+
+
+def test_error_responses_are_not_cached():
+    client = StubLLMClient(["❌ Error: Ollama no respondió a tiempo"])
+    cached = CachedLLMClient(client, ResponseCache())
+    list(cached.generate_response("hola", [], temperature=0))
+    list(cached.generate_response("hola", [], temperature=0))
+    assert client.calls == 2
+
+
+def test_abandoned_stream_is_not_cached():
+    client = StubLLMClient()
+    cached = CachedLLMClient(client, ResponseCache())
+    stream = cached.generate_response("hola", [], temperature=0)
+    next(stream)
+    stream.close()
+    list(cached.generate_response("hola", [], temperature=0))
+    assert client.calls == 2
+
+
+def test_auxiliary_call_closed_with_a_complete_answer_is_cached():
+    client = StubLLMClient()
+    cached = CachedLLMClient(client, ResponseCache())
+    parse = lambda text: "SEGURO" if "SEGURO" in text else None
+    assert cached.generate_auxiliary("¿ataque?", parse=parse) == ("SEGURO", "SEGURO")
+    assert cached.generate_auxiliary("¿ataque?", parse=parse) == ("SEGURO", "SEGURO")
+    assert client.calls == 1
+
+
+def test_instrumented_clients_are_keyed_by_the_wrapped_provider():
+    class OtherStubLLMClient(StubLLMClient):
+        pass
+
+    # Mismo modelo en dos proveedores envueltos en InstrumentedLLMClient: no comparten respuesta
+    cache = ResponseCache()
+    first, second = StubLLMClient(["uno"]), OtherStubLLMClient(["dos"])
+    registry = MetricsRegistry()
+    assert "".join(CachedLLMClient(InstrumentedLLMClient(first, registry), cache).generate_response("hola", [], temperature=0)) == "uno"
+    assert "".join(CachedLLMClient(InstrumentedLLMClient(second, registry), cache).generate_response("hola", [], temperature=0)) == "dos"
+    assert first.calls == 1 and second.calls == 1
+
+
+def test_sqlite_level_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "responses.db")
+    ResponseCache(sqlite_path=path).set("clave", ["hola", " mundo"])
+    cache = ResponseCache(sqlite_path=path)
+    assert cache.get("clave") == ["hola", " mundo"]
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(max_entries=2, ttl=10)
+    cache.set("a", ["a"])
+    cache.set("b", ["b"])
+    cache.get("a")
+    cache.set("c", ["c"])
+    assert cache.get("b") is None
+    now[0] += 11
+    assert cache.get("a") is None and cache.get("c") is None
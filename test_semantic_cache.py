@@ -0,0 +1,91 @@
+""" Tests de la caché semántica de respuestas """
+
+from utils.fake_ollama_server import pseudo_embedding
+from utils.semantic_cache import SemanticCache, normalize_query
+
+FINGERPRINT = SemanticCache.fingerprint("template", "modelo")
+
+
+class CountingEmbedding:
+    """ Pseudo-embeddings deterministas (sin servidor) que cuentan las llamadas """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return pseudo_embedding(text, dim=256)
+
+
+def make_cache(**kwargs):
+    embedding = CountingEmbedding()
+    cache = SemanticCache(embedding_fn=embedding, **kwargs)
+    cache.store("¿Qué es una closure en Python?", "explanation", FINGERPRINT, "Una closure es...", generation_time=2.0)
+    return cache, embedding
+
+
+def test_normalize_query():
+    assert normalize_query("  ¿Qué   es PYTHON? ") == "qué es python"
+
+
+def test_exact_match_after_normalizing_skips_the_embedding():
+    cache, embedding = make_cache()
+    hit = cache.lookup("qué es una closure en python", "explanation", FINGERPRINT)
+    assert hit['answer'] == "Una closure es..." and hit['similarity'] == 1.0
+    assert embedding.calls == 1
+    assert cache.get_stats()['latency_saved'] == 2.0
+
+
+def test_similar_query_is_served_and_unrelated_is_not():
+    cache, _ = make_cache(threshold=0.8)
+    assert cache.lookup("¿Qué es una closure en Python exactamente?", "explanation", FINGERPRINT) is not None
+    assert cache.lookup("¿Cómo configuro un servidor nginx?", "explanation", FINGERPRINT) is None
+
+
+def test_only_same_prompt_type_and_fingerprint():
+    cache, _ = make_cache()
+    query = "¿Qué es una closure en Python?"
+    assert cache.lookup(query, "debugging", FINGERPRINT) is None
+    assert cache.lookup(query, "explanation", SemanticCache.fingerprint("template", "otro")) is None
+
+
+def test_invalidate_by_fingerprint():
+    cache, _ = make_cache()
+    other = SemanticCache.fingerprint("otro template", "modelo")
+    cache.store("¿Qué es un decorador?", "explanation", other, "Un decorador es...")
+    cache.invalidate(FINGERPRINT)
+    assert cache.get_stats()['entries'] == 1
+    assert cache.lookup("¿Qué es un decorador?", "explanation", other) is not None
+
+
+def test_max_entries_drops_the_oldest():
+    cache, _ = make_cache(max_entries=1)
+    cache.store("¿Qué es un decorador?", "explanation", FINGERPRINT, "Un decorador es...")
+    assert cache.lookup("¿Qué es una closure en Python?", "explanation", FINGERPRINT) is None
+    assert cache.lookup("¿Qué es un decorador?", "explanation", FINGERPRINT) is not None
+
+
+def test_embedding_errors_disable_the_cache():
+    def broken(text):
+        raise ConnectionError("sin servidor de embeddings")
+
+    cache = SemanticCache(embedding_fn=broken)
+    cache.store("¿Qué es Python?", "general", FINGERPRINT, "Python es...")
+    assert cache.get_stats()['entries'] == 0
+    assert cache.lookup("¿Qué es Python?", "general", FINGERPRINT) is None
+
+
+def test_store_reuses_the_embedding_computed_by_lookup():
+    cache, embedding = make_cache()
+    query = "¿Cómo configuro un servidor nginx?"
+    assert cache.lookup(query, "explanation", FINGERPRINT) is None
+    cache.store(query, "explanation", FINGERPRINT, "Para configurar nginx...")
+    assert embedding.calls == 2
+    assert cache.lookup("cómo configuro un servidor NGINX", "explanation", FINGERPRINT) is not None
+
+
+def test_fingerprint_depends_on_the_generation_parameters():
+    base = SemanticCache.fingerprint("template", "modelo", 0.7, 1024)
+    assert base == SemanticCache.fingerprint("template", "modelo", 0.7, 1024)
+    assert base != SemanticCache.fingerprint("template", "modelo", 0.2, 1024)
+    assert base != SemanticCache.fingerprint("template", "modelo", 0.7, 256)
@@ -0,0 +1,76 @@
+""" Tests de la selección de intercambios por embeddings """
+
+import numpy as np
+
+from utils.context_strategies import SmartSelectionStrategy
+
+TOPICS = ["python", "cocina", "coches", "música"]
+
+
+class TopicEmbedding:
+    """ Embedding de un tema por palabra clave (sin servidor) que registra los textos """
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return np.array([1.0 if topic in text.lower() else 0.0 for topic in TOPICS] + [0.1])
+
+
+def exchange(user, *answers):
+    return [{'role': "user", 'message': user}] + [{'role': "assistant", 'message': answer} for answer in answers]
+
+
+HISTORY = (
+    exchange("¿Cómo ordeno listas en Python?", "En python se usa sorted")
+    + exchange("Una receta de cocina rápida", "Tortilla: la cocina española...")
+    + exchange("¿Qué aceite lleva el motor de coches diésel?", "Depende de los coches")
+    + exchange("¿Qué es un decorador?", "Una función que envuelve a otra en python", "Ejemplo: @lru_cache")
+    + exchange("Recomiéndame música para programar", "Música lo-fi")
+)
+QUERY = {'role': "user", 'message': "¿Y cómo lo aplico en Python?"}
+
+
+def make_strategy(embedding, state=None, max_selected=2):
+    return SmartSelectionStrategy(None, max_selected=max_selected, selector="embedding", embedding_fn=embedding, state=state)
+
+
+def test_most_similar_exchanges_are_kept_whole_and_in_order():
+    strategy = make_strategy(TopicEmbedding())
+    system = {'role': "system", 'message': "resumen"}
+    result = strategy.optimize([system] + HISTORY + [QUERY], QUERY['message'])
+    # Los intercambios 0 y 3 (con sus dos respuestas), en orden cronológico, y la consulta al final
+    assert result == [system] + HISTORY[0:2] + HISTORY[6:9] + [QUERY]
+    assert strategy.get_stats()['selection_ms'] is not None
+
+
+def test_message_vectors_are_reused_from_the_state():
+    embedding = TopicEmbedding()
+    state = {}
+    make_strategy(embedding, state).optimize(HISTORY + [QUERY], QUERY['message'])
+    assert len(state['embeddings']['vectors']) == len(HISTORY)
+
+    # Siguiente turno: sólo se calculan la nueva pregunta y los mensajes nuevos
+    messages = HISTORY + [QUERY, {'role': "assistant", 'message': "Con un decorador de python"}]
+    query = {'role': "user", 'message': "¿Y para cocina?"}
+    strategy = make_strategy(embedding, state)
+    embedding.texts = []
+    result = strategy.optimize(messages + [query], query['message'])
+    assert strategy.embedded_messages == 2
+    assert embedding.texts == [QUERY['message'], "Con un decorador de python", query['message']]
+    assert HISTORY[2:4] == result[:2] and result[-1] == query
+
+    # Vectores de otro modelo de embeddings: se descartan y se recalculan
+    state['embeddings']['model'] = "otro"
+    strategy = make_strategy(embedding, state)
+    strategy.optimize(messages + [query], query['message'])
+    assert strategy.embedded_messages == len(messages)
+
+
+def test_embedding_failure_falls_back_to_the_latest_exchanges():
+    def broken(text):
+        raise ConnectionError("sin servidor de embeddings")
+
+    messages = HISTORY + [QUERY]
+    assert make_strategy(broken).optimize(messages, QUERY['message']) == messages[-4:]
@@ -0,0 +1,62 @@
+""" Tests de la generación especulativa de la respuesta """
+
+import threading
+
+import pytest
+
+from components.chat_interface import ChatInterface
+from utils.api_client import AuxiliaryCallMixin, GenerationHandle
+from utils.prompt_service import PromptService
+from utils.speculative_generation import SpeculativeGeneration
+
+
+def answer(chunks, gate:threading.Event = None, error:Exception = None):
+    """ Generador de respuesta; si se indica gate, espera a él después del primer chunk """
+    for i, chunk in enumerate(chunks):
+        if i == 1 and gate is not None:
+            gate.wait(timeout=5)
+        yield chunk
+    if error is not None:
+        raise error
+
+
+class StubAnalysisClient(AuxiliaryCallMixin):
+    def __init__(self, response):
+        self.model = "stub"
+        self.response = response
+
+    def generate_response(self, prompt, messages, **kwargs):
+        yield self.response
+
+
+def test_released_answer_includes_the_held_chunks():
+    speculative = SpeculativeGeneration(GenerationHandle(answer(["Hola", ", ", "mundo"]))).start()
+    speculative._thread.join(timeout=5)
+    assert "".join(speculative.release()) == "Hola, mundo"
+    assert speculative.get_stats()['held_chunks'] == 3
+
+
+def test_discard_cancels_the_generation():
+    gate = threading.Event()
+    handle = GenerationHandle(answer(["secreto", " más", " texto"], gate))
+    speculative = SpeculativeGeneration(handle).start()
+    speculative.discard()
+    gate.set()
+    speculative._thread.join(timeout=5)
+    assert handle.cancelled
+    assert speculative.get_stats()['discarded'] is True
+
+
+def test_provider_errors_are_raised_on_release():
+    speculative = SpeculativeGeneration(GenerationHandle(answer(["Hola"], error=RuntimeError("caído")))).start()
+    with pytest.raises(RuntimeError):
+        list(speculative.release())
+
+
+@pytest.mark.parametrize("verdict, blocked", [("ATAQUE", True), ("SEGURO", False)])
+def test_fused_pre_analysis_gives_the_speculation_verdict(offline_guardrails, verdict, blocked):
+    # Con el pre-análisis fusionado y especulación, la tarea de ataques es el error del pre-análisis
+    chat = object.__new__(ChatInterface)
+    response = f'{{"category": "general", "verdict": "{verdict}", "confidence": 0.9}}'
+    chat.prompt_service = PromptService(analysis_llm_client=StubAnalysisClient(response))
+    assert (chat._preanalysis_error("consulta") is not None) is blocked
@@ -0,0 +1,87 @@
+""" Tests del resumen incremental de SummaryStrategy y de su estado persistente """
+
+import json
+
+from utils.context_strategies import SummaryStrategy
+
+
+class StubSummaryClient:
+    """ Cliente que devuelve "resumen N" y guarda los prompts recibidos """
+
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    def generate_response(self, prompt, messages, **kwargs):
+        self.prompts.append(prompt)
+        if self.fail:
+            yield "❌ Error: Ollama no respondió a tiempo"
+            return
+        yield f"resumen {len(self.prompts)}"
+
+
+def make_messages(count:int):
+    return [{'role': "user" if i % 2 == 0 else "assistant", 'message': f"mensaje {i}"} for i in range(count)]
+
+
+def make_strategy(client, state=None, **kwargs):
+    return SummaryStrategy(client, keep_recent=3, summarize_thresold=7, state=state, **kwargs)
+
+
+def test_short_conversations_are_not_summarized():
+    client = StubSummaryClient()
+    messages = make_messages(7)
+    assert make_strategy(client).optimize(messages) == messages
+    assert client.prompts == []
+
+
+def test_summary_is_stored_in_the_state():
+    state = {}
+    result = make_strategy(StubSummaryClient(), state).optimize(make_messages(10))
+    assert result[0]['role'] == "system" and "resumen 1" in result[0]['message']
+    assert [msg['message'] for msg in result[1:]] == ["mensaje 7", "mensaje 8", "mensaje 9"]
+    assert state['summary']['count'] == 7
+    # El estado se guarda con la conversación en JSON
+    assert json.loads(json.dumps(state)) == state
+
+
+def test_next_turns_only_summarize_the_new_messages():
+    client = StubSummaryClient()
+    state = {}
+    make_strategy(client, state).optimize(make_messages(10))
+    # Una estrategia nueva (siguiente rerun) con el mismo estado
+    make_strategy(client, state).optimize(make_messages(12))
+
+    assert len(client.prompts) == 2
+    assert "RESUMEN ANTERIOR:\n        resumen 1" in client.prompts[1]
+    assert "mensaje 7" in client.prompts[1] and "mensaje 8" in client.prompts[1]
+    assert "mensaje 6" not in client.prompts[1]
+    assert state['summary']['count'] == 9
+
+
+def test_unchanged_conversation_reuses_the_summary():
+    client = StubSummaryClient()
+    state = {}
+    make_strategy(client, state).optimize(make_messages(10))
+    make_strategy(client, state).optimize(make_messages(10))
+    assert len(client.prompts) == 1
+
+
+def test_edited_messages_are_summarized_again():
+    client = StubSummaryClient()
+    state = {}
+    make_strategy(client, state).optimize(make_messages(10))
+    messages = make_messages(10)
+    messages[1]['message'] = "mensaje editado"
+    make_strategy(client, state).optimize(messages)
+    assert "RESUMEN ANTERIOR" not in client.prompts[1]
+    assert "mensaje editado" in client.prompts[1]
+
+
+def test_failed_summary_keeps_the_previous_one():
+    state = {}
+    make_strategy(StubSummaryClient(), state).optimize(make_messages(10))
+    previous = dict(state['summary'])
+    result = make_strategy(StubSummaryClient(fail=True), state).optimize(make_messages(12))
+    assert state['summary'] == previous
+    assert "resumen 1" in result[0]['message']
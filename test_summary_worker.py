@@ -0,0 +1,105 @@
+""" Tests del resumen de la conversación en segundo plano """
+
+import threading
+import time
+
+from utils.context_strategies import SummaryStrategy
+from utils.summary_worker import SummaryWorker
+
+
+class BlockingSummaryClient:
+    """ Cliente de resumen que espera a que el test lo deje terminar """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+
+    def generate_response(self, prompt, messages, **kwargs):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(timeout=5)
+        yield f"resumen {self.calls}"
+
+
+def make_messages(count:int):
+    return [{'role': "user" if i % 2 == 0 else "assistant", 'message': f"mensaje {i}"} for i in range(count)]
+
+
+def make_strategy(client, state):
+    return SummaryStrategy(client, keep_recent=3, summarize_thresold=7, state=state, background=True)
+
+
+def wait_idle(worker:SummaryWorker, timeout:float = 5.0):
+    deadline = time.monotonic() + timeout
+    while worker.get_stats()['running'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_without_summary_uses_the_messages_up_to_the_threshold():
+    client = BlockingSummaryClient()
+    strategy = make_strategy(client, {})
+    result = strategy.optimize(make_messages(12))
+    assert [msg['message'] for msg in result] == [f"mensaje {i}" for i in range(5, 12)]
+    assert strategy.summary_ready is False
+    assert client.calls == 0
+
+
+def test_refresh_prepares_the_summary_for_the_next_query():
+    client = BlockingSummaryClient()
+    client.release.set()
+    state = {}
+    make_strategy(client, state).refresh(make_messages(10))
+    # La siguiente consulta añade un mensaje: el resumen cubre todo salvo los keep_recent últimos
+    strategy = make_strategy(client, state)
+    result = strategy.optimize(make_messages(11))
+    assert strategy.summary_ready is True
+    assert "resumen 1" in result[0]['message']
+    assert [msg['message'] for msg in result[1:]] == ["mensaje 8", "mensaje 9", "mensaje 10"]
+
+
+def test_turns_of_the_same_conversation_are_coalesced():
+    client = BlockingSummaryClient()
+    worker = SummaryWorker()
+    state = {}
+    worker.schedule("conv_1", make_strategy(client, state), make_messages(10))
+    assert client.started.wait(timeout=5)
+    assert worker.is_running("conv_1")
+
+    # Mientras se resume llegan dos turnos: sólo se resume el último
+    worker.schedule("conv_1", make_strategy(client, state), make_messages(12))
+    worker.schedule("conv_1", make_strategy(client, state), make_messages(14))
+    client.release.set()
+    wait_idle(worker)
+
+    assert client.calls == 2
+    assert state['summary']['count'] == 12
+    assert worker.get_stats() == {'scheduled': 3, 'runs': 2, 'coalesced': 1, 'errors': 0, 'running': 0}
+    assert not worker.is_running("conv_1")
+
+
+def test_jobs_are_keyed_by_conversation_not_by_state():
+    # Recargar la conversación crea otro diccionario de estado: sigue siendo la misma conversación
+    client = BlockingSummaryClient()
+    worker = SummaryWorker(max_workers=2)
+    worker.schedule("conv_1", make_strategy(client, {}), make_messages(10))
+    assert client.started.wait(timeout=5)
+    worker.schedule("conv_1", make_strategy(client, {}), make_messages(12))
+    assert worker.get_stats()['running'] == 1
+    client.release.set()
+    wait_idle(worker)
+    assert worker.get_stats()['runs'] == 2
+
+
+def test_errors_are_counted_and_do_not_block_the_conversation():
+    class BrokenStrategy:
+        state = {}
+
+        def refresh(self, messages):
+            raise RuntimeError("fallo simulado")
+
+    worker = SummaryWorker()
+    worker.schedule("conv_1", BrokenStrategy(), make_messages(10))
+    wait_idle(worker)
+    assert worker.get_stats()['errors'] == 1
+    assert not worker.is_running("conv_1")
@@ -1,14 +1,34 @@
-from .api_client import GeminiClient, OpenAIClient, OllamaClient
+from .api_client import GeminiClient, OpenAIClient, OllamaClient, GenerationHandle
+from .async_api_client import AsyncGeminiClient, AsyncOpenAIClient, AsyncOllamaClient
+from .llm_gateway import LLMGateway, create_llm_gateway
+from .response_cache import ResponseCache, CachedLLMClient, get_response_cache
+from .semantic_cache import SemanticCache, get_semantic_cache
+from .llm_metrics import MetricsRegistry, InstrumentedLLMClient, call_purpose, get_metrics_registry
 from .prompt_service import PromptService, PromptType
+from .prompt_classifier import PromptClassifier, get_prompt_classifier
 from .prompt_guardrails import PromptGuardrails
+from .attack_index import AttackIndex, get_attack_index
+from .guardrail_cache import GuardrailVerdictCache, get_guardrail_cache
+from .speculative_generation import SpeculativeGeneration
+from .output_guardrail import OutputGuardrail, get_output_guardrail
 from .token_manager import TokenManager
 from .context_strategies import SlidingWindowStrategy, SmartSelectionStrategy, SummaryStrategy
+from .summary_worker import SummaryWorker, get_summary_worker
 from .json_storage import JSONStorage
 from .conversation_storage import ConversationStorage
 from .rag_manager import RagManager
 
-__all__ = ['GeminiClient', 'OpenAIClient', 'OllamaClient', 
+__all__ = ['GeminiClient', 'OpenAIClient', 'OllamaClient', 'GenerationHandle',
+           'AsyncGeminiClient', 'AsyncOpenAIClient', 'AsyncOllamaClient',
+           'LLMGateway', 'create_llm_gateway',
+           'ResponseCache', 'CachedLLMClient', 'get_response_cache',
+           'SemanticCache', 'get_semantic_cache',
+           'MetricsRegistry', 'InstrumentedLLMClient', 'call_purpose', 'get_metrics_registry',
            'PromptService', 'PromptType', 'PromptGuardrails', 
+           'PromptClassifier', 'get_prompt_classifier',
+           'AttackIndex', 'get_attack_index', 'GuardrailVerdictCache', 'get_guardrail_cache',
+           'SpeculativeGeneration', 'OutputGuardrail', 'get_output_guardrail',
            'TokenManager', 'SlidingWindowStrategy', 'SmartSelectionStrategy', 'SummaryStrategy',
+           'SummaryWorker', 'get_summary_worker',
            'JSONStorage','ConversationStorage',
            'RagManager']
\ No newline at end of file
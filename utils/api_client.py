@@ -1,29 +1,335 @@
 import os
+import contextvars
+import socket
 import google.genai as genai
 from openai import OpenAI
 from config import DEFAULT_SETTINGS
-from typing import Generator, List, Optional, Dict, Any
+from typing import Callable, Generator, Iterator, List, Optional, Dict, Any, Tuple, Sequence, Union
+import queue
+import threading
+import time
 # Para hacer peticiones HTTP
 import requests 
+from requests.adapters import HTTPAdapter
 import json
+import logging
 
+from utils.ollama_pool import OllamaEndpoint, get_endpoint_pool
 
-class GeminiClient:
+
+# Sesiones HTTP compartidas por (base_url, tamaño del pool).
+# Streamlit crea clientes nuevos en cada rerun, así que la sesión
+# (y sus conexiones keep-alive) se comparte entre todas las instancias.
+logger = logging.getLogger(__name__)
+
+_sessions: Dict[Tuple[str, int, bool], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+# Prefijos del texto que devuelven los clientes cuando falla una petición (raise_errors=False)
+ERROR_PREFIXES = ("Error al generar respuesta:", "❌ Error")
+
+
+def is_error_response(text:str) -> bool:
+    """ Indica si una respuesta es el texto de error de un cliente y no salida del modelo """
+    return text.lstrip().startswith(ERROR_PREFIXES)
+
+
+class LLMError(Exception):
+    """ Error base de los clientes LLM (sólo con raise_errors=True) """
+
+    def __init__(self, provider:str, message:str):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+
+
+class LLMConnectionError(LLMError):
+    """ No se pudo contactar con el proveedor o no respondió a tiempo """
+
+
+class LLMResponseError(LLMError):
+    """ El proveedor respondió con un error """
+
+
+_current_handle = contextvars.ContextVar("generation_handle", default=None)
+
+
+class GenerationHandle:
+    """
+    Generación en curso que se puede cancelar desde cualquier hilo
+
+    Envuelve el generador de generate_response. close() / cancel() dejan de
+    leer la respuesta y cierran la conexión con el proveedor, que deja de
+    generar en lugar de terminar los max_tokens para nadie. Si la petición
+    aún espera la cabecera de la respuesta, la cancelación se aplica al
+    llegar el primer chunk.
+
+    Ejemplo:
+        handle = GenerationHandle(llm_client.generate_response(prompt, messages))
+        for chunk in handle:
+            ...
+        handle.cancel()  # desde otro hilo / rerun
+    """
+
+    def __init__(self, generator:Iterator[str]):
+        self._generator = generator
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.finished = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def __iter__(self) -> "GenerationHandle":
+        return self
+
+    def __next__(self) -> str:
+        if self.cancelled:
+            self.close()
+            raise StopIteration
+        # Los clientes registran aquí cómo abortar su petición (ver _on_cancel)
+        token = _current_handle.set(self)
+        try:
+            chunk = next(self._generator)
+        except Exception:
+            # Fin del stream o error del proveedor: el generador ya ha terminado
+            self.finished = True
+            raise
+        finally:
+            _current_handle.reset(token)
+        if self.cancelled:
+            self.close()
+            raise StopIteration
+        return chunk
+
+    def on_cancel(self, callback:Callable[[], None]):
+        """ Registra una función que aborta la petición en curso """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """ Cancela la generación (seguro desde cualquier hilo) """
+        with self._lock:
+            if self.cancelled or self.finished:
+                return
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as ex:
+                logger.debug(f"Error abortando la generación: {ex}")
+
+    def close(self):
+        """ Cancela la generación y libera el generador """
+        self.cancel()
+        try:
+            self._generator.close()
+        except ValueError:
+            # El generador se está leyendo en otro hilo: se cerrará al recibir el siguiente chunk
+            pass
+        self.finished = True
+
+    def __enter__(self) -> "GenerationHandle":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _on_cancel(callback:Callable[[], None]):
+    """ Registra cómo abortar la petición actual si se está leyendo a través de un GenerationHandle """
+    handle = _current_handle.get()
+    if handle is not None:
+        handle.on_cancel(callback)
+
+
+def _generation_cancelled() -> bool:
+    """ True si la generación que se está leyendo ha sido cancelada """
+    handle = _current_handle.get()
+    return handle is not None and handle.cancelled
+
+
+def _abort_response(response:requests.Response):
+    """
+    Corta la conexión de una respuesta en streaming
+
+    shutdown() despierta al hilo bloqueado leyendo el socket (close() no lo
+    hace) y Ollama aborta la generación al detectar la desconexión.
+    """
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+# True mientras generate_auxiliary cierra un stream porque ya tiene una respuesta válida
+# (los envoltorios lo consultan para no tratar ese cierre como una cancelación)
+_closing_complete_answer = contextvars.ContextVar("closing_complete_answer", default=False)
+
+
+def closed_with_complete_answer() -> bool:
+    """ Indica si el stream se está cerrando porque la respuesta auxiliar ya está completa """
+    return _closing_complete_answer.get()
+
+
+# True mientras se lee una llamada auxiliar (los clientes ajustan el razonamiento y su presupuesto de tokens)
+_auxiliary_call = contextvars.ContextVar("auxiliary_call", default=False)
+
+
+class AuxiliaryCallMixin:
+    """
+    Llamadas auxiliares (clasificación, detección de ataques, selección de
+    mensajes, títulos): salida corta, determinista y acotada, y el stream se
+    cierra en cuanto hay una respuesta válida para no seguir generando.
+
+    La clase que lo incluye debe implementar generate_response.
+    """
+
+    def generate_auxiliary(
+            self,
+            prompt:str,
+            max_tokens:int = 32,
+            stop:Optional[Sequence[str]] = None,
+            response_format:Optional[str] = None,
+            parse:Optional[Callable[[str], Any]] = None,
+            temperature:float = 0,
+        ) -> Tuple[str, Any]:
+        """
+        Genera una respuesta auxiliar corta
+
+        Args:
+            prompt: El prompt para enviar al modelo
+            max_tokens: Tokens máximos de salida
+            stop: Secuencias de parada (se aplican también en el cliente)
+            response_format: "json" para pedir salida JSON al proveedor
+            parse: Función que interpreta el texto recibido hasta el momento y
+                   retorna None mientras la respuesta no sea válida; en cuanto
+                   retorna otra cosa se cierra el stream
+            temperature: Temperatura (0 por defecto: respuesta determinista y cacheable)
+
+        Returns:
+            Tupla (texto recibido, resultado de parse o None)
+        """
+        kwargs = self._auxiliary_kwargs(max_tokens, stop, response_format, temperature)
+        generator = self.generate_response(prompt, [], **kwargs)
+        text = ""
+        parsed = None
+        complete = False
+        # El cuerpo del generador (que construye la petición) se ejecuta dentro del bucle
+        auxiliary_token = _auxiliary_call.set(True)
+        try:
+            for chunk in generator:
+                text, parsed, complete = self._auxiliary_step(text, chunk, stop, parse)
+                if complete:
+                    break
+        finally:
+            token = _closing_complete_answer.set(complete)
+            try:
+                generator.close()
+            finally:
+                _closing_complete_answer.reset(token)
+                _auxiliary_call.reset(auxiliary_token)
+
+        if parse and parsed is None and text and not is_error_response(text):
+            parsed = parse(text)
+        return text, parsed
+
+    @staticmethod
+    def _auxiliary_kwargs(max_tokens:int, stop:Optional[Sequence[str]], response_format:Optional[str], temperature:float) -> Dict[str, Any]:
+        """ Parámetros de generate_response para una llamada auxiliar """
+        kwargs = {'temperature': temperature, 'max_tokens': max_tokens}
+        if stop:
+            kwargs['stop'] = list(stop)
+        if response_format:
+            kwargs['response_format'] = response_format
+        return kwargs
+
+    @staticmethod
+    def _auxiliary_step(text:str, chunk:str, stop:Optional[Sequence[str]], parse:Optional[Callable[[str], Any]]) -> Tuple[str, Any, bool]:
+        """
+        Añade un chunk a la respuesta auxiliar
+
+        Returns:
+            Tupla (texto, resultado de parse o None, True si la respuesta ya está completa)
+        """
+        if not chunk:
+            return text, None, False
+        text += chunk
+        complete = False
+        if stop:
+            # Una secuencia de parada al principio (antes de cualquier contenido) no corta
+            start = len(text) - len(text.lstrip())
+            cuts = [text.find(s, start) for s in stop]
+            cut = min((c for c in cuts if c != -1), default=-1)
+            if cut != -1:
+                text = text[:cut]
+                complete = True
+        parsed = None
+        if parse and not is_error_response(text):
+            parsed = parse(text)
+            if parsed is not None:
+                complete = True
+        return text, parsed, complete
+
+
+def _get_shared_session(base_url:str, pool_maxsize:int, pool_block:bool, pool_connections:int = 1) -> requests.Session:
+    """
+    Retorna la sesión HTTP con pool de conexiones asociada a un servidor
+
+    Args:
+        base_url: El equipo / puerto del servicio (o la lista de servidores separada por comas)
+        pool_maxsize: Número máximo de conexiones abiertas con cada servidor
+        pool_block: Si es True, las peticiones esperan a que haya una conexión libre
+                    en lugar de abrir conexiones extra que no se reutilizan
+        pool_connections: Número de servidores distintos para los que se mantiene pool
+
+    Returns:
+        La sesión compartida
+    """
+    key = (base_url, pool_maxsize, pool_block)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+class GeminiClient(AuxiliaryCallMixin):
     """Cliente para Google Gemini API."""
 
-    def __init__(self, api_key:Optional[str] = None):
+    def __init__(self, api_key:Optional[str] = None, raise_errors:bool = False):
         """
         Inicializa el cliente de Gemini
 
         Args:
             api_key: Clave de API de Google. 
                   Si no se proporciona, se busca en la variable de entorno GEMINI_API_KEY
+            raise_errors: Si es True los errores se lanzan como LLMError en lugar de
+                  devolverse como texto de la respuesta
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("Se requiere GEMINI_API_KEY en las variables de entorno")
         self.client = genai.Client(api_key=self.api_key)
         self.modelo = DEFAULT_SETTINGS["model"]
+        self.raise_errors = raise_errors
 
     def generate_response(self, prompt:str, messages, **kwargs:Dict) -> Generator:
         """
@@ -37,50 +343,71 @@ class GeminiClient:
         Returns:
             La respuesta generada por el modelo como un objeto Generator
         """
+        full_prompt, gen_config = self._build_request(prompt, messages, **kwargs)
 
+        try:
+            response = self.client.models.generate_content_stream(
+                model= self.modelo,
+                contents=full_prompt,
+                config = gen_config,
+            )
+
+            for chunks in response:
+                yield chunks.text
+        except Exception as ex:
+            if _generation_cancelled():
+                return
+            if self.raise_errors:
+                raise LLMResponseError("gemini", str(ex)) from ex
+            yield f"Error al generar respuesta: {str(ex)}"
+
+    def _build_request(self, prompt:str, messages, **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        Construye el contenido y la configuración de generación para Gemini
+
+        Returns:
+            Tupla (prompt completo, configuración de generación)
+        """
         temperature = kwargs.get("temperature")
         max_tokens = kwargs.get("max_tokens")
         gen_config ={
             "temperature":temperature,
             "maxOutputTokens":max_tokens
         }
+        if kwargs.get("response_format") == "json":
+            gen_config["response_mime_type"] = "application/json"
+        if kwargs.get("stop"):
+            gen_config["stop_sequences"] = list(kwargs["stop"])
         
-        full_prompt = ""
+        full_prompt = prompt
         if messages:
+            full_prompt = ""
             for message in messages:
                 role = "Usuario" if message["role"]  == "user" else "Asistente"
                 full_prompt += f"\n{role}: {message['message']}"
             full_prompt = "\n"+full_prompt + f"\nUsuario: {prompt}\nAsistente:"
-
-        try:
-            response = self.client.models.generate_content_stream(
-                model= self.modelo,
-                contents=full_prompt,
-                config = gen_config,
-            )
-
-            for chunks in response:
-                yield chunks.text
-        except Exception as ex:
-            yield f"Error al generar respuesta: {str(ex)}"
+        return full_prompt, gen_config
 
 
-class OpenAIClient:
+class OpenAIClient(AuxiliaryCallMixin):
     """ Cliente para OpenAI """
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, raise_errors:bool = False):
         """
         Inicializa el cliente de OpenAI
 
         Args:
             api_key: Clave de API de Google. 
                   Si no se proporciona, se busca en la variable de entorno OPENAI_API_KEY
+            raise_errors: Si es True los errores se lanzan como LLMError en lugar de
+                  devolverse como texto de la respuesta
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("Se requiere OPENAI_API_KEY en las variables de entorno")
         
         self.model = DEFAULT_SETTINGS["model_openai"] # self.model = "gpt-4.0"
+        self.raise_errors = raise_errors
 
         self.client = OpenAI(
             api_key=self.api_key,
@@ -101,54 +428,400 @@ class OpenAIClient:
             La respuesta generada por el modelo como un objeto Generator
         """
         try:
-            message_list = []
-            for message in messages:
-                message_list.append({
-                    "role":message['role'],
-                    "content":message['message']
-                })
-            message_list.append({"role":"user", "content":prompt})
+            message_list = self._build_messages(prompt, messages)
             response =  self.client.chat.completions.create(
                 model=self.model,
                 messages=message_list,
                 stream=True,
-                **kwargs,
+                **self._build_params(**kwargs),
             )
 
+            _on_cancel(response.close)
+
             for chunk in response:
                 if chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
             
         except Exception as e:
+            if _generation_cancelled():
+                return
+            if self.raise_errors:
+                raise LLMResponseError("openai", str(e)) from e
             yield f"Error al generar respuesta: {str(e)}"
 
-class OllamaClient:
+    @staticmethod
+    def _build_params(**kwargs) -> Dict[str, Any]:
+        """ Adapta los parámetros comunes a la API de OpenAI (response_format="json" -> json_object) """
+        if kwargs.get("response_format") == "json":
+            kwargs["response_format"] = {"type":"json_object"}
+        if kwargs.get("stop"):
+            # La API admite como máximo 4 secuencias de parada
+            kwargs["stop"] = list(kwargs["stop"])[:4]
+        return kwargs
+
+    def _build_messages(self, prompt:str, messages:Optional[List[Dict[str,str]]]) -> List[Dict[str,str]]:
+        """ Convierte el historial al formato de mensajes de OpenAI y añade el prompt """
+        message_list = []
+        for message in messages:
+            message_list.append({
+                "role":message['role'],
+                "content":message['message']
+            })
+        message_list.append({"role":"user", "content":prompt})
+        return message_list
+
+class OllamaClient(AuxiliaryCallMixin):
     """ Cliente para conectar con Ollama """
 
-    def __init__(self, model: str="gpt-oss:20b", base_url:str = "http://185.193.11.153:11434"):
+    def __init__(
+            self,
+            model: str="gpt-oss:20b",
+            base_url:Optional[Union[str, Sequence[str]]] = None,
+            connect_timeout: Optional[float] = None,
+            read_timeout: Optional[float] = None,
+            pool_maxsize: Optional[int] = None,
+            pool_block: Optional[bool] = None,
+            use_chat: Optional[bool] = None,
+            keep_alive: Optional[str] = None,
+            system_prompt: Optional[str] = None,
+            raise_errors: bool = False,
+            balance_strategy: Optional[str] = None,
+            hedge_delay: Optional[float] = None,
+            hedge_max_prompt_chars: Optional[int] = None,
+        ):
         """
         Inicializa el cliente de Ollama
 
         Args:
             model: Modelo a usar (phi4-mini, gpt-oss:20b, ...)
-            base_url: El equipo / puerto del servicio de Ollama
+            base_url: El equipo / puerto del servicio de Ollama, o una lista de
+                  servidores entre los que se reparten las peticiones.
+                  Si no se indica, se usa OLLAMA_BASE_URL (separada por comas) o la configuración
+            connect_timeout: Segundos máximos para establecer la conexión
+            read_timeout: Segundos máximos de espera entre dos fragmentos de la respuesta
+            pool_maxsize: Número máximo de conexiones keep-alive con el servidor
+            pool_block: Si es True, no se abren más conexiones que pool_maxsize
+            use_chat: Si es True se usa /api/chat con mensajes estructurados en lugar de /api/generate
+            keep_alive: Tiempo que Ollama mantiene el modelo cargado tras cada petición ("30m", "-1", ...)
+            system_prompt: Mensaje de sistema fijo que encabeza todas las peticiones en modo chat
+            raise_errors: Si es True los errores se lanzan como LLMError en lugar de
+                  devolverse como texto de la respuesta
+            balance_strategy: Con varios servidores, 'least_outstanding' o 'ewma'
+            hedge_delay: Con varios servidores, segundos sin respuesta tras los que un prompt
+                  auxiliar corto se envía también a un segundo servidor (None lo desactiva)
+            hedge_max_prompt_chars: Longitud máxima del prompt para usar peticiones duplicadas
         """
+        if base_url is None:
+            base_url = os.getenv("OLLAMA_BASE_URL", DEFAULT_SETTINGS["ollama_base_url"]).split(",")
+        urls = [base_url] if isinstance(base_url, str) else [url.strip() for url in base_url]
         self.model = model
-        self.base_url = base_url
+        self.base_url = urls[0]
         self.api_key = "local"
         self.model = DEFAULT_SETTINGS["model_ollama"]
 
+        self.connect_timeout = connect_timeout if connect_timeout is not None else DEFAULT_SETTINGS["ollama_connect_timeout"]
+        self.read_timeout = read_timeout if read_timeout is not None else DEFAULT_SETTINGS["ollama_read_timeout"]
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else DEFAULT_SETTINGS["ollama_pool_maxsize"]
+        pool_block = pool_block if pool_block is not None else DEFAULT_SETTINGS["ollama_pool_block"]
+        self.session = _get_shared_session(",".join(urls), self.pool_maxsize, pool_block, pool_connections=len(urls))
+
+        self.endpoint_pool = None
+        if len(urls) > 1:
+            self.endpoint_pool = get_endpoint_pool(
+                urls,
+                strategy=balance_strategy or DEFAULT_SETTINGS["ollama_balance_strategy"],
+                probe_timeout=self.connect_timeout,
+            )
+        self.hedge_delay = hedge_delay if hedge_delay is not None else DEFAULT_SETTINGS["ollama_hedge_delay"]
+        self.hedge_max_prompt_chars = hedge_max_prompt_chars if hedge_max_prompt_chars is not None else DEFAULT_SETTINGS["ollama_hedge_max_prompt_chars"]
+
+        self.use_chat = use_chat if use_chat is not None else DEFAULT_SETTINGS["ollama_use_chat"]
+        self.keep_alive = keep_alive if keep_alive is not None else DEFAULT_SETTINGS["ollama_keep_alive"]
+        self.system_prompt = system_prompt
+        self.raise_errors = raise_errors
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas de reutilización de conexiones con el servidor
+
+        Las cifras son las del pool compartido, es decir, incluyen las
+        peticiones de todos los clientes que apuntan al mismo servidor.
+
+        Returns:
+            Diccionario con peticiones, conexiones abiertas y conexiones reutilizadas
+        """
+        requests_count = 0
+        connections_count = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+
+        reused = max(0, requests_count - connections_count)
+        stats = {
+            'base_url': self.base_url,
+            'requests': requests_count,
+            'connections_opened': connections_count,
+            'connections_reused': reused,
+            'reuse_ratio': reused / requests_count if requests_count else 0.0,
+        }
+        if self.endpoint_pool is not None:
+            stats['endpoints'] = self.endpoint_pool.get_metrics()
+        return stats
+
     def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Generator[str, None, None]:
         """
         Genera una respuesta usando Ollama
 
         Args:
             prompt: El prompt del usuario
+            messages: Historial de mensajes previos (opcional)
+                      Formato: {["role":"assistant/user","message":"..."}]
             **kwargs: Parámetros adicionales (temperatura, etc)
 
         Yields:
             Chunks de la respuesta
         """
+        path, payload = self._build_request(prompt, messages, **kwargs)
+
+        try:
+            try:
+                if self.endpoint_pool is None:
+                    yield from self._stream(self.base_url, path, payload)
+                elif self._should_hedge(prompt, messages):
+                    yield from self._hedged_stream(path, payload)
+                else:
+                    yield from self._balanced_stream(path, payload)
+            except Exception:
+                # Al cancelar se corta la conexión: el error de lectura es esperado
+                if _generation_cancelled():
+                    return
+                raise
+        except requests.exceptions.Timeout as ex:
+            if self.raise_errors:
+                raise LLMConnectionError("ollama", "timeout") from ex
+            yield "❌ Error: Ollama no respondió a tiempo"
+        except requests.exceptions.ConnectionError as ex:
+            if self.raise_errors:
+                raise LLMConnectionError("ollama", str(ex)) from ex
+            yield "❌ Error: No se puede conectar a Ollama. Compruebe su conexión"
+        except Exception as ex:
+            if self.raise_errors:
+                raise LLMResponseError("ollama", str(ex)) from ex
+            yield f"❌ Error en Ollama: {ex}"
+
+    def _stream(self, base_url:str, path:str, payload:Dict[str, Any], stop_event:Optional[threading.Event] = None) -> Generator[str, None, None]:
+        """
+        Envía la petición a un servidor y produce el texto de la respuesta
+
+        Args:
+            base_url: El servidor Ollama
+            path: Ruta del endpoint (/api/chat o /api/generate)
+            payload: Cuerpo de la petición
+            stop_event: Si se activa, se deja de leer y se cierra la conexión
+        """
+        # El with devuelve la conexión al pool aunque el consumidor no lea toda la respuesta
+        with self.session.post(
+            f"{base_url}{path}",
+            json=payload,
+            stream=True,
+            timeout=(self.connect_timeout, self.read_timeout),
+        ) as response:
+            response.raise_for_status()
+            _on_cancel(lambda: _abort_response(response))
+
+            for line in response.iter_lines():
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if line:
+                    text = self._parse_stream_line(line)
+                    if text is not None:
+                        yield text
+
+    def _balanced_stream(self, path:str, payload:Dict[str, Any]) -> Generator[str, None, None]:
+        """
+        Envía la petición al servidor elegido por el pool
+
+        Si un servidor no acepta la conexión se prueba con el siguiente.
+        """
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self.endpoint_pool.acquire(exclude=tried)
+            if endpoint is None:
+                raise last_error
+            tried.append(endpoint)
+
+            start = time.perf_counter()
+            latency = None
+            success = False
+            try:
+                for text in self._stream(endpoint.url, path, payload):
+                    if latency is None:
+                        latency = time.perf_counter() - start
+                    yield text
+                success = True
+                return
+            except GeneratorExit:
+                success = True
+                raise
+            except requests.exceptions.ConnectionError as ex:
+                if latency is not None or _generation_cancelled():
+                    raise
+                logger.warning(f"Servidor Ollama no disponible, se reintenta en otro: {endpoint.url}")
+                last_error = ex
+            finally:
+                # Cortar la conexión al cancelar no cuenta como fallo del servidor
+                self.endpoint_pool.release(endpoint, latency, success or _generation_cancelled())
+
+    def _should_hedge(self, prompt:str, messages:Optional[List[Dict[str,str]]]) -> bool:
+        """ Las peticiones duplicadas sólo se usan para prompts auxiliares cortos (sin historial) """
+        return (
+            self.hedge_delay is not None
+            and not messages
+            and len(prompt) <= self.hedge_max_prompt_chars
+            and self.endpoint_pool.healthy_count() >= 2
+        )
+
+    def _hedged_stream(self, path:str, payload:Dict[str, Any]) -> Generator[str, None, None]:
+        """
+        Petición duplicada (hedged request)
+
+        Se envía a un servidor y, si no ha respondido en hedge_delay segundos
+        (o falla), también a un segundo servidor. Se usa la respuesta del
+        primero que produzca algo y la otra se cancela.
+        """
+        events = queue.Queue()
+        attempts: Dict[OllamaEndpoint, threading.Event] = {}
+
+        def worker(endpoint:OllamaEndpoint, stop_event:threading.Event):
+            start = time.perf_counter()
+            latency = None
+            success = False
+            try:
+                for text in self._stream(endpoint.url, path, payload, stop_event):
+                    if latency is None:
+                        latency = time.perf_counter() - start
+                    events.put((endpoint, text, None))
+                success = True
+                events.put((endpoint, None, None))
+            except Exception as ex:
+                events.put((endpoint, None, ex))
+            finally:
+                # Cancelar la petición perdedora no cuenta como fallo del servidor
+                self.endpoint_pool.release(endpoint, latency, success or stop_event.is_set())
+
+        def launch() -> bool:
+            endpoint = self.endpoint_pool.acquire(exclude=list(attempts))
+            if endpoint is None:
+                return False
+            attempts[endpoint] = threading.Event()
+            threading.Thread(target=worker, args=(endpoint, attempts[endpoint]), daemon=True).start()
+            return True
+
+        def cancel_attempts():
+            for stop_event in list(attempts.values()):
+                stop_event.set()
+
+        _on_cancel(cancel_attempts)
+        launch()
+        hedged = False
+        winner = None
+        failed = []
+        try:
+            while True:
+                try:
+                    endpoint, text, error = events.get(timeout=None if hedged else self.hedge_delay)
+                except queue.Empty:
+                    launch()
+                    hedged = True
+                    continue
+
+                if winner is None:
+                    if error is not None:
+                        failed.append(endpoint)
+                        if not hedged:
+                            launch()
+                            hedged = True
+                        if len(failed) == len(attempts):
+                            raise error
+                        continue
+                    winner = endpoint
+                    for other, stop_event in attempts.items():
+                        if other is not winner:
+                            stop_event.set()
+
+                if endpoint is not winner:
+                    continue
+                if error is not None:
+                    raise error
+                if text is None:
+                    return
+                yield text
+        finally:
+            for stop_event in attempts.values():
+                stop_event.set()
+
+    def _build_request(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        Construye la ruta y el cuerpo de la petición según el modo (chat o generate)
+
+        Returns:
+            Tupla (ruta, payload)
+        """
+        if self.use_chat:
+            path, payload = "/api/chat", self._build_chat_payload(prompt, messages, **kwargs)
+        else:
+            path, payload = "/api/generate", self._build_generate_payload(prompt, messages, **kwargs)
+        if _auxiliary_call.get():
+            self._apply_reasoning_settings(payload)
+        return path, payload
+
+    def _apply_reasoning_settings(self, payload:Dict[str, Any]):
+        """
+        Ajusta una llamada auxiliar a un modelo de razonamiento (ver reasoning_models en la configuración)
+
+        Los tokens de razonamiento cuentan para num_predict: sin ajuste, un límite
+        pensado para la respuesta (p. ej. 16 tokens) se agota razonando y la
+        respuesta llega vacía. Se fija el nivel de razonamiento ("think") y se
+        amplía el límite con los tokens que el modelo necesita para razonar.
+        """
+        settings = next(
+            (settings for prefix, settings in DEFAULT_SETTINGS["reasoning_models"].items() if self.model.startswith(prefix)),
+            None,
+        )
+        if settings is None:
+            return
+        payload["think"] = settings["think"]
+        options = payload.get("options", {})
+        if "num_predict" in options:
+            options["num_predict"] += settings["extra_tokens"]
+
+    @staticmethod
+    def _parse_stream_line(line) -> Optional[str]:
+        """
+        Extrae el texto de una línea del stream NDJSON de Ollama
+
+        Raises:
+            RuntimeError: Si Ollama informa de un error en el stream
+        """
+        data = json.loads(line)
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        if "response" in data:
+            return data["response"]
+        if "message" in data:
+            return data["message"].get("content", "")
+        return None
+
+    def _build_generate_payload(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Dict[str, Any]:
+        """
+        Construye la petición para /api/generate aplanando el historial en un único prompt
+        """
         if messages:
             full_prompt = ""
             for msg in messages:
@@ -167,26 +840,68 @@ class OllamaClient:
             "model":self.model,
             "prompt":full_prompt,
             "stream":True,
-            **kwargs,
+            "keep_alive":self.keep_alive,
         }
-        url = f"{self.base_url}/api/generate"
-        try:
-            response = requests.post(url, json=payload, stream=True)
-            response.raise_for_status()
+        return self._apply_generation_params(payload, **kwargs)
 
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    if "response" in data:
-                        yield data["response"]
-                    
-                    
-        except requests.exceptions.ConnectionError:
-            yield "❌ Error: No se puede conectar a Ollama. Compruebe su conexión"
-        except Exception as ex:
-            yield f"❌ Error en Ollama: {ex}"
+    def _build_chat_payload(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Dict[str, Any]:
+        """
+        Construye la petición para /api/chat
 
+        Los mensajes se envían en el mismo orden en que se produjeron y precedidos
+        siempre por el mismo system_prompt, de modo que el prefijo de cada turno
+        coincide con el del turno anterior y Ollama puede reutilizar su caché (KV).
+        """
+        chat_messages = []
+        if self.system_prompt:
+            chat_messages.append({"role":"system", "content":self.system_prompt})
+
+        history = list(messages or [])
+        # El historial ya incluye la consulta sin procesar del usuario; el prompt
+        # optimizado (template + consulta) la sustituye como último turno
+        if history and history[-1].get("role") == "user" and history[-1].get("message","") in prompt:
+            history.pop()
 
+        for msg in history:
+            role = msg.get("role","user")
+            if role not in ("system","user","assistant"):
+                role = "assistant" if role.startswith("assist") else "user"
+            chat_messages.append({"role":role, "content":msg.get("message","")})
+        chat_messages.append({"role":"user", "content":prompt})
+
+        payload = {
+            "model":self.model,
+            "messages":chat_messages,
+            "stream":True,
+            "keep_alive":self.keep_alive,
+        }
+        return self._apply_generation_params(payload, **kwargs)
+
+    @staticmethod
+    def _apply_generation_params(payload:Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """
+        Añade los parámetros comunes a la petición en el formato de Ollama
+
+        temperature, max_tokens (num_predict) y stop van dentro de "options" y
+        response_format="json" se traduce a "format": "json".
+        """
+        options = dict(kwargs.pop("options", {}))
+        temperature = kwargs.pop("temperature", None)
+        max_tokens = kwargs.pop("max_tokens", None)
+        stop = kwargs.pop("stop", None)
+        if temperature is not None:
+            options["temperature"] = temperature
+        if max_tokens is not None:
+            options["num_predict"] = max_tokens
+        if stop:
+            options["stop"] = list(stop)
+        if kwargs.pop("response_format", None) == "json":
+            payload["format"] = "json"
+
+        payload.update(kwargs)
+        if options:
+            payload["options"] = options
+        return payload
 
 
 def create_llm_provider(provider:str = "gemini") -> Any:
@@ -194,16 +909,61 @@ def create_llm_provider(provider:str = "gemini") -> Any:
     Crea un cliente LLM basado en el proveedor especificado
 
     Args:
-        provider: El proveedor ('gemnini' u 'openai')
+        provider: El proveedor ('gemini', 'openai' u 'ollama')
 
     Returns;
         Una instancia del cliente seleccionado
     """
-    if provider.lower() == 'genini':
+    if provider.lower() == 'gemini':
         return GeminiClient()
     elif provider.lower() == 'openai':
         return OpenAIClient()
     elif provider.lower() == 'ollama':
         return OllamaClient()
     else:
-        raise ValueError(f"Proveedor no soprtado : {provider}")
\ No newline at end of file
+        raise ValueError(f"Proveedor no soprtado : {provider}")
+
+
+if __name__ == "__main__":
+    print("🧪 Benchmark de time-to-first-token: /api/generate vs /api/chat\n")
+
+    system_message = {
+        "role":"system",
+        "message":"Eres DevMentor AI, un asistente experto de desarrollo de software. Responde de forma clara y CONCISA."
+    }
+
+    questions = [
+        "¿Qué es Python?",
+        "¿Cómo instalo Python?",
+        "¿Qué son las variables?",
+        "Explícame las funciones",
+        "¿Qué son las clases?",
+        "¿Cómo manejo errores?",
+        "¿Qué es un decorador?",
+        "¿Cómo funcionan los generadores?",
+        "¿Qué es asyncio?",
+        "¿Cómo creo una función que calcule el factorial de un número?",
+    ]
+
+    for use_chat in (False, True):
+        llm_client = OllamaClient(use_chat=use_chat)
+        mode = "chat" if use_chat else "generate"
+        messages = [system_message]
+        ttfts = []
+        for question in questions:
+            messages.append({"role":"user", "message":question})
+            start = time.perf_counter()
+            ttft = None
+            response = ""
+            for chunk in llm_client.generate_response(question, messages, max_tokens=200):
+                if chunk:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    response += chunk
+            ttfts.append(ttft or 0.0)
+            messages.append({"role":"assistant", "message":response})
+            print(f"  [{mode}] turno {len(ttfts):2d} ({len(messages)} mensajes): TTFT {ttfts[-1]*1000:.0f} ms")
+
+        later = ttfts[len(ttfts)//2:]
+        print(f"📶 {mode}: TTFT medio {sum(ttfts)/len(ttfts)*1000:.0f} ms | segunda mitad {sum(later)/len(later)*1000:.0f} ms")
+        print(f"   Conexiones: {llm_client.get_connection_stats()}\n")
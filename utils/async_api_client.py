@@ -0,0 +1,256 @@
+"""
+Clientes LLM asíncronos
+
+Misma interfaz que los clientes de utils.api_client, pero generate_response
+es un generador asíncrono. Así un único event loop puede atender varias
+generaciones a la vez sin bloquear un hilo por cada una.
+"""
+
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from utils.api_client import (
+    AuxiliaryCallMixin, GeminiClient, OpenAIClient, OllamaClient, LLMConnectionError, LLMResponseError,
+    _auxiliary_call, _closing_complete_answer, is_error_response,
+)
+
+
+class AsyncAuxiliaryCallMixin(AuxiliaryCallMixin):
+    """
+    Versión asíncrona de AuxiliaryCallMixin
+
+    generate_response es un generador asíncrono, así que el generate_auxiliary
+    heredado (que itera y cierra un generador síncrono) no sirve: éste recorre
+    el stream con async for y lo cierra con aclose().
+    """
+
+    async def generate_auxiliary(
+            self,
+            prompt:str,
+            max_tokens:int = 32,
+            stop:Optional[Sequence[str]] = None,
+            response_format:Optional[str] = None,
+            parse:Optional[Callable[[str], Any]] = None,
+            temperature:float = 0,
+        ) -> Tuple[str, Any]:
+        """
+        Genera una respuesta auxiliar corta (mismos parámetros que AuxiliaryCallMixin.generate_auxiliary)
+
+        Returns:
+            Tupla (texto recibido, resultado de parse o None)
+        """
+        kwargs = self._auxiliary_kwargs(max_tokens, stop, response_format, temperature)
+        generator = self.generate_response(prompt, [], **kwargs)
+        text = ""
+        parsed = None
+        complete = False
+        auxiliary_token = _auxiliary_call.set(True)
+        try:
+            async for chunk in generator:
+                text, parsed, complete = self._auxiliary_step(text, chunk, stop, parse)
+                if complete:
+                    break
+        finally:
+            token = _closing_complete_answer.set(complete)
+            try:
+                await generator.aclose()
+            finally:
+                _closing_complete_answer.reset(token)
+                _auxiliary_call.reset(auxiliary_token)
+
+        if parse and parsed is None and text and not is_error_response(text):
+            parsed = parse(text)
+        return text, parsed
+
+
+class AsyncGeminiClient(AsyncAuxiliaryCallMixin, GeminiClient):
+    """ Cliente asíncrono para Google Gemini API """
+
+    async def generate_response(self, prompt:str, messages, **kwargs:Dict) -> AsyncIterator[str]:
+        """
+        Genera una respuesta en streaming usando Gemini
+
+        Args:
+            prompt: El prompt para enviar al modelo
+            messages: Historial de mensajes previos (opcional)
+                      Formato: {["role":"assistant/user","message":"..."}]
+            **kwargs: Parámetros adicionales
+
+        Yields:
+            Chunks de la respuesta
+        """
+        full_prompt, gen_config = self._build_request(prompt, messages, **kwargs)
+
+        try:
+            response = await self.client.aio.models.generate_content_stream(
+                model= self.modelo,
+                contents=full_prompt,
+                config = gen_config,
+            )
+
+            async for chunks in response:
+                yield chunks.text
+        except Exception as ex:
+            if self.raise_errors:
+                raise LLMResponseError("gemini", str(ex)) from ex
+            yield f"Error al generar respuesta: {str(ex)}"
+
+
+class AsyncOpenAIClient(AsyncAuxiliaryCallMixin, OpenAIClient):
+    """ Cliente asíncrono para OpenAI """
+
+    def __init__(self, api_key: Optional[str] = None, raise_errors:bool = False):
+        """
+        Inicializa el cliente asíncrono de OpenAI
+
+        Args:
+            api_key: Clave de API de OpenAI.
+                  Si no se proporciona, se busca en la variable de entorno OPENAI_API_KEY
+            raise_errors: Si es True los errores se lanzan como LLMError
+        """
+        super().__init__(api_key, raise_errors)
+        self.async_client = AsyncOpenAI(api_key=self.api_key)
+
+    async def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs:Dict) -> AsyncIterator[str]:
+        """
+        Genera una respuesta en streaming usando OpenAI
+
+        Args:
+            prompt: El prompt para enviar al modelo
+            messages: Historial de mensajes previos (opcional)
+                      Formato: {["role":"assistant/user","message":"..."}]
+            **kwargs: Parametros adicionales (temperature, max_tokens)
+
+        Yields:
+            Chunks de la respuesta
+        """
+        try:
+            message_list = self._build_messages(prompt, messages)
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=message_list,
+                stream=True,
+                **self._build_params(**kwargs),
+            )
+
+            async for chunk in response:
+                if chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            if self.raise_errors:
+                raise LLMResponseError("openai", str(e)) from e
+            yield f"Error al generar respuesta: {str(e)}"
+
+
+class AsyncOllamaClient(AsyncAuxiliaryCallMixin, OllamaClient):
+    """ Cliente asíncrono para Ollama (httpx) """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Inicializa el cliente asíncrono de Ollama
+
+        Acepta los mismos argumentos que OllamaClient. El cliente HTTP se crea
+        al hacer la primera petición, dentro del event loop que lo va a usar.
+        """
+        super().__init__(*args, **kwargs)
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """ Retorna el cliente HTTP asíncrono con pool de conexiones keep-alive """
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.pool_maxsize,
+                ),
+            )
+        return self._http_client
+
+    async def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> AsyncIterator[str]:
+        """
+        Genera una respuesta usando Ollama
+
+        Args:
+            prompt: El prompt del usuario
+            messages: Historial de mensajes previos (opcional)
+            **kwargs: Parámetros adicionales (temperatura, etc)
+
+        Yields:
+            Chunks de la respuesta
+        """
+        path, payload = self._build_request(prompt, messages, **kwargs)
+        endpoint = self.endpoint_pool.acquire() if self.endpoint_pool is not None else None
+        base_url = endpoint.url if endpoint is not None else self.base_url
+        start = time.perf_counter()
+        latency = None
+        success = False
+        try:
+            async with self._get_http_client().stream("POST", f"{base_url}{path}", json=payload) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if line:
+                        text = self._parse_stream_line(line)
+                        if text is not None:
+                            if latency is None:
+                                latency = time.perf_counter() - start
+                            yield text
+            success = True
+
+        except GeneratorExit:
+            success = True
+            raise
+        except httpx.TimeoutException as ex:
+            if self.raise_errors:
+                raise LLMConnectionError("ollama", "timeout") from ex
+            yield "❌ Error: Ollama no respondió a tiempo"
+        except httpx.ConnectError as ex:
+            if self.raise_errors:
+                raise LLMConnectionError("ollama", str(ex)) from ex
+            yield "❌ Error: No se puede conectar a Ollama. Compruebe su conexión"
+        except Exception as ex:
+            if self.raise_errors:
+                raise LLMResponseError("ollama", str(ex)) from ex
+            yield f"❌ Error en Ollama: {ex}"
+        finally:
+            if endpoint is not None:
+                self.endpoint_pool.release(endpoint, latency, success)
+
+    async def aclose(self):
+        """ Cierra las conexiones abiertas con el servidor """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    async def consume(llm_client, question:str) -> float:
+        start = time.perf_counter()
+        response = ""
+        async for chunk in llm_client.generate_response(question, [], max_tokens=200):
+            if chunk:
+                response += chunk
+        return time.perf_counter() - start
+
+    async def main():
+        print("🧪 Test de streams concurrentes con AsyncOllamaClient\n")
+        llm_client = AsyncOllamaClient()
+        questions = ["¿Qué es Python?", "¿Qué es una clase?", "¿Qué es asyncio?", "¿Qué es un decorador?"]
+
+        start = time.perf_counter()
+        durations = await asyncio.gather(*(consume(llm_client, q) for q in questions))
+        total = time.perf_counter() - start
+        await llm_client.aclose()
+
+        for question, duration in zip(questions, durations):
+            print(f"  {question}: {duration:.2f} s")
+        print(f"📶 Total concurrente: {total:.2f} s | suma secuencial: {sum(durations):.2f} s")
+
+    asyncio.run(main())
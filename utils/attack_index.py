@@ -0,0 +1,219 @@
+"""
+Índice de ataques conocidos (capa intermedia de los guardrails)
+
+Entre las reglas regex y el análisis con LLM: la consulta se compara por
+similitud coseno con un conjunto pequeño de ataques conocidos (inyección,
+jailbreak y extracción del prompt). Si está muy lejos de todos se da por
+segura sin llamar al LLM, si está muy cerca de alguno se bloquea y sólo la
+franja intermedia se consulta al LLM.
+
+Sólo las consultas cortas pueden darse por seguras: el embedding de un texto
+largo (p. ej. código pegado con una frase inyectada) se parece poco a los
+ejemplos aunque contenga un ataque, así que esas consultas van siempre al LLM.
+Los umbrales se calibran con un conjunto etiquetado aparte (ver __main__).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import DEFAULT_SETTINGS
+from utils.rag_manager import ollama_embedding_fn
+from utils.semantic_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+EXAMPLES_PATH = Path(__file__).parent.parent / "config" / "attack_examples.json"
+CALIBRATION_PATH = Path(__file__).parent.parent / "config" / "attack_calibration.jsonl"
+
+SAFE = "SEGURO"
+ATTACK = "ATAQUE"
+ESCALATE = "ESCALAR"
+
+
+class AttackIndex:
+    """ Índice vectorial (NumPy) de ataques conocidos """
+
+    def __init__(
+            self,
+            embedding_fn:Callable = ollama_embedding_fn,
+            examples_path=EXAMPLES_PATH,
+            pass_threshold:float = 0.6,
+            block_threshold:float = 0.9,
+            retry_interval:float = 60.0,
+            safe_max_chars:int = 400,
+        ):
+        """
+        Args:
+            embedding_fn: Función para generar embeddings
+            examples_path: Archivo JSON con los ataques conocidos por categoría
+            pass_threshold: Por debajo de esta similitud la consulta se considera segura
+            block_threshold: A partir de esta similitud la consulta se bloquea
+            retry_interval: Segundos antes de reintentar la indexación si falló
+            safe_max_chars: Longitud máxima de una consulta para darla por segura sin el LLM
+        """
+        self.embedding_fn = embedding_fn
+        self.examples_path = Path(examples_path)
+        self.pass_threshold = pass_threshold
+        self.block_threshold = block_threshold
+        self.retry_interval = retry_interval
+        self.safe_max_chars = safe_max_chars
+
+        self.version = None
+        # Huella de los ejemplos y umbrales (los veredictos guardados dependen de ellos)
+        try:
+            examples_hash = hashlib.sha256(self.examples_path.read_bytes()).hexdigest()[:16]
+        except OSError:
+            examples_hash = None
+        self.fingerprint = f"{examples_hash}:{pass_threshold}:{block_threshold}:{safe_max_chars}"
+        self._vectors: Optional[np.ndarray] = None
+        self._examples: List[Dict[str, str]] = []
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.stats = {'checks': 0, 'safe': 0, 'blocked': 0, 'escalated': 0}
+
+    def _embed(self, text:str) -> Optional[np.ndarray]:
+        """ Embedding normalizado (norma 1) de un texto """
+        vector = np.asarray(self.embedding_fn(normalize_query(text)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        return vector / norm
+
+    def _build(self) -> bool:
+        """ Indexa los ataques conocidos (una vez; con el lock adquirido) """
+        if self._vectors is not None:
+            return True
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+            return False
+        try:
+            data = json.loads(self.examples_path.read_text(encoding="utf-8"))
+            examples = [
+                {'category': category, 'text': text}
+                for category, texts in data["examples"].items() for text in texts
+            ]
+            vectors = [self._embed(example['text']) for example in examples]
+        except Exception as e:
+            logger.warning(f"No se pudo indexar los ataques conocidos: {e}")
+            self._failed_at = time.monotonic()
+            return False
+
+        keep = [i for i, vector in enumerate(vectors) if vector is not None]
+        if not keep:
+            self._failed_at = time.monotonic()
+            return False
+        self.version = data.get("version")
+        self._examples = [examples[i] for i in keep]
+        self._vectors = np.vstack([vectors[i] for i in keep])
+        logger.info(f"Índice de ataques construido: {len(keep)} ejemplos (versión {self.version})")
+        return True
+
+    def check(self, user_input:str) -> Dict[str, Any]:
+        """
+        Compara una consulta con los ataques conocidos
+
+        Returns:
+            Diccionario con 'verdict' (SEGURO, ATAQUE o ESCALAR), 'similarity' y el
+            ataque más parecido ('match', 'category'). Si no hay embeddings disponibles,
+            o la consulta es demasiado larga para darla por segura, el veredicto es ESCALAR
+        """
+        with self._lock:
+            self.stats['checks'] += 1
+            ready = self._build()
+        result = {'verdict': ESCALATE, 'similarity': None, 'match': None, 'category': None}
+
+        if ready:
+            try:
+                vector = self._embed(user_input)
+            except Exception as e:
+                logger.warning(f"No se pudo generar el embedding para el índice de ataques: {e}")
+                vector = None
+            if vector is not None and vector.shape[0] == self._vectors.shape[1]:
+                similarities = self._vectors @ vector
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                result.update(similarity=similarity, match=self._examples[best]['text'], category=self._examples[best]['category'])
+                if similarity >= self.block_threshold:
+                    result['verdict'] = ATTACK
+                elif similarity < self.pass_threshold and len(user_input) <= self.safe_max_chars:
+                    result['verdict'] = SAFE
+
+        with self._lock:
+            key = {SAFE: 'safe', ATTACK: 'blocked', ESCALATE: 'escalated'}[result['verdict']]
+            self.stats[key] += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ Retorna estadísticas del índice, incluida la proporción de análisis con LLM evitados """
+        with self._lock:
+            checks = self.stats['checks']
+            return {
+                **self.stats,
+                'examples': len(self._examples),
+                'llm_avoided_rate': (self.stats['safe'] + self.stats['blocked']) / checks if checks else 0.0,
+            }
+
+
+_shared_index: Optional[AttackIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_attack_index() -> AttackIndex:
+    """ Retorna el índice de ataques compartido por todas las sesiones del proceso """
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = AttackIndex(
+                pass_threshold=DEFAULT_SETTINGS["attack_index_pass_threshold"],
+                block_threshold=DEFAULT_SETTINGS["attack_index_block_threshold"],
+                safe_max_chars=DEFAULT_SETTINGS["attack_index_safe_max_chars"],
+            )
+        return _shared_index
+
+
+if __name__ == "__main__":
+    # Calibración de los umbrales con un conjunto etiquetado distinto de los ejemplos indexados
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibra los umbrales del índice de ataques conocidos")
+    parser.add_argument("--dataset", default=str(CALIBRATION_PATH), help="JSONL con {\"text\", \"attack\"}")
+    parser.add_argument("--pass-threshold", type=float, default=DEFAULT_SETTINGS["attack_index_pass_threshold"])
+    parser.add_argument("--block-threshold", type=float, default=DEFAULT_SETTINGS["attack_index_block_threshold"])
+    args = parser.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        dataset = [json.loads(line) for line in f if line.strip()]
+    indexed = json.loads(EXAMPLES_PATH.read_text(encoding="utf-8"))["examples"].values()
+    indexed_texts = {text for texts in indexed for text in texts}
+    overlap = [item['text'] for item in dataset if item['text'] in indexed_texts]
+    if overlap:
+        print(f"⚠️ {len(overlap)} consultas del conjunto de calibración están también en los ejemplos indexados")
+
+    index = AttackIndex(pass_threshold=args.pass_threshold, block_threshold=args.block_threshold)
+    scored = []
+    for item in dataset:
+        result = index.check(item['text'])
+        if result['similarity'] is None:
+            raise SystemExit("❌ No hay embeddings disponibles (¿está Ollama en marcha?)")
+        scored.append((result['similarity'], item['attack'], item['text']))
+
+    print(f"🧪 {len(dataset)} consultas etiquetadas ({sum(a for _, a, _ in scored)} ataques)\n")
+    for similarity, is_attack, text in sorted(scored, reverse=True):
+        print(f"{'ATAQUE' if is_attack else '      '} {similarity:.3f} | {text[:70]}")
+
+    attacks = [similarity for similarity, is_attack, _ in scored if is_attack]
+    benign = [similarity for similarity, is_attack, _ in scored if not is_attack]
+    # Umbral de paso: por debajo del ataque menos parecido (ningún ataque se da por seguro)
+    # Umbral de bloqueo: por encima de la consulta legítima más parecida (ninguna se bloquea)
+    suggested_pass = round(min(attacks) - 0.02, 2) if attacks else args.pass_threshold
+    suggested_block = round(max(benign) + 0.02, 2) if benign else args.block_threshold
+    avoided = sum(s < suggested_pass or s >= suggested_block for s, _, _ in scored) / len(scored)
+    print(f"\nActuales: pasa < {args.pass_threshold}, bloquea >= {args.block_threshold}")
+    print(f"Sugeridos: pasa < {suggested_pass}, bloquea >= {max(suggested_block, suggested_pass)} "
+          f"(análisis con LLM evitados en este conjunto: {avoided * 100:.0f}%)")
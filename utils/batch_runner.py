@@ -0,0 +1,318 @@
+"""
+Ejecución por lotes de prompts
+
+Lee un JSONL de prompts (con historial opcional), los ejecuta con un límite
+de concurrencia y de peticiones por minuto por proveedor, y va escribiendo
+cada resultado con sus tiempos en un JSONL de salida. Si se interrumpe, al
+volver a lanzarlo se saltan los prompts que ya tienen resultado.
+
+La salida sólo se amplía: al reintentar los errores (--retry-errors) se añade
+otra fila con el mismo id, y la última fila de cada id es la que vale (ver
+read_results).
+
+Formato de entrada (una línea por prompt):
+    {"id": "q1", "prompt": "¿Qué es Python?", "messages": [...], "provider": "ollama",
+     "temperature": 0, "max_tokens": 200}
+
+Sólo "prompt" es obligatorio; sin "id" se usa el número de línea.
+
+Uso:
+    python -m utils.batch_runner prompts.jsonl resultados.jsonl --provider ollama --concurrency 4 --rate-limit ollama=120
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from utils.api_client import LLMError, create_llm_provider
+from utils.llm_metrics import call_purpose
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """ Token bucket: como máximo `per_minute` peticiones por minuto, con ráfagas de `burst` """
+
+    def __init__(self, per_minute:float, burst:int = 1):
+        self.interval = 60.0 / per_minute
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Espera hasta que se pueda enviar la siguiente petición """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) / self.interval)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+def read_jobs(input_path:str) -> Iterator[Dict[str, Any]]:
+    """
+    Lee los prompts del JSONL de entrada
+
+    Yields:
+        Diccionarios con al menos 'id' y 'prompt'
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"Línea {line_number} ignorada (JSON inválido): {e}")
+                continue
+            if not job.get("prompt"):
+                logger.error(f"Línea {line_number} ignorada: falta 'prompt'")
+                continue
+            job.setdefault("id", f"line-{line_number}")
+            job["id"] = str(job["id"])
+            yield job
+
+
+def read_results(output_path:str) -> Dict[str, Dict[str, Any]]:
+    """
+    Resultado vigente de cada prompt del JSONL de salida
+
+    Un prompt reintentado tiene varias filas: la última sustituye a las anteriores.
+
+    Returns:
+        Diccionario id -> resultado
+    """
+    results = {}
+    if not Path(output_path).exists():
+        return results
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # Línea a medio escribir si el proceso se cortó
+                continue
+            results[str(result.get("id"))] = result
+    return results
+
+
+def read_completed_ids(output_path:str, include_errors:bool = True) -> Set[str]:
+    """
+    Ids que ya tienen resultado en el JSONL de salida
+
+    Args:
+        output_path: Ruta del JSONL de salida
+        include_errors: Contar también los que terminaron con error (False para reintentarlos)
+    """
+    return {
+        job_id for job_id, result in read_results(output_path).items()
+        if include_errors or result.get("status") == "ok"
+    }
+
+
+def _ends_with_newline(path:str) -> bool:
+    """ Si el archivo está vacío o termina en salto de línea (False si la última línea quedó a medias) """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+class BatchRunner:
+    """ Ejecuta lotes de prompts contra uno o varios proveedores LLM """
+
+    def __init__(
+            self,
+            default_provider:str = "ollama",
+            concurrency:int = 4,
+            rate_limits:Optional[Dict[str, float]] = None,
+            client_factory:Callable[[str], Any] = create_llm_provider,
+        ):
+        """
+        Inicializa el runner
+
+        Args:
+            default_provider: Proveedor para los prompts que no indican uno
+            concurrency: Número máximo de peticiones en curso
+            rate_limits: Peticiones por minuto por proveedor (p. ej. {"gemini": 60})
+            client_factory: Función que crea el cliente de un proveedor
+        """
+        self.default_provider = default_provider
+        self.concurrency = concurrency
+        self.rate_limiters = {
+            provider: RateLimiter(per_minute, burst=max(1, concurrency))
+            for provider, per_minute in (rate_limits or {}).items()
+        }
+        self.client_factory = client_factory
+        self._clients: Dict[str, Any] = {}
+        self._clients_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _get_client(self, provider:str):
+        """ Cliente de un proveedor (uno por proveedor, compartido entre hilos) """
+        with self._clients_lock:
+            if provider not in self._clients:
+                client = self.client_factory(provider)
+                client.raise_errors = True
+                self._clients[provider] = client
+            return self._clients[provider]
+
+    def run_job(self, job:Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ejecuta un prompt
+
+        Returns:
+            El resultado: respuesta, estado y tiempos
+        """
+        provider = job.get("provider") or self.default_provider
+        result = {
+            'id': job["id"],
+            'provider': provider,
+            'model': None,
+            'status': "ok",
+            'response': "",
+            'error': None,
+            'started_at': datetime.now().isoformat(),
+            'queue_wait': 0.0,
+            'ttft': None,
+            'duration': 0.0,
+            'chunks': 0,
+        }
+
+        kwargs = {key: job[key] for key in ("temperature", "max_tokens") if job.get(key) is not None}
+        try:
+            client = self._get_client(provider)
+            result['model'] = getattr(client, "model", None) or getattr(client, "modelo", None)
+
+            limiter = self.rate_limiters.get(provider)
+            if limiter:
+                wait_start = time.perf_counter()
+                limiter.acquire()
+                result['queue_wait'] = time.perf_counter() - wait_start
+
+            start = time.perf_counter()
+            try:
+                with call_purpose("batch"):
+                    for chunk in client.generate_response(job["prompt"], job.get("messages") or [], **kwargs):
+                        if chunk:
+                            if result['ttft'] is None:
+                                result['ttft'] = time.perf_counter() - start
+                            result['response'] += chunk
+                            result['chunks'] += 1
+            finally:
+                result['duration'] = time.perf_counter() - start
+        except (LLMError, ValueError) as e:
+            result['status'] = "error"
+            result['error'] = str(e)
+        except Exception as e:
+            # Un fallo inesperado no debe parar el resto del lote
+            logger.exception(f"Error inesperado en el prompt {job['id']}")
+            result['status'] = "error"
+            result['error'] = str(e)
+        return result
+
+    def _write_result(self, output_file, result:Dict[str, Any]):
+        with self._write_lock:
+            output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output_file.flush()
+
+    def run(self, input_path:str, output_path:str, retry_errors:bool = False, progress_every:int = 10) -> Dict[str, Any]:
+        """
+        Ejecuta todos los prompts pendientes del JSONL de entrada
+
+        Args:
+            input_path: JSONL de entrada
+            output_path: JSONL de salida (se añaden resultados; no se sobrescribe)
+            retry_errors: Volver a ejecutar los prompts que terminaron con error
+                (su nueva fila sustituye a la anterior, ver read_results)
+            progress_every: Cada cuántos resultados se informa del progreso
+
+        Returns:
+            Resumen del lote
+        """
+        completed = read_completed_ids(output_path, include_errors=not retry_errors)
+        jobs = [job for job in read_jobs(input_path) if job["id"] not in completed]
+        skipped = len(completed)
+        logger.info(f"{len(jobs)} prompts pendientes ({skipped} ya completados)")
+
+        results: List[Dict[str, Any]] = []
+        start = time.perf_counter()
+        partial_line = Path(output_path).exists() and not _ends_with_newline(output_path)
+        with open(output_path, "a", encoding="utf-8") as output_file, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            if partial_line:
+                # La línea a medio escribir de una ejecución cortada queda sola (y se ignora al leer)
+                output_file.write("\n")
+            futures = [executor.submit(self.run_job, job) for job in jobs]
+            try:
+                for future in as_completed(futures):
+                    result = future.result()
+                    self._write_result(output_file, result)
+                    results.append(result)
+                    if progress_every and len(results) % progress_every == 0:
+                        logger.info(f"{len(results)}/{len(jobs)} prompts completados")
+            except KeyboardInterrupt:
+                # Los resultados ya escritos se conservan; al relanzar se retoma desde aquí
+                logger.warning("Lote interrumpido: esperando a las peticiones en curso")
+                executor.shutdown(wait=True, cancel_futures=True)
+                for future in futures:
+                    if future.done() and not future.cancelled():
+                        result = future.result()
+                        if result not in results:
+                            self._write_result(output_file, result)
+                            results.append(result)
+                raise
+
+        return self.summarize(results, skipped, time.perf_counter() - start)
+
+    @staticmethod
+    def summarize(results:List[Dict[str, Any]], skipped:int = 0, wall_time:float = 0.0) -> Dict[str, Any]:
+        """ Resumen de un lote: recuentos, TTFT y duración media """
+        ok = [r for r in results if r['status'] == "ok"]
+        ttfts = sorted(r['ttft'] for r in ok if r['ttft'] is not None)
+        return {
+            'completed': len(ok),
+            'errors': len(results) - len(ok),
+            'skipped': skipped,
+            'wall_time': wall_time,
+            'ttft_p50': ttfts[len(ttfts) // 2] if ttfts else None,
+            'ttft_p95': ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))] if ttfts else None,
+            'duration_avg': sum(r['duration'] for r in ok) / len(ok) if ok else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta un lote de prompts desde un JSONL")
+    parser.add_argument("input", help="JSONL de entrada")
+    parser.add_argument("output", help="JSONL de salida (se retoma si ya existe)")
+    parser.add_argument("--provider", default="ollama", help="Proveedor por defecto (gemini, openai, ollama)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Peticiones simultáneas")
+    parser.add_argument("--rate-limit", action="append", default=[], metavar="PROVEEDOR=RPM",
+                        help="Peticiones por minuto de un proveedor (se puede repetir)")
+    parser.add_argument("--retry-errors", action="store_true", help="Reintentar los prompts que fallaron")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    rate_limits = {}
+    for item in args.rate_limit:
+        provider, _, per_minute = item.partition("=")
+        rate_limits[provider.strip()] = float(per_minute)
+
+    runner = BatchRunner(default_provider=args.provider, concurrency=args.concurrency, rate_limits=rate_limits)
+    summary = runner.run(args.input, args.output, retry_errors=args.retry_errors)
+    print(json.dumps(summary, indent=2))
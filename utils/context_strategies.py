@@ -1,10 +1,19 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 from abc import ABC, abstractmethod
 
+import base64
+import hashlib
+import re
+import time
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import DEFAULT_SETTINGS
 from utils import OllamaClient
+from utils.llm_metrics import call_purpose
+from utils.api_client import is_error_response
+from utils.rag_manager import ollama_embedding_fn
+import numpy as np
 
 class ContextStrategy(ABC):
     """ Clase abstracta para estrategias de optimización de contexto """
@@ -96,10 +105,18 @@ class SummaryStrategy(ContextStrategy):
     """
     Estrategia 2: Resumen automático
 
-    Resume mensajes antigüos usando el LLM
+    Resume mensajes antigüos usando el LLM. El resumen es incremental: se guarda
+    cuántos mensajes cubre (y una huella de ellos) y en cada turno sólo se añaden
+    al resumen los mensajes que han salido de la ventana reciente desde entonces.
+    El estado es un diccionario serializable que se guarda con la conversación.
+
+    En modo background el resumen no se genera al optimizar: lo mantiene el
+    SummaryWorker tras cada respuesta (ver refresh) y optimize usa el último
+    resumen terminado, o una ventana deslizante si todavía no hay ninguno.
     """
 
-    def __init__(self, llm_client, keep_recent: int = 6, summarize_thresold: int = 15):
+    def __init__(self, llm_client, keep_recent: int = 6, summarize_thresold: int = 15, state: Dict[str, Any] = None,
+                 background: bool = False):
         """
         Inicializa la estrategia
 
@@ -107,16 +124,27 @@ class SummaryStrategy(ContextStrategy):
             llm_client: Cliente LLM para generar el resumen
             keep_recent: Últimos mensajes a mantener sin resumir
             summarize_thresold: Umbral de mensajes para activar el resumen
+            state: Estado de contexto de la conversación (se actualiza en su clave 'summary')
+            background: Usar sólo el resumen ya hecho, sin llamar al LLM al optimizar
         """
         self.llm_client = llm_client
         self.keep_recent = keep_recent
         self.summarize_thresold = summarize_thresold
+        self.state = state if state is not None else {}
+        self.background = background
         self.optimizations_count = 0
+        self.summarized_messages = 0
+        self.summary_calls = 0
+        self.summary_ready = None
+
+    @staticmethod
+    def messages_hash(messages:List[Dict[str,str]]) -> str:
+        """ Huella de una lista de mensajes (detecta ediciones o borrados de los ya resumidos) """
+        digest = hashlib.sha256()
+        for msg in messages:
+            digest.update(f"{msg.get('role')}\n{msg.get('message')}\n\0".encode("utf-8"))
+        return digest.hexdigest()[:16]
 
-    def get_strategy_name(self) -> str:
-        """ Retorna el nombre de la estrategia """
-        return f"Resúmen Automático (mantiene los últimos {self.keep_recent} mensajes sin resumir)"
-    
     def optimize(self, messages: List[Dict[str,str]], new_query: str = "") -> List[Dict[str,str]]:
         """
         Resume mensajes antigüos y mantiene los últimos
@@ -139,7 +167,13 @@ class SummaryStrategy(ContextStrategy):
         old_messages = other_messages[:-self.keep_recent] # 0 -> len(mensajes) - 6
         recent_messages = other_messages[-self.keep_recent:] # len(mensajes) - 6 -> final
 
-        summary = self._generate_summary(old_messages)
+        if self.background:
+            return system_messages + self._with_stored_summary(other_messages, old_messages)
+
+        summary = self.update_summary(old_messages)
+        if summary is None:
+            summary = f"Conversación sobre desarrollo de software ({len(old_messages)} mensajes anteriores)"
+        self.summarized_messages = len(old_messages)
 
         summary_message = {
             'role':'system',
@@ -147,22 +181,109 @@ class SummaryStrategy(ContextStrategy):
         }
 
         return system_messages + [summary_message] + recent_messages
+
+    def _with_stored_summary(self, other_messages, old_messages) -> List[Dict[str,str]]:
+        """ Último resumen terminado + mensajes que aún no cubre; sin resumen, los últimos summarize_thresold """
+        stored = self._valid_summary(old_messages)
+        self.summary_ready = stored is not None
+        if stored is None:
+            # Mientras se genera el primer resumen se envía tanto contexto como sin resumir (hasta el umbral)
+            return other_messages[-self.summarize_thresold:]
+        self.summarized_messages = stored['count']
+        # Si el resumen va muy retrasado, los mensajes sin resumir se limitan al umbral
+        start = max(stored['count'], len(other_messages) - self.summarize_thresold)
+        summary_message = {
+            'role':'system',
+            'message':f"🗒️ Resumen de la conversación anterior:\n\n{stored['text']}"
+        }
+        return [summary_message] + other_messages[start:]
+
+    def refresh(self, messages: List[Dict[str,str]]):
+        """
+        Actualiza el resumen tras una respuesta, para la siguiente consulta (lo llama el SummaryWorker)
+
+        La siguiente consulta añadirá un mensaje del usuario, así que se resume lo
+        que entonces quedará fuera de los keep_recent mensajes recientes.
+        """
+        if len(messages) + 1 <= self.summarize_thresold:
+            return
+        other_messages = [msg for msg in messages if msg.get('role') != "system"]
+        self.update_summary(other_messages[:max(0, len(other_messages) + 1 - self.keep_recent)])
+
+    def _valid_summary(self, old_messages:List[Dict[str,str]]) -> Optional[Dict[str, Any]]:
+        """ El resumen guardado si cubre un prefijo (sin cambios) de old_messages, o None """
+        stored = self.state.get('summary')
+        if not stored or stored['count'] > len(old_messages):
+            return None
+        if stored['hash'] != self.messages_hash(old_messages[:stored['count']]):
+            return None
+        return stored
+
+    def update_summary(self, old_messages:List[Dict[str,str]]) -> Optional[str]:
+        """
+        Actualiza el resumen guardado para que cubra old_messages
+
+        Si el resumen guardado cubre un prefijo de old_messages sólo se le añaden los
+        mensajes nuevos; si no (primera vez, o se editaron mensajes) se resume todo.
+
+        Returns:
+            El resumen, o None si no se pudo generar
+        """
+        stored = self._valid_summary(old_messages)
+        covered = stored['count'] if stored else 0
+
+        new_messages = old_messages[covered:]
+        if not new_messages:
+            return stored['text'] if stored else None
+
+        if stored:
+            summary = self._generate_summary(new_messages, previous_summary=stored['text'])
+        else:
+            summary = self._generate_summary(new_messages)
+        if not summary:
+            # Se mantiene el resumen anterior (se reintentará en el siguiente turno)
+            return stored['text'] if stored else None
+
+        # Una sola asignación: el estado puede leerse desde otro hilo
+        self.state['summary'] = {
+            'text': summary,
+            'count': len(old_messages),
+            'hash': self.messages_hash(old_messages),
+        }
+        return summary
     
-    def _generate_summary(self, messages:List[Dict[str,str]]) -> str:
+    def _generate_summary(self, messages:List[Dict[str,str]], previous_summary:str = None) -> Optional[str]:
         """
         Gebera un resumen de los mensajes antiguos usando el LLM
         
         Args:
             messages: Lista de mensajes a resumir
+            previous_summary: Resumen de los mensajes anteriores, al que se incorporan los nuevos
 
         Return:
-            Resumen de los mensajes como texto
+            Resumen de los mensajes como texto, o None si no se pudo generar
         """
         conversation_text = "\n\n".join(
             [f"{msg['role'].upper()}:{msg['message']}" for msg in messages]
         )
 
-        summary_prompt = f"""Resume la siguiente conversación de forma concisa pero manteniendo los puntos más importantes:
+        if previous_summary:
+            summary_prompt = f"""Actualiza el resumen de una conversación incorporando los mensajes nuevos, de forma concisa pero manteniendo los puntos más importantes:
+
+        RESUMEN ANTERIOR:
+        {previous_summary}
+
+        MENSAJES NUEVOS:
+        {conversation_text}
+
+        Resume en un máximo de 200 palabras, enfocándote en:
+        - Conceptos técnicos discutidos
+        - Decisiones o soluciones importantes
+        - Código o ejemplos relevantes
+
+        RESUMEN:"""
+        else:
+            summary_prompt = f"""Resume la siguiente conversación de forma concisa pero manteniendo los puntos más importantes:
 
         {conversation_text}
 
@@ -172,14 +293,19 @@ class SummaryStrategy(ContextStrategy):
         - Código o ejemplos relevantes
 
         RESUMEN:"""
+        summary = ""
+        self.summary_calls += 1
         try:
-            summary=""
-            for chunk in self.llm_client.generate_response(summary_prompt, messages=[]):
-                if chunk:
-                    summary += chunk
-            return summary if summary else f"Conversación sobre desarrollo de software ({len(messages)} mensajes anteriores)"
-        except:
-            return summary if summary else f"Conversación sobre desarrollo de software ({len(messages)} mensajes anteriores)"
+            with call_purpose("summary"):
+                for chunk in self.llm_client.generate_response(summary_prompt, messages=[]):
+                    if chunk:
+                        summary += chunk
+        except Exception as e:
+            print(f"⚠️ Error generando el resumen: {e}")
+            return None
+        if not summary.strip() or is_error_response(summary):
+            return None
+        return summary.strip()
         
     def get_strategy_name(self) -> str:
         return f"Resumen Automático (mantiene {self.keep_recent} mensajes recientes)"
@@ -189,26 +315,45 @@ class SummaryStrategy(ContextStrategy):
             'strategy': self.get_strategy_name(),
             'keep_recent': self.keep_recent,
             'summarize_threshold': self.summarize_thresold,
-            'optimizations': self.optimizations_count
+            'optimizations': self.optimizations_count,
+            'summarized_messages': self.summarized_messages,
+            'summary_calls': self.summary_calls,
+            'summary_ready': self.summary_ready,
         }
 
 class SmartSelectionStrategy(ContextStrategy):
     """
     Estrategia 3: Selección de mensajes inteligente
     
-    El LLM selecciona los mensajes más relevantes para la nueva pregunta
+    Selecciona los mensajes más relevantes para la nueva pregunta. Con el
+    selector "llm" los elige el LLM; con "embedding" se eligen los intercambios
+    (pregunta + respuesta) más parecidos a la pregunta por similitud coseno. El
+    embedding de cada mensaje se calcula una sola vez y se guarda en el estado
+    de la conversación (clave 'embeddings'), así que cada turno sólo calcula el
+    de la pregunta y los de los mensajes nuevos.
     """
-    def __init__(self, llm_client, max_selected:int) -> str:
+    def __init__(self, llm_client, max_selected:int, selector:str = "llm", embedding_fn:Callable = None,
+                 embedding_model:str = "mxbai-embed-large", state:Dict[str, Any] = None) -> str:
         """
         Inicializa la estrategia
         
         Args:
             llm_client: El LLM a emplear
-            max_selected: El número máximo de mensajes a incluir
+            max_selected: El número máximo de intercambios a incluir
+            selector: "llm" o "embedding"
+            embedding_fn: Función para generar embeddings (por defecto, Ollama con embedding_model)
+            embedding_model: Modelo de embeddings (los vectores guardados de otro modelo se descartan)
+            state: Estado de contexto de la conversación (se actualiza en su clave 'embeddings')
         """
         self.llm_client = llm_client
         self.max_selected = max_selected
+        self.selector = selector
+        self.embedding_model = embedding_model
+        self.embedding_fn = embedding_fn or (lambda text: ollama_embedding_fn(text, model=embedding_model))
+        self.state = state if state is not None else {}
         self.optimizations_count = 0
+        self.embedded_messages = 0
+        self.selection_ms = None
     
     def optimize(self, messages:List[Dict[str,str]], new_query:str = "") -> List[Dict[str, str]]:
         """
@@ -227,10 +372,91 @@ class SmartSelectionStrategy(ContextStrategy):
         system_messages = [msg for msg in messages if msg.get('role') == 'system']
         other_messages = [msg for msg in messages if msg.get('role') != 'system']
 
-        selected = self._select_relevant_messages(other_messages, new_query)
+        if self.selector == "embedding":
+            start = time.perf_counter()
+            selected = self._select_by_embedding(other_messages, new_query)
+            self.selection_ms = (time.perf_counter() - start) * 1000
+        else:
+            selected = self._select_relevant_messages(other_messages, new_query)
 
         self.optimizations_count += 1
-        return selected
+        return system_messages + selected
+
+    @staticmethod
+    def _message_key(msg:Dict[str,str]) -> str:
+        return hashlib.sha256(f"{msg.get('role')}\n{msg.get('message')}".encode("utf-8")).hexdigest()[:16]
+
+    def _message_vectors(self, messages:List[Dict[str,str]]) -> np.ndarray:
+        """
+        Matriz (mensajes x dimensión) de embeddings normalizados
+
+        Sólo se calculan los que no están en el estado; se guardan en float16 y
+        base64 para que el estado de la conversación siga siendo JSON compacto.
+        """
+        cached = self.state.get('embeddings') or {}
+        if cached.get('model') != self.embedding_model:
+            cached = {'model': self.embedding_model, 'vectors': {}}
+        stored = cached['vectors']
+
+        keys = [self._message_key(msg) for msg in messages]
+        vectors = {}
+        for key, msg in zip(keys, messages):
+            if key in vectors:
+                continue
+            if key in stored:
+                vectors[key] = np.frombuffer(base64.b64decode(stored[key]), dtype=np.float16).astype(np.float32)
+                continue
+            vector = np.asarray(self.embedding_fn(msg['message'][:2000]), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vectors[key] = vector / norm if norm else vector
+            self.embedded_messages += 1
+
+        # Una sola asignación (el estado puede leerse desde otro hilo); sólo quedan los mensajes actuales
+        self.state['embeddings'] = {
+            'model': self.embedding_model,
+            'vectors': {
+                key: stored.get(key) or base64.b64encode(vector.astype(np.float16).tobytes()).decode("ascii")
+                for key, vector in vectors.items()
+            },
+        }
+        return np.vstack([vectors[key] for key in keys])
+
+    def _select_by_embedding(self, messages:List[Dict[str,str]], new_query:str = "") -> List[Dict[str, str]]:
+        """
+        Selecciona los intercambios más parecidos a la consulta (sin llamadas al LLM)
+
+        Cada intercambio empieza en un mensaje del usuario e incluye las respuestas
+        siguientes; su puntuación es la mayor similitud de sus mensajes con la
+        consulta. El mensaje final del usuario (la consulta) se mantiene siempre.
+
+        Args:
+            messages: Lista de mensajes (sin los del sistema)
+            new_query: La consulta del usuario
+
+        Returns:
+            Lista con los mensajes seleccionados, en orden cronológico
+        """
+        pending = messages[-1:] if messages and messages[-1].get('role') == 'user' else []
+        history = messages[:len(messages) - len(pending)]
+        if not history:
+            return pending
+        try:
+            matrix = self._message_vectors(history)
+            query = np.asarray(self.embedding_fn(new_query or pending[0]['message']), dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Error en la selección por embeddings: {e}")
+            return messages[-self.max_selected*2:]
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != matrix.shape[1]:
+            return messages[-self.max_selected*2:]
+
+        similarities = matrix @ (query / norm)
+        starts = [0] + [i for i in range(1, len(history)) if history[i].get('role') == 'user']
+        scores = np.maximum.reduceat(similarities, starts)
+        best = np.sort(np.argsort(-scores, kind="stable")[:self.max_selected])
+        ends = starts[1:] + [len(history)]
+        selected = [msg for exchange in best for msg in history[starts[exchange]:ends[exchange]]]
+        return selected + pending
 
     def _select_relevant_messages(self,  messages:List[Dict[str,str]], new_query:str = "") -> List[Dict[str, str]]:
         """
@@ -269,13 +495,17 @@ class SmartSelectionStrategy(ContextStrategy):
         0,1,4,5,8,9
 
         NÚMEROS:"""
+        max_indices = self.max_selected * 2
         try:
-            generator = self.llm_client.generate_response(selection_prompt, messages = [])
-            response = ""
-            for chunk in generator:
-                if chunk:
-                    response += chunk
-            selected_indices = [int(n.strip()) for n in response.split(",") if n.strip().isDigit()]
+            # Salida corta: se cierra al tener todos los índices permitidos o al cambiar de línea
+            with call_purpose("selection"):
+                response, _ = self.llm_client.generate_auxiliary(
+                    selection_prompt,
+                    max_tokens=DEFAULT_SETTINGS["auxiliary_max_tokens"]["selection"],
+                    stop=["\n\n"],
+                    parse=lambda text: text if len(re.findall(r"\d+\D", text)) >= max_indices else None,
+                )
+            selected_indices = [int(n) for n in re.findall(r"\d+", response)][:max_indices]
             return [messages[i] for i in selected_indices if i < len(messages)]
         except Exception as e:
             return messages[-self.max_selected*2:]
@@ -287,7 +517,10 @@ class SmartSelectionStrategy(ContextStrategy):
         return {
             'strategy': self.get_strategy_name(),
             'max_selected': self.max_selected,
-            'optimizations': self.optimizations_count
+            'optimizations': self.optimizations_count,
+            'selector': self.selector,
+            'embedded_messages': self.embedded_messages,
+            'selection_ms': self.selection_ms,
         }
 
 if __name__ == "__main__":
@@ -433,5 +666,15 @@ if __name__ == "__main__":
         print(f"[{i}] {role}: {content}...")
     print("=" * 80)
 
-
-        
+    print("\n🧪 Selección por embeddings (sin llamadas al LLM)\n")
+    state = {}
+    for attempt in ("primera vez", "con los vectores guardados"):
+        strategy = SmartSelectionStrategy(llm_client, max_selected=4, selector="embedding", state=state)
+        optimized = strategy.optimize(messages, new_query)
+        stats = strategy.get_stats()
+        print(f" {attempt}: {stats['selection_ms']:.1f} ms, {stats['embedded_messages']} mensajes indexados")
+    for i,msg in enumerate(optimized):
+        role = msg.get("role", "unknown").upper()
+        content = msg.get("message","")[:100]
+        print(f"[{i}] {role}: {content}...")
+    print("=" * 80)
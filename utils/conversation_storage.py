@@ -5,8 +5,8 @@ class ConversationStorage(ABC):
     """ Clase base para guardar / cargar conversaciones """
 
     @abstractmethod
-    def save_conversation(self, conversation_id:str, name:str, messages: List[Dict]) -> bool:
-        """ Guarda una conversación """
+    def save_conversation(self, conversation_id:str, name:str, messages: List[Dict], context_state: Optional[Dict] = None) -> bool:
+        """ Guarda una conversación (y el estado de las estrategias de contexto, p. ej. el resumen) """
         pass
 
     @abstractmethod
@@ -25,6 +25,6 @@ class ConversationStorage(ABC):
         pass
 
     @abstractmethod
-    def update_conversation(self, conversation_id: str, messages:List[Dict]) -> bool:
-        """ Actualiza una conversación existente """
+    def update_conversation(self, conversation_id: str, messages:List[Dict], context_state: Optional[Dict] = None) -> bool:
+        """ Actualiza una conversación existente (context_state None = se conserva el guardado) """
         pass
\ No newline at end of file
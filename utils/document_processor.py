@@ -10,9 +10,11 @@ Extrae texto limpio y validado
 """
 
 import os
+import mmap
+import codecs
 import logging
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Tuple, Iterator
 
 from pypdf import PdfReader
 from docx import Document
@@ -25,6 +27,12 @@ class DocumentProcessor:
     SUPPORTED_FORMATS = {'.pdf','.docx', '.txt', '.md'}
     # 100 MB
     MAX_FILE_SIZE = 100 * 1024 * 1024 
+    # A partir de 4 MB los archivos de texto se mapean en memoria
+    MMAP_THRESHOLD = 4 * 1024 * 1024
+    # Bytes leídos para detectar la codificación
+    SNIFF_SIZE = 64 * 1024
+    # Bytes decodificados en cada segmento
+    SEGMENT_SIZE = 1024 * 1024
 
     @staticmethod
     def process_document(file_path: str) -> Tuple[str,str]:
@@ -41,19 +49,9 @@ class DocumentProcessor:
             ValueError: Si el formato no está soportado o hay errores
             FileNotFoundError: Si el documento no existe
         """
-        file_Path = Path(file_path)
-
-        if not file_Path.exists():
-            raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
-        
+        file_Path = DocumentProcessor._validate_file(file_path)
         file_ext = file_Path.suffix.lower()
-        if file_ext not in DocumentProcessor.SUPPORTED_FORMATS:
-            raise ValueError(f"Formato no soportado: {file_ext}  | Soportados: {DocumentProcessor.SUPPORTED_FORMATS}")
 
-        file_size = file_Path.stat().st_size
-        if file_size > DocumentProcessor.MAX_FILE_SIZE:
-            raise ValueError(f"Archivo excede de {DocumentProcessor.MAX_FILE_SIZE/1024/1024:.1f} MB ({file_size/1024/1024:.1f} MB)")
-        
         if file_ext == '.pdf':
             text = DocumentProcessor._extract_pdf(file_Path)
         elif file_ext == '.docx':
@@ -67,6 +65,29 @@ class DocumentProcessor:
         logger.info(f"Texto extraído: {len(text)} caracteres")
         return text, file_Path.name
     
+    @staticmethod
+    def _validate_file(file_path: str) -> Path:
+        """
+        Comprueba que el documento existe, tiene un formato soportado y no excede el tamaño máximo
+
+        Returns:
+            La ruta al documento como Path
+        """
+        file_Path = Path(file_path)
+
+        if not file_Path.exists():
+            raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+        
+        file_ext = file_Path.suffix.lower()
+        if file_ext not in DocumentProcessor.SUPPORTED_FORMATS:
+            raise ValueError(f"Formato no soportado: {file_ext}  | Soportados: {DocumentProcessor.SUPPORTED_FORMATS}")
+
+        file_size = file_Path.stat().st_size
+        if file_size > DocumentProcessor.MAX_FILE_SIZE:
+            raise ValueError(f"Archivo excede de {DocumentProcessor.MAX_FILE_SIZE/1024/1024:.1f} MB ({file_size/1024/1024:.1f} MB)")
+        
+        return file_Path
+
     @staticmethod
     def _extract_pdf(file_path:Path) -> str:
         """ Extrae el texto de un PDF """
@@ -104,17 +125,123 @@ class DocumentProcessor:
     @staticmethod
     def _extract_text(file_path:Path) -> str:
         """ Extrae el texto de un documento de texto plano """
+        return "".join(DocumentProcessor.iter_text_segments(file_path))
+
+    @staticmethod
+    def iter_text_segments(file_path:Path, segment_size:int = SEGMENT_SIZE) -> Iterator[str]:
+        """
+        Lee un documento de texto plano por segmentos ya decodificados
+
+        Los archivos grandes se mapean en memoria (mmap) y se decodifican
+        de forma incremental, así que el archivo se lee una única vez y
+        nunca se copia entero en memoria.
+
+        Args:
+            file_path: La ruta al documento
+            segment_size: Bytes a decodificar en cada segmento
+
+        Yields:
+            Segmentos de texto decodificado
+
+        Raises:
+            ValueError: Si hay errores al leer el archivo
+        """
+        file_path = Path(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-8') as f:
-                    return f.read()
-            except Exception as e:
-                raise ValueError(f"Error al procesar {file_path.name} : {str(e)}")
+            with open(file_path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size == 0:
+                    return
+
+                if file_size >= DocumentProcessor.MMAP_THRESHOLD:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = f.read()
+
+                try:
+                    view = memoryview(data)
+                except Exception:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+                    raise
+
+                try:
+                    encoding = DocumentProcessor._detect_encoding(view[:DocumentProcessor.SNIFF_SIZE])
+                    logger.info(f"Codificación detectada para {file_path.name}: {encoding}")
+
+                    # El decodificador incremental respeta los caracteres multibyte
+                    # que quedan partidos entre dos segmentos
+                    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                    for start in range(0, file_size, segment_size):
+                        segment = decoder.decode(view[start:start + segment_size])
+                        if segment:
+                            yield segment
+                    tail = decoder.decode(b'', final=True)
+                    if tail:
+                        yield tail
+                finally:
+                    view.release()
+                    if isinstance(data, mmap.mmap):
+                        data.close()
         except Exception as e:
             raise ValueError(f"Error al procesar {file_path.name} : {str(e)}")
+
+    @staticmethod
+    def _detect_encoding(sample:memoryview) -> str:
+        """
+        Detecta la codificación a partir de una muestra del inicio del archivo
+
+        Args:
+            sample: Los primeros bytes del archivo
+
+        Returns:
+            Nombre del codec a usar
+        """
+        head = bytes(sample[:4])
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+            return 'utf-16'
+
+        # Decodificación incremental: un carácter cortado al final de la muestra no es un error
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+        try:
+            codecs.decode(sample, 'cp1252')
+            return 'cp1252'
+        except UnicodeDecodeError:
+            return 'latin-1'
+
+    @staticmethod
+    def stream_document(file_path: str) -> Tuple[Iterator[str], str]:
+        """
+        Igual que process_document pero retorna el texto por segmentos
+
+        Los formatos de texto plano se leen en streaming; PDF y Word se
+        extraen completos y se entregan como un único segmento.
+
+        Args:
+            file_path: La ruta al documento
+
+        Returns:
+            Tupla[iterador de segmentos de texto, nombre documento]
+
+        Raises:
+            ValueError: Si el formato no está soportado o hay errores
+            FileNotFoundError: Si el documento no existe
+        """
+        file_Path = DocumentProcessor._validate_file(file_path)
+        file_ext = file_Path.suffix.lower()
+
+        if file_ext == '.pdf':
+            return iter([DocumentProcessor._extract_pdf(file_Path)]), file_Path.name
+        elif file_ext == '.docx':
+            return iter([DocumentProcessor._extract_docx(file_Path)]), file_Path.name
+        return DocumentProcessor.iter_text_segments(file_Path), file_Path.name
         
 
 if __name__ == '__main__':
@@ -135,7 +262,7 @@ if __name__ == '__main__':
 
     print(f"📁 Documentos encontrados: {len(documents)}\n")
 
-    results[]
+    results = []
     for doc_path in sorted(documents):
         if doc_path.is_file():
             print(f"📄 Procesando {doc_path.name}")
@@ -143,4 +270,12 @@ if __name__ == '__main__':
 
             try:
                 text, filename = DocumentProcessor.process_document(str(doc_path))
-                
\ No newline at end of file
+                results.append((filename, len(text)))
+                print(f"✅ {filename}: {len(text)} caracteres")
+                print(f"   {text[:200].strip()}...")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+            print()
+
+    print("="*70)
+    print(f"📶 Procesados correctamente: {len(results)} / {len(documents)}")
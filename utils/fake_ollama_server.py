@@ -0,0 +1,361 @@
+"""
+Servidor Ollama simulado para pruebas de carga y benchmarks sin red
+
+Habla el protocolo de Ollama (/api/generate, /api/chat, /api/embed,
+/api/embeddings, /api/version, /api/tags) con streaming NDJSON. El tiempo
+hasta el primer token, la velocidad, la longitud de las respuestas y la
+tasa de errores son configurables. Los embeddings son pseudo-embeddings
+deterministas (hashing de palabras y trigramas), así que textos parecidos
+tienen vectores parecidos.
+
+Uso:
+    python -m utils.fake_ollama_server --port 11435 --ttft 0.3 --tokens-per-second 40
+
+    # En otra terminal
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 OLLAMA_HOST=http://127.0.0.1:11435 streamlit run app.py
+
+OLLAMA_BASE_URL lo usa OllamaClient; OLLAMA_HOST, la librería ollama (embeddings del RAG).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+ERROR_MODES = ("http", "stream", "disconnect", "stall")
+
+_VOCABULARY = (
+    "el código la función una clase los datos para que con por de en se es como "
+    "Python API servidor cliente patrón prueba error variable método módulo "
+    "rendimiento memoria consulta base caché async proceso hilo respuesta "
+    "ejemplo debes usar puedes mejorar importante también además porque así "
+    "primero después finalmente revisa implementa define devuelve recibe"
+).split()
+
+
+def pseudo_embedding(text:str, dim:int = 1024) -> List[float]:
+    """
+    Embedding determinista de un texto (norma 1)
+
+    Suma vectores aleatorios fijos por palabra y por trigrama de caracteres:
+    textos con palabras en común tienen similitud coseno alta.
+    """
+    vector = [0.0] * dim
+    text = text.lower()
+    features = re.findall(r"\w+", text)
+    features += [text[i:i + 3] for i in range(max(0, len(text) - 2))]
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=16).digest()
+        for i in range(0, 16, 4):
+            index = int.from_bytes(digest[i:i + 3], "little") % dim
+            vector[index] += 1.0 if digest[i + 3] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOllamaServer:
+    """ Servidor HTTP que imita a Ollama en un hilo en segundo plano """
+
+    def __init__(
+            self,
+            host:str = "127.0.0.1",
+            port:int = 11435,
+            ttft:float = 0.3,
+            tokens_per_second:float = 40.0,
+            length_mean:int = 120,
+            length_stddev:int = 40,
+            embedding_dim:int = 1024,
+            error_rate:float = 0.0,
+            error_modes:Sequence[str] = ERROR_MODES,
+            models:Sequence[str] = ("llama3.2:3b", "mxbai-embed-large"),
+            seed:int = 0,
+        ):
+        """
+        Inicializa el servidor
+
+        Args:
+            host: Interfaz en la que escuchar
+            port: Puerto (0 = uno libre)
+            ttft: Segundos hasta el primer token
+            tokens_per_second: Velocidad de generación
+            length_mean: Longitud media de las respuestas (tokens)
+            length_stddev: Desviación típica de la longitud de las respuestas
+            embedding_dim: Dimensión de los embeddings
+            error_rate: Probabilidad de que una petición falle (0-1)
+            error_modes: Tipos de fallo a inyectar: 'http' (500), 'stream' (error en
+                mitad del stream), 'disconnect' (corta la conexión) y 'stall' (deja de responder)
+            models: Modelos que se anuncian en /api/tags
+            seed: Semilla; el mismo prompt produce siempre la misma respuesta
+        """
+        unknown = set(error_modes) - set(ERROR_MODES)
+        if unknown:
+            raise ValueError(f"Modos de error no soportados: {unknown} | Soportados: {ERROR_MODES}")
+
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.length_mean = length_mean
+        self.length_stddev = length_stddev
+        self.embedding_dim = embedding_dim
+        self.error_rate = error_rate
+        self.error_modes = list(error_modes)
+        self.models = list(models)
+        self.seed = seed
+
+        self.stats = {'requests': 0, 'errors': 0, 'tokens': 0, 'embeddings': 0}
+        self._stats_lock = threading.Lock()
+        self._error_random = random.Random(seed)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """ Arranca el servidor en un hilo en segundo plano """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Detiene el servidor """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key:str, amount:int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def pick_error(self) -> Optional[str]:
+        """ Decide si la petición actual falla y cómo """
+        if self.error_rate <= 0 or not self.error_modes:
+            return None
+        with self._stats_lock:
+            if self._error_random.random() >= self.error_rate:
+                return None
+            self.stats['errors'] += 1
+            return self._error_random.choice(self.error_modes)
+
+    def make_tokens(self, prompt:str, limit:Optional[int] = None) -> List[str]:
+        """ Respuesta determinista (por prompt y semilla) con longitud aleatoria """
+        rng = random.Random(f"{self.seed}:{prompt}")
+        length = max(1, int(rng.gauss(self.length_mean, self.length_stddev)))
+        if limit is not None and limit > 0:
+            length = min(length, limit)
+        tokens = []
+        for i in range(length):
+            word = rng.choice(_VOCABULARY)
+            tokens.append(word if i == 0 else " " + word)
+            if i % 15 == 14:
+                tokens[-1] += "."
+        return tokens
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data:Dict[str, Any], status:int = 200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _write_chunk(self, data:Dict[str, Any]):
+                line = json.dumps(data).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                server._count('requests')
+                if self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                elif self.path == "/api/tags":
+                    self._send_json({"models": [{"name": name, "model": name} for name in server.models]})
+                elif self.path == "/":
+                    self._send_json({"status": "Ollama is running"})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                server._count('requests')
+                try:
+                    body = self._read_json()
+                except json.JSONDecodeError:
+                    self._send_json({"error": "invalid JSON"}, status=400)
+                    return
+
+                error = server.pick_error() if self.path in ("/api/generate", "/api/chat") else None
+                if error == "http":
+                    self._send_json({"error": "fake server: injected error"}, status=500)
+                    return
+
+                if self.path == "/api/generate":
+                    self._generate(body, prompt=body.get("prompt", ""), chat=False, error=error)
+                elif self.path == "/api/chat":
+                    messages = body.get("messages") or []
+                    prompt = "\n".join(m.get("content", "") for m in messages)
+                    self._generate(body, prompt=prompt, chat=True, error=error)
+                elif self.path == "/api/embed":
+                    inputs = body.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+                    server._count('embeddings', len(inputs))
+                    self._send_json({
+                        "model": body.get("model"),
+                        "embeddings": [pseudo_embedding(text, server.embedding_dim) for text in inputs],
+                    })
+                elif self.path == "/api/embeddings":
+                    server._count('embeddings')
+                    self._send_json({"embedding": pseudo_embedding(body.get("prompt", ""), server.embedding_dim)})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def _generate(self, body:Dict[str, Any], prompt:str, chat:bool, error:Optional[str]):
+                start = time.perf_counter()
+                options = body.get("options") or {}
+                limit = options.get("num_predict", body.get("max_tokens"))
+                tokens = server.make_tokens(prompt, limit)
+                model = body.get("model")
+
+                def message(text:str, done:bool) -> Dict[str, Any]:
+                    data = {
+                        "model": model,
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "done": done,
+                    }
+                    if chat:
+                        data["message"] = {"role": "assistant", "content": text}
+                    else:
+                        data["response"] = text
+                    return data
+
+                def final() -> Dict[str, Any]:
+                    data = message("", True)
+                    elapsed = int((time.perf_counter() - start) * 1e9)
+                    data.update({
+                        "done_reason": "stop" if limit is None or len(tokens) < limit else "length",
+                        "total_duration": elapsed,
+                        "load_duration": 0,
+                        "prompt_eval_count": len(prompt.split()),
+                        "eval_count": len(tokens),
+                        "eval_duration": elapsed,
+                    })
+                    return data
+
+                time.sleep(server.ttft)
+                if error == "stall":
+                    time.sleep(3600)
+                    return
+
+                if body.get("stream", True) is False:
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                    server._count('tokens', len(tokens))
+                    data = final()
+                    if chat:
+                        data["message"]["content"] = "".join(tokens)
+                    else:
+                        data["response"] = "".join(tokens)
+                    self._send_json(data)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                # Los errores dentro del stream llegan a mitad de la respuesta
+                fail_at = len(tokens) // 2 if error in ("stream", "disconnect") else None
+                interval = 1.0 / server.tokens_per_second
+                try:
+                    for i, token in enumerate(tokens):
+                        if i == fail_at:
+                            if error == "stream":
+                                self._write_chunk({"error": "fake server: injected stream error"})
+                                self.wfile.write(b"0\r\n\r\n")
+                            else:
+                                self.close_connection = True
+                            return
+                        if i > 0:
+                            time.sleep(interval)
+                        self._write_chunk(message(token, False))
+                        server._count('tokens')
+                    self._write_chunk(final())
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente cerró el stream
+                    self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435, help="Puerto del primer servidor")
+    parser.add_argument("--instances", type=int, default=1, help="Número de servidores (puertos consecutivos)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Segundos hasta el primer token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--length-mean", type=int, default=120, help="Longitud media de las respuestas (tokens)")
+    parser.add_argument("--length-stddev", type=int, default=40)
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de fallo por petición (0-1)")
+    parser.add_argument("--error-modes", default=",".join(ERROR_MODES), help=f"Separados por comas: {', '.join(ERROR_MODES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    servers = [
+        FakeOllamaServer(
+            host=args.host,
+            port=args.port + i,
+            ttft=args.ttft,
+            tokens_per_second=args.tokens_per_second,
+            length_mean=args.length_mean,
+            length_stddev=args.length_stddev,
+            embedding_dim=args.embedding_dim,
+            error_rate=args.error_rate,
+            error_modes=[mode.strip() for mode in args.error_modes.split(",") if mode.strip()],
+            seed=args.seed + i,
+        ).start()
+        for i in range(args.instances)
+    ]
+    urls = ",".join(server.base_url for server in servers)
+    print(f"Servidores Ollama simulados en: {urls}")
+    print(f"  OLLAMA_BASE_URL={urls}")
+    print(f"  OLLAMA_HOST={servers[0].base_url}")
+
+    try:
+        while True:
+            time.sleep(10)
+            for server in servers:
+                print(f"{server.base_url}: {server.stats}")
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
@@ -0,0 +1,117 @@
+"""
+Caché de veredictos de los guardrails
+
+Reintentos, ediciones y preguntas repetidas pasan el mismo texto por los
+guardrails una y otra vez. Los veredictos (regex, LLM y pre-análisis) se
+guardan bajo un hash del texto que evaluó la capa y de la versión de la capa
+que los produjo (reglas, prompt de análisis, modelo...), así que cualquier
+cambio en las reglas o en los prompts deja de servir los veredictos
+anteriores sin tener que vaciar la caché.
+
+La clave se calcula exactamente sobre el texto evaluado: si una capa evaluara
+el texto original y la clave usara el normalizado, una variante que esquiva
+la capa (ancho completo, saltos de línea...) guardaría un veredicto "seguro"
+que después se serviría a la forma normal del ataque. Las reglas evalúan la
+entrada normalizada (ver normalize_input) y las capas LLM el texto original.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import DEFAULT_SETTINGS
+
+
+def normalize_input(text:str) -> str:
+    """ NFKC, minúsculas y espacios colapsados """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def version_hash(*parts:Any) -> str:
+    """ Huella corta de los datos que determinan el veredicto de una capa """
+    raw = "\n".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class GuardrailVerdictCache:
+    """ Caché LRU en memoria con caducidad """
+
+    def __init__(self, max_entries:int = 2048, ttl:Optional[float] = 3600):
+        """
+        Args:
+            max_entries: Número máximo de veredictos guardados
+            ttl: Segundos de validez de cada veredicto (None = sin caducidad)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(layer:str, version:str, user_input:str) -> str:
+        """
+        Args:
+            layer: Capa que produce el veredicto ('regex', 'llm', 'preanalysis')
+            version: Huella de las reglas / prompt / modelo de la capa
+            user_input: El texto exacto que evalúa la capa
+        """
+        raw = f"{layer}\n{version}\n{user_input}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key:str) -> Optional[Dict[str, Any]]:
+        """ Veredicto guardado o None si no está (o ha caducado) """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                verdict, created_at = entry
+                if self.ttl is None or time.time() - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return verdict
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key:str, verdict:Dict[str, Any]):
+        """ Guarda un veredicto """
+        with self._lock:
+            self._entries[key] = (verdict, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ Retorna estadísticas de la caché """
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            }
+
+
+_shared_cache: Optional[GuardrailVerdictCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_guardrail_cache() -> GuardrailVerdictCache:
+    """ Retorna la caché de veredictos compartida por todas las sesiones del proceso """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = GuardrailVerdictCache(
+                max_entries=DEFAULT_SETTINGS["guardrail_cache_max_entries"],
+                ttl=DEFAULT_SETTINGS["guardrail_cache_ttl"],
+            )
+        return _shared_cache
@@ -18,7 +18,7 @@ class JSONStorage(ConversationStorage):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
 
-    def save_conversation(self, conversation_id, name, messages):
+    def save_conversation(self, conversation_id, name, messages, context_state=None):
         """
         Guarda una conversación en un archivo JSON
 
@@ -26,6 +26,7 @@ class JSONStorage(ConversationStorage):
             conversation_id: El id de la conversación
             name: Un nombre significativo
             messages: La lista de mensajes
+            context_state: Estado de las estrategias de contexto (p. ej. el resumen incremental)
         
         Returns:
             True si la conversación se ha guardado correctamente
@@ -37,7 +38,8 @@ class JSONStorage(ConversationStorage):
                 "name": name,
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat(),
-                "messages": messages
+                "messages": messages,
+                "context_state": context_state or {}
             }
 
             filepath = self.storage_dir / f"{conversation_id}.json"
@@ -117,13 +119,14 @@ class JSONStorage(ConversationStorage):
             print(f"❌ Error eliminando {filepath} : {e}")
             return False
 
-    def update_conversation(self, conversation_id, messages):
+    def update_conversation(self, conversation_id, messages, context_state=None):
         """
         Actualiza la conversación
 
         Args:
             conversation_id: El id de la conversación a actualizar
             messages: Los mensajes
+            context_state: Estado de las estrategias de contexto (None = se conserva el guardado)
         
         Returns:
             True si la actualización ha tenido éxito
@@ -139,6 +142,8 @@ class JSONStorage(ConversationStorage):
             
             data["updated_at"] = datetime.now().isoformat()
             data["messages"] = messages
+            if context_state is not None:
+                data["context_state"] = context_state
 
             with open(filepath, 'w', encoding="UTF-8") as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
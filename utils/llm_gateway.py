@@ -0,0 +1,281 @@
+"""
+Gateway LLM con reintentos, circuit breaker y failover entre proveedores
+
+Expone la misma interfaz que los clientes (generate_response), así que
+puede usarse en cualquier sitio donde se use un cliente LLM.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple
+
+from utils.api_client import AuxiliaryCallMixin, LLMError, create_llm_provider
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(LLMError):
+    """ Ningún proveedor del gateway ha podido generar la respuesta """
+
+    def __init__(self, errors:List[str]):
+        super().__init__("gateway", "ningún proveedor disponible (" + "; ".join(errors) + ")")
+        self.errors = errors
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor
+
+    - CERRADO: las peticiones pasan con normalidad
+    - ABIERTO: tras failure_threshold fallos seguidos se rechazan las peticiones
+    - SEMIABIERTO: pasado reset_timeout se deja pasar una única petición de prueba
+    """
+
+    CLOSED = "cerrado"
+    OPEN = "abierto"
+    HALF_OPEN = "semiabierto"
+
+    def __init__(self, failure_threshold:int = 3, reset_timeout:float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos para abrir el circuito
+            reset_timeout: Segundos con el circuito abierto antes de volver a probar
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """ Estado actual del circuito """
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """ Indica si se puede enviar una petición al proveedor """
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """ Registra una petición correcta y cierra el circuito """
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """ Registra un fallo y abre el circuito si se alcanza el umbral """
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LLMGateway(AuxiliaryCallMixin):
+    """
+    Gateway sobre varios clientes LLM
+
+    Cada petición se envía al primer proveedor disponible por orden de
+    prioridad. Los errores antes del primer chunk se reintentan con backoff
+    exponencial y, si persisten, se pasa al siguiente proveedor. Los
+    proveedores con el circuito abierto se saltan y los que superan
+    slow_threshold de latencia (EWMA del tiempo hasta el primer chunk) pasan
+    al final de la cola. Como un proveedor al final de la cola casi no recibe
+    peticiones, cada probe_interval segundos se le deja una petición en su
+    posición original para volver a medir su latencia.
+    """
+
+    def __init__(
+            self,
+            providers:Sequence[Tuple[str, Any]],
+            max_retries:int = 2,
+            backoff_base:float = 0.5,
+            backoff_max:float = 8.0,
+            failure_threshold:int = 3,
+            reset_timeout:float = 30.0,
+            slow_threshold:Optional[float] = 10.0,
+            ewma_alpha:float = 0.3,
+            probe_interval:float = 60.0,
+        ):
+        """
+        Inicializa el gateway
+
+        Args:
+            providers: Lista de (nombre, cliente) por orden de prioridad
+            max_retries: Reintentos por proveedor antes de pasar al siguiente
+            backoff_base: Espera inicial entre reintentos (segundos)
+            backoff_max: Espera máxima entre reintentos (segundos)
+            failure_threshold: Fallos consecutivos para abrir el circuito de un proveedor
+            reset_timeout: Segundos antes de volver a probar un proveedor con el circuito abierto
+            slow_threshold: Latencia (segundos) a partir de la cual un proveedor se considera lento (None para no reordenar)
+            ewma_alpha: Peso de la última medida en la media móvil de latencia
+            probe_interval: Segundos sin medidas tras los que un proveedor lento recupera su posición en una petición
+        """
+        if not providers:
+            raise ValueError("El gateway necesita al menos un proveedor")
+
+        self.providers = list(providers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slow_threshold = slow_threshold
+        self.ewma_alpha = ewma_alpha
+        self.probe_interval = probe_interval
+
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name, _ in self.providers}
+        self.stats = {
+            name: {'requests': 0, 'failures': 0, 'failovers': 0, 'probes': 0, 'ewma_latency': None}
+            for name, _ in self.providers
+        }
+        # Última medida (o prueba reservada) de latencia de cada proveedor y pruebas en curso
+        self._latency_measured_at: Dict[str, float] = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+        # El gateway necesita excepciones, no texto de error como respuesta
+        for _, client in self.providers:
+            client.raise_errors = True
+
+    def _ordered_providers(self) -> List[Tuple[str, Any]]:
+        """ Proveedores por prioridad, con los lentos al final (salvo el que toque volver a probar) """
+        if self.slow_threshold is None:
+            return self.providers
+
+        now = time.monotonic()
+        slow = set()
+        with self._lock:
+            for name, _ in self.providers:
+                latency = self.stats[name]['ewma_latency']
+                if latency is None or latency <= self.slow_threshold:
+                    continue
+                if now - self._latency_measured_at.get(name, now) >= self.probe_interval:
+                    # Prueba: conserva su posición en esta petición y se reserva hasta el siguiente intervalo
+                    self._latency_measured_at[name] = now
+                    self._probing.add(name)
+                    self.stats[name]['probes'] += 1
+                    continue
+                slow.add(name)
+
+        return sorted(self.providers, key=lambda provider: provider[0] in slow)
+
+    def _record_latency(self, name:str, latency:float):
+        """ Actualiza la media móvil de latencia de un proveedor """
+        with self._lock:
+            previous = self.stats[name]['ewma_latency']
+            if previous is None or name in self._probing:
+                # La media de un proveedor apartado es antigua: la prueba la sustituye
+                self._probing.discard(name)
+                self.stats[name]['ewma_latency'] = latency
+            else:
+                self.stats[name]['ewma_latency'] = self.ewma_alpha * latency + (1 - self.ewma_alpha) * previous
+            self._latency_measured_at[name] = time.monotonic()
+
+    def _backoff(self, attempt:int) -> float:
+        """ Espera antes del reintento (backoff exponencial con jitter) """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Generator[str, None, None]:
+        """
+        Genera una respuesta con el primer proveedor disponible
+
+        Args:
+            prompt: El prompt para enviar al modelo
+            messages: Historial de mensajes previos
+            **kwargs: Parámetros adicionales (temperature, max_tokens)
+
+        Yields:
+            Chunks de la respuesta
+
+        Raises:
+            LLMError: Si el proveedor falla después de haber enviado parte de la respuesta
+            LLMUnavailableError: Si ningún proveedor ha podido responder
+        """
+        errors = []
+        for index, (name, client) in enumerate(self._ordered_providers()):
+            breaker = self.breakers[name]
+
+            for attempt in range(self.max_retries + 1):
+                if not breaker.allow_request():
+                    errors.append(f"{name}: circuito {breaker.state}")
+                    break
+
+                with self._lock:
+                    self.stats[name]['requests'] += 1
+                    if index > 0 and attempt == 0:
+                        self.stats[name]['failovers'] += 1
+
+                start = time.perf_counter()
+                started = False
+                try:
+                    for chunk in client.generate_response(prompt, messages, **kwargs):
+                        if not started:
+                            started = True
+                            self._record_latency(name, time.perf_counter() - start)
+                        yield chunk
+                    if not started:
+                        self._record_latency(name, time.perf_counter() - start)
+                    breaker.record_success()
+                    return
+                except GeneratorExit:
+                    # El consumidor abandonó el stream: el proveedor estaba respondiendo
+                    breaker.record_success()
+                    raise
+                except LLMError as ex:
+                    breaker.record_failure()
+                    with self._lock:
+                        self.stats[name]['failures'] += 1
+                    # Con parte de la respuesta ya entregada no se puede cambiar de proveedor
+                    if started:
+                        raise
+                    logger.warning(f"Fallo en {name} (intento {attempt + 1}): {ex}")
+                    errors.append(str(ex))
+                    if attempt < self.max_retries:
+                        time.sleep(self._backoff(attempt))
+
+        raise LLMUnavailableError(errors)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """ Retorna estadísticas y estado del circuito de cada proveedor """
+        with self._lock:
+            return {
+                name: {**stats, 'circuit': self.breakers[name].state}
+                for name, stats in self.stats.items()
+            }
+
+
+def create_llm_gateway(order:Sequence[str] = ("ollama", "gemini", "openai"), **kwargs) -> LLMGateway:
+    """
+    Crea un gateway con los proveedores configurados
+
+    Los proveedores que no se pueden crear (por ejemplo, sin API key) se omiten.
+
+    Args:
+        order: Proveedores por orden de prioridad
+        **kwargs: Parámetros del LLMGateway
+
+    Returns:
+        El gateway
+    """
+    providers = []
+    for name in order:
+        try:
+            providers.append((name, create_llm_provider(name)))
+        except ValueError as e:
+            logger.info(f"Proveedor {name} omitido: {e}")
+    return LLMGateway(providers, **kwargs)
@@ -0,0 +1,232 @@
+"""
+Métricas de las llamadas a los LLM
+
+Mide, para cada llamada a generate_response, el tiempo hasta el primer
+chunk (TTFT), los huecos entre chunks, la duración total, el número de
+chunks y los tokens de salida estimados. Cada registro se etiqueta con el
+proveedor, el modelo y el propósito de la llamada (answer, classify,
+guardrail, summary, title...).
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Generator, Iterator, List, Optional
+
+from config import DEFAULT_SETTINGS
+from utils.api_client import AuxiliaryCallMixin, closed_with_complete_answer, is_error_response
+from utils.token_manager import TokenManager
+
+logger = logging.getLogger(__name__)
+
+_call_purpose = contextvars.ContextVar("llm_call_purpose", default="other")
+
+
+@contextmanager
+def call_purpose(purpose:str) -> Iterator[None]:
+    """
+    Etiqueta las llamadas LLM hechas dentro del bloque con un propósito
+
+    Ejemplo:
+        with call_purpose("classify"):
+            response = llm_client.generate_response(prompt, {})
+    """
+    token = _call_purpose.set(purpose)
+    try:
+        yield
+    finally:
+        _call_purpose.reset(token)
+
+
+def get_call_purpose() -> str:
+    """ Propósito de la llamada en curso ('other' si no se ha indicado) """
+    return _call_purpose.get()
+
+
+def _percentile(values:List[float], percent:float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MetricsRegistry:
+    """ Registro en memoria de las llamadas LLM, con exportación a JSONL """
+
+    def __init__(self, max_records:int = 10000, jsonl_path:Optional[str] = None):
+        """
+        Args:
+            max_records: Número máximo de registros en memoria
+            jsonl_path: Si se indica, cada registro se añade también a este archivo JSONL
+        """
+        self.max_records = max_records
+        self.jsonl_path = jsonl_path
+        self._records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, record:Dict[str, Any]):
+        """ Añade el registro de una llamada """
+        with self._lock:
+            self._records.append(record)
+            if len(self._records) > self.max_records:
+                del self._records[:len(self._records) - self.max_records]
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    logger.error(f"No se pudo escribir la métrica en {self.jsonl_path}: {e}")
+
+    def get_records(self, **filters) -> List[Dict[str, Any]]:
+        """
+        Retorna los registros, opcionalmente filtrados (provider=..., purpose=..., model=...)
+        """
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if all(r.get(k) == v for k, v in filters.items())]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Agrega los registros por (proveedor, modelo, propósito)
+
+        Returns:
+            Lista con número de llamadas, errores, TTFT medio / p50 / p95,
+            duración media y tokens por segundo de cada grupo
+        """
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for record in self.get_records():
+            groups.setdefault((record['provider'], record['model'], record['purpose']), []).append(record)
+
+        summary = []
+        for (provider, model, purpose), records in sorted(groups.items(), key=lambda item: str(item[0])):
+            ttfts = [r['ttft'] for r in records if r['ttft'] is not None]
+            durations = [r['duration'] for r in records]
+            # El ritmo de generación sólo tiene sentido en respuestas completas de más de un chunk
+            completed = [r for r in records if r['status'] == "ok" and r['chunks'] > 1]
+            tokens = sum(r['output_tokens'] for r in completed)
+            streaming_time = sum(r['duration'] - r['ttft'] for r in completed)
+            summary.append({
+                'provider': provider,
+                'model': model,
+                'purpose': purpose,
+                'calls': len(records),
+                'errors': sum(1 for r in records if r['status'] == "error"),
+                'ttft_avg': sum(ttfts) / len(ttfts) if ttfts else None,
+                'ttft_p50': _percentile(ttfts, 50),
+                'ttft_p95': _percentile(ttfts, 95),
+                'duration_avg': sum(durations) / len(durations),
+                'tokens_per_second': tokens / streaming_time if streaming_time > 0 else None,
+            })
+        return summary
+
+    def export_jsonl(self, path:str) -> int:
+        """
+        Exporta todos los registros a un archivo JSONL
+
+        Returns:
+            Número de registros exportados
+        """
+        records = self.get_records()
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return len(records)
+
+    def clear(self):
+        with self._lock:
+            self._records = []
+
+
+class InstrumentedLLMClient(AuxiliaryCallMixin):
+    """
+    Envoltorio de un cliente LLM que mide cada llamada
+
+    El resto de atributos se delegan en el cliente original.
+    """
+
+    def __init__(self, llm_client, registry:Optional[MetricsRegistry] = None, provider:Optional[str] = None):
+        """
+        Args:
+            llm_client: Cliente LLM a medir
+            registry: Registro donde guardar las medidas (por defecto el compartido)
+            provider: Nombre del proveedor (por defecto, el nombre de la clase del cliente)
+        """
+        self.llm_client = llm_client
+        self.registry = registry or get_metrics_registry()
+        self.provider = provider or type(llm_client).__name__
+        self.token_manager = TokenManager()
+
+    def __getattr__(self, name:str):
+        return getattr(self.llm_client, name)
+
+    def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Generator[str, None, None]:
+        """
+        Genera la respuesta con el cliente original registrando sus tiempos
+
+        El propósito se lee aquí (y no al consumir el stream) para respetar
+        el bloque call_purpose en el que se hizo la llamada.
+        """
+        purpose = get_call_purpose()
+        return self._measure(purpose, prompt, messages, **kwargs)
+
+    def _measure(self, purpose:str, prompt:str, messages, **kwargs) -> Generator[str, None, None]:
+        start = time.perf_counter()
+        last = start
+        ttft = None
+        gaps = []
+        chunks = 0
+        text = ""
+        status = "ok"
+        try:
+            for chunk in self.llm_client.generate_response(prompt, messages, **kwargs):
+                now = time.perf_counter()
+                if chunk:
+                    if ttft is None:
+                        ttft = now - start
+                    else:
+                        gaps.append(now - last)
+                    last = now
+                    chunks += 1
+                    text += chunk
+                yield chunk
+        except GeneratorExit:
+            # generate_auxiliary cierra el stream al tener una respuesta válida: no es una cancelación
+            status = "ok" if closed_with_complete_answer() else "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            if status == "ok" and is_error_response(text):
+                status = "error"
+            self.registry.record({
+                'timestamp': datetime.now().isoformat(),
+                'provider': self.provider,
+                'model': getattr(self.llm_client, "model", None) or getattr(self.llm_client, "modelo", None),
+                'purpose': purpose,
+                'status': status,
+                'ttft': ttft,
+                'duration': time.perf_counter() - start,
+                'chunks': chunks,
+                'gap_avg': sum(gaps) / len(gaps) if gaps else None,
+                'gap_max': max(gaps) if gaps else None,
+                'output_tokens': self.token_manager.count_tokens(text),
+            })
+
+
+_shared_registry: Optional[MetricsRegistry] = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """ Retorna el registro de métricas compartido por todo el proceso """
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = MetricsRegistry(jsonl_path=DEFAULT_SETTINGS["llm_metrics_path"])
+        return _shared_registry
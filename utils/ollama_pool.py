@@ -0,0 +1,243 @@
+"""
+Pool de servidores Ollama con balanceo de carga
+
+Reparte las peticiones entre varios servidores Ollama, expulsa los que
+fallan y los vuelve a admitir cuando responden a la comprobación de salud.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaEndpoint:
+    """ Estado y métricas de un servidor Ollama del pool """
+
+    def __init__(self, url:str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.ewma_latency: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Métricas del servidor """
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'ewma_latency': self.ewma_latency,
+        }
+
+
+class OllamaEndpointPool:
+    """
+    Balanceador de carga entre servidores Ollama
+
+    Estrategias:
+        - least_outstanding: el servidor con menos peticiones en curso
+        - ewma: el servidor con menor latencia media (EWMA del tiempo hasta el
+          primer chunk) ponderada por sus peticiones en curso
+    """
+
+    STRATEGIES = ("least_outstanding", "ewma")
+
+    def __init__(
+            self,
+            urls:Sequence[str],
+            strategy:str = "least_outstanding",
+            eject_after:int = 3,
+            eject_duration:float = 30.0,
+            health_interval:float = 15.0,
+            probe_timeout:float = 2.0,
+            ewma_alpha:float = 0.3,
+        ):
+        """
+        Inicializa el pool
+
+        Args:
+            urls: URLs de los servidores Ollama
+            strategy: Estrategia de balanceo ('least_outstanding' o 'ewma')
+            eject_after: Fallos consecutivos para expulsar un servidor
+            eject_duration: Segundos mínimos que un servidor permanece expulsado
+            health_interval: Segundos entre comprobaciones de salud (0 para desactivarlas)
+            probe_timeout: Timeout de la comprobación de salud
+            ewma_alpha: Peso de la última medida en la media de latencia
+        """
+        if not urls:
+            raise ValueError("El pool necesita al menos un servidor Ollama")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Estrategia no soportada: {strategy} | Soportadas: {self.STRATEGIES}")
+
+        self.endpoints = [OllamaEndpoint(url) for url in urls]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_duration = eject_duration
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self.ewma_alpha = ewma_alpha
+
+        self._lock = threading.Lock()
+        self._probe_session = requests.Session()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def healthy_count(self) -> int:
+        """ Número de servidores admitidos """
+        with self._lock:
+            return sum(1 for endpoint in self.endpoints if endpoint.healthy)
+
+    def acquire(self, exclude:Sequence[OllamaEndpoint] = ()) -> Optional[OllamaEndpoint]:
+        """
+        Elige el servidor para la siguiente petición y la cuenta como en curso
+
+        Si todos los servidores están expulsados se elige igualmente uno de
+        ellos: es preferible intentarlo a rechazar la petición.
+
+        Args:
+            exclude: Servidores que no se deben elegir (ya intentados)
+
+        Returns:
+            El servidor elegido o None si no queda ninguno sin excluir
+        """
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if not candidates:
+                return None
+            healthy = [endpoint for endpoint in candidates if endpoint.healthy]
+            candidates = healthy or candidates
+
+            if self.strategy == "ewma":
+                # Los servidores sin medidas se prueban primero
+                def score(endpoint:OllamaEndpoint) -> float:
+                    return (endpoint.ewma_latency or 0.0) * (endpoint.outstanding + 1)
+            else:
+                def score(endpoint:OllamaEndpoint) -> float:
+                    return endpoint.outstanding
+
+            best = min(score(endpoint) for endpoint in candidates)
+            endpoint = random.choice([endpoint for endpoint in candidates if score(endpoint) == best])
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint:OllamaEndpoint, latency:Optional[float], success:bool):
+        """
+        Registra el final de una petición
+
+        Args:
+            endpoint: El servidor usado
+            latency: Tiempo hasta el primer chunk (None si no llegó ninguno)
+            success: Si la petición terminó sin errores
+        """
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if latency is not None:
+                if endpoint.ewma_latency is None:
+                    endpoint.ewma_latency = latency
+                else:
+                    endpoint.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma_latency
+
+            if success:
+                endpoint.consecutive_failures = 0
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and endpoint.consecutive_failures >= self.eject_after:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint:OllamaEndpoint):
+        """ Expulsa un servidor del pool (con el lock adquirido) """
+        endpoint.healthy = False
+        endpoint.ejections += 1
+        endpoint.ejected_until = time.monotonic() + self.eject_duration
+        logger.warning(f"Servidor Ollama expulsado: {endpoint.url}")
+
+    def probe(self, endpoint:OllamaEndpoint) -> bool:
+        """ Comprueba si un servidor responde """
+        try:
+            response = self._probe_session.get(f"{endpoint.url}/api/version", timeout=self.probe_timeout)
+            return response.ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def check_health(self):
+        """
+        Comprueba la salud de todos los servidores
+
+        Los expulsados se vuelven a admitir si ha pasado eject_duration y
+        responden; los admitidos que no responden se expulsan.
+        """
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and now < endpoint.ejected_until:
+                continue
+            alive = self.probe(endpoint)
+            with self._lock:
+                if alive and not endpoint.healthy:
+                    endpoint.healthy = True
+                    endpoint.consecutive_failures = 0
+                    logger.info(f"Servidor Ollama readmitido: {endpoint.url}")
+                elif not alive and endpoint.healthy:
+                    self._eject(endpoint)
+                elif not alive:
+                    endpoint.ejected_until = now + self.eject_duration
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"Error comprobando la salud de Ollama: {e}")
+
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        """ Métricas de cada servidor del pool """
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
+
+
+# Pools compartidos por lista de servidores (los clientes se recrean en cada rerun)
+_pools: Dict[Tuple[Tuple[str, ...], str], OllamaEndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(urls:Sequence[str], strategy:str = "least_outstanding", **kwargs) -> OllamaEndpointPool:
+    """
+    Retorna el pool compartido para una lista de servidores
+
+    Args:
+        urls: URLs de los servidores Ollama
+        strategy: Estrategia de balanceo
+        **kwargs: Parámetros adicionales de OllamaEndpointPool
+
+    Returns:
+        El pool
+    """
+    key = (tuple(url.rstrip("/") for url in urls), strategy)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = OllamaEndpointPool(urls, strategy=strategy, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,195 @@
+"""
+Guardrail de salida
+
+Revisa la respuesta del modelo mientras se genera: fragmentos literales de
+los templates del sistema (filtración del prompt) y reglas de contenido del
+archivo de reglas (claves de API, claves privadas...). Todo se compila en
+una sola expresión regular de longitud de coincidencia acotada (L), así que
+basta con revisar cada chunk junto con los últimos L-1 caracteres, que se
+retienen sin mostrar: el coste total es O(longitud de la respuesta) y una
+coincidencia se corta antes de llegar al usuario.
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import DEFAULT_SETTINGS
+from utils.guardrail_rules import get_guardrail_rules
+
+logger = logging.getLogger(__name__)
+
+# Separación tolerada entre las palabras de un fragmento (espacios, puntuación, markdown)
+_GAP = r"\W{1,6}"
+_GAP_MAX = 6
+
+
+class OutputGuardrail:
+    """ Matcher precompilado de la salida """
+
+    def __init__(self, protected_texts:Iterable[str] = (), rules:Optional[List[Dict[str, Any]]] = None,
+                 min_words:int = 8, phrase_words:int = 8, phrase_prefixes:Optional[Iterable[str]] = None,
+                 message:str = "⚠️ *Respuesta interrumpida por el filtro de salida*"):
+        """
+        Args:
+            protected_texts: Textos que el modelo no debe reproducir (templates del sistema)
+            rules: Reglas de contenido: {"id", "pattern", "max_length"}
+            min_words: Palabras mínimas de una frase de los templates para vigilarla
+            phrase_words: Palabras de cada frase que forman el fragmento a buscar
+            phrase_prefixes: Primeras palabras de las frases a vigilar (None para todas)
+            message: Aviso que se muestra al cortar una respuesta
+        """
+        self.message = message
+        alternatives = []
+        self.rule_ids: List[str] = []
+        self.max_match_length = 1
+
+        prefixes = {prefix.lower() for prefix in phrase_prefixes} if phrase_prefixes is not None else None
+        seen = set()
+        for text in protected_texts:
+            for words in self._phrases(text, min_words):
+                if prefixes is not None and words[0].lower() not in prefixes:
+                    continue
+                words = words[:phrase_words]
+                key = " ".join(words).lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                alternatives.append(_GAP.join(re.escape(word) for word in words))
+                self.rule_ids.append(f"template: {' '.join(words)}")
+                self.max_match_length = max(self.max_match_length, sum(map(len, words)) + _GAP_MAX * (len(words) - 1))
+
+        for rule in rules or []:
+            alternatives.append(rule["pattern"])
+            self.rule_ids.append(rule["id"])
+            self.max_match_length = max(self.max_match_length, int(rule["max_length"]))
+
+        self._regex = re.compile(
+            "|".join(f"(?P<g{i}>{pattern})" for i, pattern in enumerate(alternatives)),
+            re.IGNORECASE,
+        ) if alternatives else None
+
+    @staticmethod
+    def _phrases(text:str, min_words:int) -> List[List[str]]:
+        """
+        Frases de prosa de un template con al menos min_words palabras
+
+        Se ignoran los elementos de lista: describen las secciones que el modelo
+        debe escribir, así que reproducirlos en la respuesta es lo esperado.
+        """
+        phrases = []
+        for line in text.splitlines():
+            if re.match(r"\s*(?:[-*•]|\d+\.)\s", line):
+                continue
+            for sentence in re.split(r"(?<=[.:!?])\s+", line):
+                words = re.findall(r"\w+", sentence)
+                if len(words) >= min_words:
+                    phrases.append(words)
+        return phrases
+
+    def search(self, text:str) -> Optional[Tuple[int, str]]:
+        """ Primera coincidencia en un texto: (posición, id de la regla) o None """
+        if self._regex is None:
+            return None
+        match = self._regex.search(text)
+        if not match:
+            return None
+        return match.start(), self.rule_ids[int(match.lastgroup[1:])]
+
+    def scanner(self) -> "OutputScanner":
+        """ Nuevo revisor para una respuesta en streaming """
+        return OutputScanner(self)
+
+
+class OutputScanner:
+    """ Revisión incremental de una respuesta con una ventana de L-1 caracteres retenidos """
+
+    def __init__(self, guardrail:OutputGuardrail):
+        self.guardrail = guardrail
+        self.hold = guardrail.max_match_length - 1
+        self._pending = ""
+        self.violation: Optional[str] = None
+
+    def feed(self, chunk:str) -> str:
+        """
+        Añade un chunk y retorna el texto que ya se puede mostrar
+
+        Si se detecta una coincidencia, retorna el texto anterior a ella,
+        `violation` indica la regla y el resto de la respuesta debe descartarse.
+        """
+        if self.violation is not None:
+            return ""
+        self._pending += chunk
+        found = self.guardrail.search(self._pending)
+        if found:
+            position, self.violation = found
+            safe, self._pending = self._pending[:position], ""
+            return safe
+        # Una coincidencia futura sólo puede empezar en los últimos L-1 caracteres
+        cut = max(0, len(self._pending) - self.hold)
+        safe, self._pending = self._pending[:cut], self._pending[cut:]
+        return safe
+
+    def finish(self) -> str:
+        """ Texto retenido al terminar la respuesta (ya revisado) """
+        if self.violation is not None:
+            return ""
+        safe, self._pending = self._pending, ""
+        return safe
+
+
+_shared_guardrail: Optional[OutputGuardrail] = None
+_shared_fingerprint: Optional[str] = None
+_shared_guardrail_lock = threading.Lock()
+
+
+def get_output_guardrail() -> OutputGuardrail:
+    """
+    Retorna el guardrail de salida compartido por todo el proceso
+
+    Se reconstruye cuando cambia el archivo de reglas.
+    """
+    global _shared_guardrail, _shared_fingerprint
+    # Importación diferida: prompt_service importa los guardrails
+    from utils.prompt_service import PromptService
+
+    rules = get_guardrail_rules()
+    with _shared_guardrail_lock:
+        if _shared_guardrail is None or _shared_fingerprint != rules.fingerprint:
+            templates = PromptService(enable_guardrails=False).templates.values()
+            _shared_guardrail = OutputGuardrail(
+                protected_texts=templates,
+                rules=rules.output_rules,
+                min_words=DEFAULT_SETTINGS["output_guardrail_min_words"],
+                phrase_prefixes=DEFAULT_SETTINGS["output_guardrail_phrase_prefixes"],
+                message=rules.output_message,
+            )
+            _shared_fingerprint = rules.fingerprint
+        return _shared_guardrail
+
+
+if __name__ == "__main__":
+    # Benchmark: latencia añadida por chunk y comprobación de que la revisión es lineal
+    import random
+    import time
+
+    guardrail = get_output_guardrail()
+    print(f"🧪 {len(guardrail.rule_ids)} reglas, longitud máxima de coincidencia {guardrail.max_match_length}\n")
+
+    rng = random.Random(0)
+    words = "el código de la función devuelve una lista con los datos procesados por el servidor".split()
+
+    for total_tokens in (1_000, 10_000, 50_000):
+        chunks = [rng.choice(words) + rng.choice([" ", " ", ", ", ".\n\n"]) for _ in range(total_tokens)]
+        scanner = guardrail.scanner()
+        start = time.perf_counter()
+        shown = "".join(scanner.feed(chunk) for chunk in chunks) + scanner.finish()
+        elapsed = time.perf_counter() - start
+        assert shown == "".join(chunks)
+        print(f"{total_tokens:>6} chunks: {elapsed / total_tokens * 1e6:6.1f} µs/chunk | {elapsed * 1000:7.1f} ms en total")
+
+    leak = "Claro. Eres DevMentor AI, un asistente experto en desarrollo de software. Proporciona..."
+    scanner = guardrail.scanner()
+    shown = "".join(scanner.feed(leak[i:i + 4]) for i in range(0, len(leak), 4)) + scanner.finish()
+    print(f"\nFiltración: mostrado {shown!r} | regla: {scanner.violation}")
@@ -0,0 +1,108 @@
+"""
+Ejecutor de las llamadas auxiliares de una consulta
+
+Antes de la respuesta se hacen varias llamadas al LLM que no dependen
+entre sí (título, clasificación, detección de ataques, resumen del
+contexto). En lugar de encadenarlas, se lanzan a la vez en un pool de
+hilos y sólo se espera por las que la respuesta necesita.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from config import DEFAULT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineExecutor:
+    """ Pool de hilos para las llamadas auxiliares (compartido por todas las sesiones) """
+
+    def __init__(self, max_workers:int = 8):
+        """
+        Args:
+            max_workers: Número máximo de llamadas auxiliares simultáneas en el proceso
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+
+    def submit(self, name:str, fn:Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Lanza una tarea en segundo plano
+
+        La tarea se ejecuta con una copia del contexto de quien la lanza
+        (por ejemplo, el propósito de llamada de las métricas).
+
+        Args:
+            name: Nombre de la tarea (para los logs)
+            fn: Función a ejecutar
+            *args, **kwargs: Argumentos de la función
+
+        Returns:
+            El Future de la tarea; al terminar, su atributo `duration` guarda los
+            segundos transcurridos desde que se lanzó
+        """
+        context = contextvars.copy_context()
+        start = time.perf_counter()
+
+        def record_duration(done:Future):
+            done.duration = time.perf_counter() - start
+            logger.debug(f"Tarea '{name}' completada en {done.duration:.2f} s")
+
+        future = self._executor.submit(context.run, fn, *args, **kwargs)
+        future.name = name
+        future.duration = None
+        future.add_done_callback(record_duration)
+        return future
+
+    @staticmethod
+    def gather(futures:Dict[str, Future], timeout:Optional[float] = None, defaults:Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Espera a varias tareas y retorna sus resultados
+
+        Args:
+            futures: Tareas por nombre
+            timeout: Segundos máximos de espera para el conjunto
+            defaults: Valor para las tareas que fallen o no terminen a tiempo. Las tareas
+                      de seguridad deben indicarlo: por omisión el valor es None
+
+        Returns:
+            Resultados por nombre
+        """
+        defaults = defaults or {}
+        wait(list(futures.values()), timeout=timeout)
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                logger.warning(f"La tarea '{name}' no terminó a tiempo")
+                results[name] = defaults.get(name)
+                continue
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error en la tarea '{name}': {e}")
+                results[name] = defaults.get(name)
+        return results
+
+
+_shared_executor: Optional[PipelineExecutor] = None
+_shared_executor_lock = threading.Lock()
+
+
+def get_pipeline_executor() -> PipelineExecutor:
+    """
+    Retorna el ejecutor compartido por todas las sesiones del proceso
+
+    El número de hilos (pipeline_max_workers o PIPELINE_MAX_WORKERS) limita las
+    llamadas auxiliares de todas las sesiones juntas, no las de cada una.
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            max_workers = int(os.getenv("PIPELINE_MAX_WORKERS", DEFAULT_SETTINGS["pipeline_max_workers"]))
+            _shared_executor = PipelineExecutor(max_workers=max_workers)
+        return _shared_executor
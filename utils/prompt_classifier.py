@@ -0,0 +1,241 @@
+"""
+Clasificador local de PromptType
+
+TF-IDF (palabras, bigramas y n-gramas de caracteres) con centroide más
+cercano, en Python puro. Se entrena con el conjunto de ejemplos etiquetados
+de config/prompt_type_seeds.json y se guarda en disco; si los ejemplos
+cambian, se vuelve a entrenar. Clasifica en bastante menos de un
+milisegundo y da una confianza con la que decidir si hace falta
+preguntar al LLM.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import DEFAULT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_ROOT = Path(__file__).parent.parent
+SEEDS_PATH = PACKAGE_ROOT / "config" / "prompt_type_seeds.json"
+
+
+def _normalize(text:str) -> str:
+    """ Minúsculas y sin tildes """
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def extract_features(text:str) -> Counter:
+    """ Palabras, bigramas de palabras y n-gramas de caracteres (3-4) de un texto """
+    text = _normalize(text)
+    words = re.findall(r"\w+", text)
+    features = Counter(f"w:{word}" for word in words)
+    features.update(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f" {word} "
+        for n in (3, 4):
+            features.update(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+    return features
+
+
+def _normalize_vector(vector:Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else vector
+
+
+class PromptClassifier:
+    """ Clasificador TF-IDF + centroide más cercano """
+
+    def __init__(self):
+        self.idf: Dict[str, float] = {}
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        self.seeds_hash: Optional[str] = None
+
+    def _vectorize(self, text:str) -> Dict[str, float]:
+        """ Vector TF-IDF normalizado (sólo con las características vistas al entrenar) """
+        features = extract_features(text)
+        vector = {
+            feature: (1 + math.log(count)) * self.idf[feature]
+            for feature, count in features.items() if feature in self.idf
+        }
+        return _normalize_vector(vector)
+
+    def train(self, examples:Dict[str, List[str]]) -> "PromptClassifier":
+        """
+        Entrena el clasificador
+
+        Args:
+            examples: Ejemplos por etiqueta
+        """
+        document_frequency = Counter()
+        total = 0
+        for texts in examples.values():
+            for text in texts:
+                document_frequency.update(extract_features(text).keys())
+                total += 1
+        self.idf = {feature: math.log((1 + total) / (1 + df)) + 1 for feature, df in document_frequency.items()}
+
+        # Centroide de cada etiqueta: media de los vectores de sus ejemplos (normalizada)
+        self.centroids = {}
+        for label, texts in examples.items():
+            centroid = Counter()
+            for text in texts:
+                centroid.update(self._vectorize(text))
+            self.centroids[label] = _normalize_vector(dict(centroid))
+        return self
+
+    def scores(self, text:str) -> List[Tuple[str, float]]:
+        """ Similitud coseno con cada centroide, de mayor a menor """
+        vector = self._vectorize(text)
+        scores = [
+            (label, sum(weight * centroid.get(feature, 0.0) for feature, weight in vector.items()))
+            for label, centroid in self.centroids.items()
+        ]
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def predict(self, text:str) -> Tuple[Optional[str], float]:
+        """
+        Clasifica un texto
+
+        Returns:
+            Tupla (etiqueta, confianza). La confianza es el margen relativo entre
+            las dos etiquetas más parecidas (0 = empate, 1 = sin competencia)
+        """
+        scores = self.scores(text)
+        if not scores or scores[0][1] <= 0:
+            return None, 0.0
+        best, best_score = scores[0]
+        second_score = scores[1][1] if len(scores) > 1 else 0.0
+        return best, (best_score - second_score) / best_score
+
+    def save(self, path:str):
+        """ Guarda el modelo entrenado en un archivo JSON """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'seeds_hash': self.seeds_hash, 'idf': self.idf, 'centroids': self.centroids}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path:str) -> "PromptClassifier":
+        """ Carga un modelo guardado """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        classifier = cls()
+        classifier.seeds_hash = data.get('seeds_hash')
+        classifier.idf = data['idf']
+        classifier.centroids = data['centroids']
+        return classifier
+
+    @classmethod
+    def from_seeds(cls, seeds_path:Path = SEEDS_PATH, model_path:Optional[str] = None) -> "PromptClassifier":
+        """
+        Carga el modelo guardado o lo entrena con los ejemplos si éstos han cambiado
+
+        Args:
+            seeds_path: Archivo JSON con los ejemplos etiquetados
+            model_path: Archivo donde se guarda el modelo entrenado (None = no se guarda)
+        """
+        raw = Path(seeds_path).read_bytes()
+        seeds_hash = hashlib.sha256(raw).hexdigest()[:16]
+
+        if model_path and Path(model_path).exists():
+            try:
+                classifier = cls.load(model_path)
+                if classifier.seeds_hash == seeds_hash:
+                    return classifier
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"No se pudo cargar el clasificador guardado: {e}")
+
+        classifier = cls().train(json.loads(raw)["examples"])
+        classifier.seeds_hash = seeds_hash
+        if model_path:
+            try:
+                classifier.save(model_path)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el clasificador: {e}")
+        return classifier
+
+
+def resolve_model_path(path:Optional[str]) -> Optional[Path]:
+    """ Las rutas relativas del modelo se resuelven desde la raíz del proyecto, no desde el directorio actual """
+    if not path:
+        return None
+    path = Path(path)
+    return path if path.is_absolute() else PACKAGE_ROOT / path
+
+
+_shared_classifier: Optional[PromptClassifier] = None
+_shared_classifier_lock = threading.Lock()
+
+
+def get_prompt_classifier() -> PromptClassifier:
+    """ Retorna el clasificador compartido por todo el proceso """
+    global _shared_classifier
+    with _shared_classifier_lock:
+        if _shared_classifier is None:
+            _shared_classifier = PromptClassifier.from_seeds(model_path=resolve_model_path(DEFAULT_SETTINGS["prompt_classifier_path"]))
+        return _shared_classifier
+
+
+if __name__ == "__main__":
+    # Validación: leave-one-out sobre los ejemplos, latencia y, con --llm, comparación con el LLM
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Valida el clasificador local de PromptType")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_SETTINGS["prompt_classifier_threshold"])
+    parser.add_argument("--llm", action="store_true", help="Comparar también con la clasificación por LLM (Ollama)")
+    args = parser.parse_args()
+
+    examples = json.loads(SEEDS_PATH.read_text(encoding="utf-8"))["examples"]
+    dataset = [(text, label) for label, texts in examples.items() for text in texts]
+
+    # Leave-one-out: cada ejemplo se clasifica con un modelo entrenado sin él
+    predictions = []
+    for i, (text, label) in enumerate(dataset):
+        train = {l: [t for j, (t, tl) in enumerate(dataset) if tl == l and j != i] for l in examples}
+        predictions.append(PromptClassifier().train(train).predict(text))
+
+    hits = sum(pred == label for (pred, _), (_, label) in zip(predictions, dataset))
+    confident = [(pred, label) for (pred, conf), (_, label) in zip(predictions, dataset) if conf >= args.threshold]
+    confident_hits = sum(pred == label for pred, label in confident)
+    print(f"🧪 {len(dataset)} ejemplos, leave-one-out")
+    print(f"Local (todas)      : {hits / len(dataset) * 100:5.1f}% de acierto")
+    print(f"Local (conf >= {args.threshold:.2f}): {confident_hits / max(1, len(confident)) * 100:5.1f}% de acierto | "
+          f"{len(confident) / len(dataset) * 100:.0f}% resueltas sin LLM")
+
+    classifier = PromptClassifier().train(examples)
+    start = time.perf_counter()
+    for _ in range(10):
+        for text, _ in dataset:
+            classifier.predict(text)
+    print(f"Latencia local     : {(time.perf_counter() - start) / (10 * len(dataset)) * 1e6:.0f} µs/consulta")
+
+    if args.llm:
+        from utils.api_client import OllamaClient
+        from utils.prompt_service import PromptService
+
+        service = PromptService(llm_Client=OllamaClient())
+        llm_hits = hybrid_hits = 0
+        llm_time = hybrid_time = 0.0
+        for (text, label), (pred, conf) in zip(dataset, predictions):
+            start = time.perf_counter()
+            llm_pred = service._detect_prompt_type_with_llm(text).value
+            elapsed = time.perf_counter() - start
+            llm_time += elapsed
+            llm_hits += llm_pred == label
+            if conf >= args.threshold:
+                hybrid_hits += pred == label
+            else:
+                hybrid_hits += llm_pred == label
+                hybrid_time += elapsed
+        print(f"Sólo LLM           : {llm_hits / len(dataset) * 100:5.1f}% de acierto | {llm_time / len(dataset) * 1000:.0f} ms/consulta")
+        print(f"Local + LLM        : {hybrid_hits / len(dataset) * 100:5.1f}% de acierto | {hybrid_time / len(dataset) * 1000:.0f} ms/consulta")
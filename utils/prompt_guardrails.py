@@ -1,35 +1,16 @@
 import re
-from typing import Tuple 
+from typing import Optional, Tuple
+
+from config import DEFAULT_SETTINGS
+from utils.api_client import is_error_response
+from utils.guardrail_rules import get_guardrail_rules
+from utils.llm_metrics import call_purpose
 
 class PromptGuardrails:
     """ Protección contra prompt injection y role confusion. """
 
     def __init__(self):
-        """ Inicializamos los patrones de detección de ataques"""
-
-        # Ataques de cambio de rol
-        self.role_change_patterns = [
-            r"eres\s+un\s+(asistente|assistant|modelo|bot|experto)\s+de",
-            r"eres\s+un\s+(asistente|assistant|modelo|bot|experto)\s+.*(sin\s+restricciones|no\s+restrictions|sin\s+límites)",
-            r"(you\s+are\s+now|ahora\s+eres)\s(?!devmentor)",
-            r"(act\s+as|actúa\s+como)\s+un\?\s+(asistente|assistant|modelo|bot)",
-            r"tu\s+tarea\s+es\s+ayudar\s+a.*hacking",
-            r"your\s+task\s+is\s+to\s+help.*hacking",
-        ]
-
-        # Ataques de jailbreak
-        self.jailbreak_patterns = [
-            r"(ignore|forget)\s+(all\s+)previous\s+instructions",
-            r"(ignora|olvida)\s+(todas?\s+)?las?\s+instrucciones?\s+anteriores?",
-        ]
-
-        # Ataques de revelación de prompt
-        self.leak_patterns = [
-            r"(show|muestra|display|revela)\s+(me\ss+)?(your\s+|tu\s+)?(system\s+)?prompt",
-            r"what\s+(is|are)\s+your\s+(initial\s+)?instructions?",
-            r"cu[aá]l\s+es\s+tu\s+prompt",
-            r"repite\s+todo\s+lo\s+que\s+te\s+dijeron",
-        ]
+        """ Los patrones de detección de ataques están en config/guardrail_rules.json """
 
     def validate_input(self, user_input: str) -> Tuple[bool,str]:
         """
@@ -42,23 +23,38 @@ class PromptGuardrails:
         Returns:
             Tupla (es_valido, mensaje_error)
         """
+        match = self.check_rules(user_input)
+        if match:
+            return False, match[1]
+        return True,""
 
-        normalized = user_input.lower()
+    def check_rules(self, user_input: str) -> Optional[Tuple[str, str]]:
+        """
+        Evalúa las reglas de guardrails sobre la entrada
 
-        for pattern in self.role_change_patterns:
-            if re.search(pattern, normalized, re.IGNORECASE):
-                return False, "⚠️ Detectado intento de cambiar el rol del asistente"
-            
-        for pattern in self.jailbreak_patterns:
-            if re.search(pattern, normalized, re.IGNORECASE):
-                return False, "⚠️ Detectado intento de jailbreak"
-        
-        for pattern in self.leak_patterns:
-            if re.search(pattern, normalized, re.IGNORECASE):
-                return False, "⚠️ Detectado intento de extraer el system prompt"
-        
-        return True,""
+        Returns:
+            (id_regla, mensaje) de la regla activada, o None si la entrada es válida
+        """
+        match = get_guardrail_rules().check(user_input)
+        if match:
+            print(f"Regla de guardrails activada: {match[0]}")
+        return match
     
+    # El veredicto debe ser la primera palabra de la respuesta (admite "Respuesta:" o "Veredicto:" delante):
+    # buscarlo en cualquier posición tomaría "No estoy seguro..." por "SEGURO"
+    _VERDICT_PATTERN = re.compile(r"^\W*(?:(?:RESPUESTA|VEREDICTO)\W+)?(ATAQUE|SOSPECHOSO|SEGURO)\b")
+
+    @staticmethod
+    def _parse_verdict(response: str):
+        """ Veredicto de la respuesta del análisis (None mientras no haya ninguno) """
+        match = PromptGuardrails._VERDICT_PATTERN.match(response.upper())
+        return match.group(1) if match else None
+
+    @staticmethod
+    def get_unavailable_message() -> str:
+        """ Mensaje cuando el análisis de seguridad no se pudo completar """
+        return "⚠️ No se pudo verificar la consulta en este momento. Inténtalo de nuevo en unos segundos"
+
     def get_safe_error_message(self) -> str:
         """ Retorna un mensaje de error genérico """
         return """Lo siento, no puedo procesar esa solicitud
@@ -111,7 +107,7 @@ class PromptGuardrails:
         Returns:
             Tupla (es_ataque, confianza)
             - es_ataque: True si se detectó un ataque
-            - confianza: "ALTO","MEDIO","BAJO"
+            - confianza: "ALTO","MEDIO","BAJO" ("ERROR" si el análisis no se pudo hacer)
 
         """
         if not llm_client:
@@ -119,20 +115,23 @@ class PromptGuardrails:
         
         try:
             analysis_prompt = self._get_attack_detection_prompt(user_input)
-            response_generator = llm_client.generate_response(analysis_prompt, {})
-            response = ""
-            for chunk in response_generator:
-                if chunk:
-                    response += chunk
+            with call_purpose("guardrail"):
+                response, verdict = llm_client.generate_auxiliary(
+                    analysis_prompt,
+                    max_tokens=DEFAULT_SETTINGS["auxiliary_max_tokens"]["guardrail"],
+                    parse=self._parse_verdict,
+                )
             print(f"Respuesta del análisis : {response}")
-            response = response.strip().upper()
+            if is_error_response(response) or verdict is None:
+                # Sin veredicto (respuesta vacía, cortada o de error) el análisis no cuenta como "seguro"
+                return False, "ERROR"
 
-            if "ATAQUE" in response:
+            if verdict == "ATAQUE":
                 return True, "ALTO"
-            elif "SOSPECHOSO" in response:
+            elif verdict == "SOSPECHOSO":
                 return True, "MEDIO"
             else:
                 return False, "BAJO"
         except Exception as e:
             print(f"⚠️ Error en análisis LLM: {e}")
-            return False, "BAJO"
+            return False, "ERROR"
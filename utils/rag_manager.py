@@ -5,7 +5,7 @@ Usa Qdrant como Vector Database y Ollama para embeddings
 """
 
 import uuid
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Iterable, Optional
 import logging
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct
@@ -87,55 +87,111 @@ class RagManager:
         Returns:
             True si se agregó correctamente 
         """
-        try:
-            # Dividir el documento en chunks
-            chunks = self.text_splitter.split_text(text)
+        return self.add_document_stream([text], source)
 
-            if not chunks:
-                logger.warning(f"No se han generado chunks para {source}")
-                return False
-            
-            logger.info(f"Documento {source} dividido en {len(chunks)} chunks")
+    def add_document_stream(self, segments:Iterable[str], source:str = "custom", batch_size:int = 64) -> bool:
+        """
+        Agrega un documento que llega por segmentos (ver DocumentProcessor.stream_document)
 
-            points = []
-            for chunk_idx, chunk in enumerate(chunks):
-                # Generamos el embedding del chunk
-                embedding = self.embedding_fn(chunk)
+        Cada segmento se une al texto del último chunk (incompleto) del segmento anterior
+        antes de dividirse, así los cortes entre segmentos no afectan al chunking.
+        Los puntos se insertan en Qdrant por lotes, sin mantener el documento completo en memoria.
+
+        Args:
+            segments: Iterable con los segmentos de texto del documento
+            source: Nombre/origen del documento
+            batch_size: Número de puntos por cada upsert
 
-                if embedding is None or len(embedding) == 0:
+        Returns:
+            True si se agregó correctamente 
+        """
+        try:
+            point_ids = []
+            points = []
+            chunk_idx = 0
+            pending = ""
+
+            for segment in segments:
+                text = pending + segment
+                chunks = self.text_splitter.split_text(text)
+                if not chunks:
+                    pending = text
                     continue
+                # El último chunk puede continuar en el siguiente segmento: se arrastra el
+                # texto original desde su inicio (split_text recorta los espacios de los
+                # bordes y, sin ellos, las palabras de ambos segmentos quedarían pegadas)
+                last = chunks.pop()
+                start = text.rfind(last)
+                pending = text[start:] if start != -1 else last
+                for chunk in chunks:
+                    point = self._build_point(chunk, source, chunk_idx)
+                    chunk_idx += 1
+                    if point:
+                        points.append(point)
+                if len(points) >= batch_size:
+                    point_ids.extend(self._upsert_points(points))
+                    points = []
+
+            for chunk in self.text_splitter.split_text(pending):
+                point = self._build_point(chunk, source, chunk_idx)
+                chunk_idx += 1
+                if point:
+                    points.append(point)
+            if points:
+                point_ids.extend(self._upsert_points(points))
+
+            if chunk_idx == 0:
+                logger.warning(f"No se han generado chunks para {source}")
+                return False
 
-                # Creamos un PointStruct de Qdrant
-                point_id = int(uuid.uuid4().int % (2**63))
-
-                point = PointStruct(
-                    id=point_id,
-                    vector=embedding,
-                    payload={
-                        "text":chunk,
-                        "source":source,
-                        "chunk_index":chunk_idx,
-                        "total_chunks": len(chunks)
-                    }
-                )
-                points.append(point)
-            
-            if not points:
+            logger.info(f"Documento {source} dividido en {chunk_idx} chunks")
+
+            if not point_ids:
                 logger.error(f"No se han creado puntos para {source}")
                 return False
 
-            self._ensure_collection_exists(len(points[0].vector))
-
-            self.client.upsert(
+            # El total de chunks sólo se conoce al terminar de leer el documento
+            self.client.set_payload(
                 collection_name=self.collection_name,
-                points=points
+                payload={"total_chunks": chunk_idx},
+                points=point_ids
             )
 
-            logger.info(f"Documento agregado: {source} ({len(points)} chunks)")
+            logger.info(f"Documento agregado: {source} ({len(point_ids)} chunks)")
 
             return True
         except Exception as e:
             logger.error(f"Error agregando documento: {e}")
+
+    def _build_point(self, chunk:str, source:str, chunk_idx:int) -> Optional[PointStruct]:
+        """ Genera el embedding de un chunk y crea el PointStruct de Qdrant """
+        embedding = self.embedding_fn(chunk)
+
+        if embedding is None or len(embedding) == 0:
+            return None
+
+        point_id = int(uuid.uuid4().int % (2**63))
+
+        return PointStruct(
+            id=point_id,
+            vector=embedding,
+            payload={
+                "text":chunk,
+                "source":source,
+                "chunk_index":chunk_idx,
+                "total_chunks": None
+            }
+        )
+
+    def _upsert_points(self, points:List[PointStruct]) -> List[int]:
+        """ Inserta un lote de puntos y retorna sus ids """
+        self._ensure_collection_exists(len(points[0].vector))
+
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=points
+        )
+        return [point.id for point in points]
         
     def search(self, query:str, top_k:int = 3) -> List[Dict]:
         """
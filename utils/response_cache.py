@@ -0,0 +1,227 @@
+"""
+Caché de respuestas exactas para llamadas LLM deterministas
+
+Guarda los chunks de una respuesta bajo una clave que incluye el proveedor,
+el modelo, el prompt, el historial y los parámetros de generación. Una
+llamada idéntica se sirve desde la caché como un stream, así que quien
+llama no necesita cambios.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generator, List, Optional
+
+from config import DEFAULT_SETTINGS
+from utils.api_client import AuxiliaryCallMixin, closed_with_complete_answer, is_error_response
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """ Caché LRU en memoria con un segundo nivel opcional en SQLite """
+
+    def __init__(self, max_entries:int = 512, ttl:Optional[float] = 3600, sqlite_path:Optional[str] = None):
+        """
+        Inicializa la caché
+
+        Args:
+            max_entries: Número máximo de respuestas en memoria
+            ttl: Segundos de validez de cada respuesta (None = sin caducidad)
+            sqlite_path: Ruta del archivo SQLite para persistir la caché (opcional)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, chunks TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(provider:str, model:Optional[str], prompt:str, messages:Optional[List[Dict[str,str]]], params:Dict[str, Any]) -> str:
+        """
+        Calcula la clave de una llamada
+
+        Returns:
+            Hash SHA-256 de todos los datos que determinan la respuesta
+        """
+        data = {
+            'provider': provider,
+            'model': model,
+            'prompt': prompt,
+            'messages': list(messages or []),
+            'params': params,
+        }
+        raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at:float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key:str) -> Optional[List[str]]:
+        """
+        Busca una respuesta en la caché
+
+        Returns:
+            Los chunks de la respuesta o None si no está (o ha caducado)
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                chunks, created_at = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return chunks
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT chunks, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    chunks, created_at = json.loads(row[0]), row[1]
+                    if not self._expired(created_at):
+                        self._store_memory(key, chunks, created_at)
+                        self.stats['hits'] += 1
+                        return chunks
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key:str, chunks:List[str]):
+        """ Guarda una respuesta en la caché """
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, chunks, created_at)
+            self.stats['stores'] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, chunks, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(chunks, ensure_ascii=False), created_at)
+                )
+                self._db.commit()
+
+    def _store_memory(self, key:str, chunks:List[str], created_at:float):
+        """ Guarda en el nivel de memoria expulsando la entrada menos usada (con el lock adquirido) """
+        self._memory[key] = (chunks, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """ Vacía la caché """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ Retorna estadísticas de la caché """
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._memory),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            }
+
+
+class CachedLLMClient(AuxiliaryCallMixin):
+    """
+    Envoltorio de un cliente LLM que cachea las llamadas deterministas
+
+    Se cachean las llamadas con temperature=0 (o todas si cache_all=True).
+    El resto de atributos se delegan en el cliente original.
+    """
+
+    def __init__(self, llm_client, cache:ResponseCache, cache_all:bool = False):
+        """
+        Args:
+            llm_client: Cliente LLM a envolver
+            cache: La caché de respuestas
+            cache_all: Cachear también las llamadas con temperatura distinta de 0
+        """
+        self.llm_client = llm_client
+        self.cache = cache
+        self.cache_all = cache_all
+
+    def __getattr__(self, name:str):
+        return getattr(self.llm_client, name)
+
+    def _is_cacheable(self, **kwargs) -> bool:
+        return self.cache_all or kwargs.get("temperature") == 0
+
+    def generate_response(self, prompt:str, messages:Optional[List[Dict[str,str]]], **kwargs) -> Generator[str, None, None]:
+        """
+        Genera una respuesta o la reproduce desde la caché
+
+        Args:
+            prompt: El prompt para enviar al modelo
+            messages: Historial de mensajes previos
+            **kwargs: Parámetros adicionales (temperature, max_tokens)
+
+        Yields:
+            Chunks de la respuesta
+        """
+        if not self._is_cacheable(**kwargs):
+            yield from self.llm_client.generate_response(prompt, messages, **kwargs)
+            return
+
+        model = getattr(self.llm_client, "model", None) or getattr(self.llm_client, "modelo", None)
+        # Los envoltorios (InstrumentedLLMClient) indican el proveedor real en .provider
+        provider = getattr(self.llm_client, "provider", None) or type(self.llm_client).__name__
+        key = ResponseCache.make_key(provider, model, prompt, messages, kwargs)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield from cached
+            return
+
+        chunks = []
+        complete = False
+        generator = self.llm_client.generate_response(prompt, messages, **kwargs)
+        try:
+            for chunk in generator:
+                if chunk:
+                    chunks.append(chunk)
+                yield chunk
+            complete = True
+        except GeneratorExit:
+            # generate_auxiliary cierra el stream en cuanto la respuesta es válida: también se guarda
+            complete = closed_with_complete_answer()
+            raise
+        finally:
+            generator.close()
+            # Sólo se guardan respuestas completas y sin errores
+            if complete and chunks and not is_error_response("".join(chunks)):
+                self.cache.set(key, chunks)
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """ Retorna la caché de respuestas compartida por todas las sesiones del proceso """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(
+                max_entries=DEFAULT_SETTINGS["response_cache_max_entries"],
+                ttl=DEFAULT_SETTINGS["response_cache_ttl"],
+                sqlite_path=DEFAULT_SETTINGS["response_cache_path"],
+            )
+        return _shared_cache
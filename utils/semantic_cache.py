@@ -0,0 +1,225 @@
+"""
+Caché semántica de respuestas
+
+Sirve la respuesta guardada de una pregunta anterior cuando la nueva
+pregunta es casi idéntica ("¿Qué es Python?" / "qué es python"). Las
+preguntas se comparan por similitud coseno de sus embeddings y sólo entre
+entradas del mismo PromptType, template, modelo y parámetros de generación.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import DEFAULT_SETTINGS
+from utils.rag_manager import ollama_embedding_fn
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text:str) -> str:
+    """
+    Normaliza una consulta: NFKC, minúsculas, sin signos de apertura/cierre y espacios colapsados
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ¿?¡!.,;:")
+
+
+class SemanticCache:
+    """ Índice vectorial pequeño (NumPy) de preguntas ya respondidas """
+
+    # Embeddings recientes que se reutilizan entre lookup y store
+    RECENT_VECTORS = 64
+
+    def __init__(self, embedding_fn:Callable = ollama_embedding_fn, threshold:float = 0.92, max_entries:int = 1000):
+        """
+        Inicializa la caché
+
+        Args:
+            embedding_fn: Función para generar embeddings
+            threshold: Similitud coseno mínima para servir una respuesta guardada
+            max_entries: Número máximo de respuestas guardadas
+        """
+        self.embedding_fn = embedding_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._recent_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'latency_saved': 0.0}
+
+    @staticmethod
+    def fingerprint(template:str, model:Optional[str], temperature:Optional[float] = None, max_tokens:Optional[int] = None) -> str:
+        """
+        Huella del template, el modelo y los parámetros de generación de una respuesta
+
+        Si cambia cualquiera de ellos, las respuestas anteriores dejan de servirse
+        (una respuesta cortada por max_tokens no sirve con un límite mayor).
+        """
+        return hashlib.sha256(f"{model}\n{temperature}\n{max_tokens}\n{template}".encode("utf-8")).hexdigest()[:16]
+
+    def _embed(self, normalized:str) -> Optional[np.ndarray]:
+        """
+        Embedding normalizado (norma 1) de la consulta
+
+        Los últimos embeddings se recuerdan: store reutiliza el que calculó lookup
+        para la misma consulta en lugar de volver a llamar al modelo.
+        """
+        with self._lock:
+            vector = self._recent_vectors.get(normalized)
+            if vector is not None:
+                self._recent_vectors.move_to_end(normalized)
+                return vector
+        try:
+            vector = np.asarray(self.embedding_fn(normalized), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"No se pudo generar el embedding para la caché semántica: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        vector = vector / norm
+        with self._lock:
+            self._recent_vectors[normalized] = vector
+            if len(self._recent_vectors) > self.RECENT_VECTORS:
+                self._recent_vectors.popitem(last=False)
+        return vector
+
+    def lookup(self, query:str, prompt_type:str, fingerprint:str) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta para una consulta parecida
+
+        Args:
+            query: La consulta del usuario
+            prompt_type: El tipo de prompt de la consulta
+            fingerprint: Huella del template y modelo actuales
+
+        Returns:
+            Diccionario con la respuesta ('answer'), la consulta original y la similitud, o None
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            self.stats['lookups'] += 1
+            candidates = [
+                i for i, entry in enumerate(self._entries)
+                if entry['prompt_type'] == prompt_type and entry['fingerprint'] == fingerprint
+            ]
+            if not candidates:
+                return None
+            # Coincidencia exacta tras normalizar: no hace falta el embedding
+            for i in candidates:
+                if self._entries[i]['normalized'] == normalized:
+                    return self._hit(i, 1.0)
+
+        vector = self._embed(normalized)
+        if vector is None:
+            return None
+
+        with self._lock:
+            candidates = [
+                i for i, entry in enumerate(self._entries)
+                if entry['prompt_type'] == prompt_type and entry['fingerprint'] == fingerprint
+            ]
+            if not candidates or self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                return None
+            similarities = self._vectors[candidates] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return self._hit(candidates[best], float(similarities[best]))
+
+    def _hit(self, index:int, similarity:float) -> Dict[str, Any]:
+        """ Registra un acierto (con el lock adquirido) """
+        entry = self._entries[index]
+        self.stats['hits'] += 1
+        self.stats['latency_saved'] += entry['generation_time']
+        return {'answer': entry['answer'], 'query': entry['query'], 'similarity': similarity}
+
+    def store(self, query:str, prompt_type:str, fingerprint:str, answer:str, generation_time:float = 0.0):
+        """
+        Guarda la respuesta de una consulta
+
+        Args:
+            query: La consulta del usuario
+            prompt_type: El tipo de prompt de la consulta
+            fingerprint: Huella del template y modelo usados
+            answer: La respuesta generada
+            generation_time: Segundos que tardó la generación (para medir el ahorro)
+        """
+        normalized = normalize_query(query)
+        vector = self._embed(normalized)
+        if vector is None:
+            return
+
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] != vector.shape[0]:
+                # Ha cambiado el modelo de embeddings: el índice anterior no es comparable
+                self._vectors = None
+                self._entries = []
+
+            self._entries.append({
+                'query': query,
+                'normalized': normalized,
+                'prompt_type': prompt_type,
+                'fingerprint': fingerprint,
+                'answer': answer,
+                'generation_time': generation_time,
+                'created_at': time.time(),
+            })
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+
+            if len(self._entries) > self.max_entries:
+                overflow = len(self._entries) - self.max_entries
+                self._entries = self._entries[overflow:]
+                self._vectors = self._vectors[overflow:]
+
+    def invalidate(self, fingerprint:Optional[str] = None):
+        """
+        Elimina respuestas guardadas
+
+        Args:
+            fingerprint: Si se indica, sólo las generadas con esa huella; si no, todas
+        """
+        with self._lock:
+            if fingerprint is None:
+                keep = []
+            else:
+                keep = [i for i, entry in enumerate(self._entries) if entry['fingerprint'] != fingerprint]
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep and self._vectors is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ Retorna estadísticas de la caché """
+        with self._lock:
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'hit_rate': self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0,
+            }
+
+
+_shared_cache: Optional[SemanticCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """ Retorna la caché semántica compartida por todas las sesiones del proceso """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SemanticCache(
+                threshold=DEFAULT_SETTINGS["semantic_cache_threshold"],
+                max_entries=DEFAULT_SETTINGS["semantic_cache_max_entries"],
+            )
+        return _shared_cache
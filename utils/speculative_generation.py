@@ -0,0 +1,89 @@
+"""
+Generación especulativa de la respuesta
+
+La respuesta empieza a generarse a la vez que el análisis de ataques con
+LLM, pero sus chunks se retienen en un buffer del servidor (no se muestran)
+hasta que llega el veredicto. Si la consulta es legítima se publica lo
+retenido y se sigue leyendo; si es un ataque se descarta y se cancela la
+generación. El análisis no pierde nada y su latencia queda oculta tras la
+de la propia respuesta.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from utils.api_client import GenerationHandle
+from utils.llm_metrics import call_purpose
+
+_END = object()
+
+
+class SpeculativeGeneration:
+    """ Lee una generación en segundo plano y retiene su salida hasta que se publica o se descarta """
+
+    def __init__(self, handle:GenerationHandle, purpose:str = "answer"):
+        """
+        Args:
+            handle: La generación (ver GenerationHandle)
+            purpose: Propósito de llamada para las métricas
+        """
+        self.handle = handle
+        self.purpose = purpose
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._produce,),
+            name="speculative-generation",
+            daemon=True,
+        )
+        self._started_at: Optional[float] = None
+        self.stats = {'held_chunks': 0, 'held_chars': 0, 'hold_time': None, 'discarded': False}
+
+    def start(self) -> "SpeculativeGeneration":
+        self._started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _produce(self):
+        """ Hilo lector: pasa cada chunk (o el error) a la cola """
+        try:
+            with call_purpose(self.purpose):
+                for chunk in self.handle:
+                    self._queue.put((chunk, None))
+        except Exception as e:
+            self._queue.put((None, e))
+        finally:
+            self._queue.put(_END)
+
+    def release(self) -> Iterator[str]:
+        """
+        Publica la respuesta: primero lo retenido y después el resto según llega
+
+        Raises:
+            Los errores del cliente LLM (p. ej. LLMError), en el punto en que se produjeron
+        """
+        held = self._queue.qsize()
+        self.stats['hold_time'] = time.perf_counter() - self._started_at if self._started_at else 0.0
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            chunk, error = item
+            if error is not None:
+                raise error
+            if held > 0:
+                held -= 1
+                self.stats['held_chunks'] += 1
+                self.stats['held_chars'] += len(chunk or "")
+            yield chunk
+
+    def discard(self):
+        """ Descarta lo generado y cancela la generación """
+        self.stats['discarded'] = True
+        self.handle.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
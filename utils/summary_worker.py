@@ -0,0 +1,92 @@
+"""
+Resumen de la conversación en segundo plano
+
+Tras cada respuesta, el resumen de la conversación se actualiza en un hilo
+aparte, de modo que la siguiente consulta encuentra ya hecho el resumen y
+no espera a ninguna llamada al LLM antes de empezar a responder. Si llegan
+varios turnos mientras se resume, sólo se resume el más reciente.
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryWorker:
+    """ Mantiene actualizados los resúmenes de las conversaciones (compartido por todas las sesiones) """
+
+    def __init__(self, max_workers:int = 1):
+        """
+        Args:
+            max_workers: Resúmenes simultáneos en el proceso (de conversaciones distintas)
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+        self._lock = threading.Lock()
+        # Conversaciones con un resumen en curso (por su id) y último turno pendiente de cada una
+        self._running = set()
+        self._pending: Dict[str, tuple] = {}
+        self.stats = {'scheduled': 0, 'runs': 0, 'coalesced': 0, 'errors': 0}
+
+    def schedule(self, conversation_id:str, strategy, messages:List[Dict[str, str]]):
+        """
+        Actualiza en segundo plano el resumen de una conversación
+
+        Args:
+            conversation_id: Id de la conversación (agrupa los turnos aunque se recargue su estado)
+            strategy: SummaryStrategy con el estado de la conversación
+            messages: Mensajes de la conversación tras la última respuesta
+        """
+        key = conversation_id
+        with self._lock:
+            self.stats['scheduled'] += 1
+            if key in self._running:
+                # Ya se está resumiendo: al terminar se resume sólo el último turno recibido
+                if key in self._pending:
+                    self.stats['coalesced'] += 1
+                self._pending[key] = (strategy, list(messages))
+                return
+            self._running.add(key)
+        self._executor.submit(contextvars.copy_context().run, self._run, key, strategy, list(messages))
+
+    def _run(self, key:str, strategy, messages:List[Dict[str, str]]):
+        while True:
+            try:
+                strategy.refresh(messages)
+                with self._lock:
+                    self.stats['runs'] += 1
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar el resumen en segundo plano: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+            with self._lock:
+                next_job = self._pending.pop(key, None)
+                if next_job is None:
+                    self._running.discard(key)
+                    return
+            strategy, messages = next_job
+
+    def is_running(self, conversation_id:str) -> bool:
+        """ True si se está resumiendo la conversación """
+        with self._lock:
+            return conversation_id in self._running
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'running': len(self._running)}
+
+
+_shared_worker: Optional[SummaryWorker] = None
+_shared_worker_lock = threading.Lock()
+
+
+def get_summary_worker() -> SummaryWorker:
+    """ Retorna el worker de resúmenes compartido por todo el proceso """
+    global _shared_worker
+    with _shared_worker_lock:
+        if _shared_worker is None:
+            _shared_worker = SummaryWorker()
+        return _shared_worker